@@ -0,0 +1,69 @@
+"""Benchmark: RxNorm lookup cache vs. the `cache.json` read-modify-write
+
+Usage: python -m benchmarks.bench_cache
+"""
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from my_app.cache import RxNormCache
+
+SIZES = [100, 10_000, 100_000]  # number of cached drug names
+LOOKUPS = 200
+
+
+def entry(i):
+    return {str(i * 10 + k): f"drug {i} {k * 5} MG Oral Tablet" for k in range(10)}
+
+
+def json_lookup(path, name):
+    """One request of the original `getRxNorm()`: load, look up, rewrite"""
+    with open(path, "r") as json_file:
+        cache = json.load(json_file)
+    value = cache.get(name)
+    with open(path, "w") as f:
+        json.dump(cache, f)
+    return value
+
+
+def main():
+    print(f"{'names':>8} {'json (ms)':>10} {'sqlite (ms)':>12} {'lru (ms)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in SIZES:
+            seed = os.path.join(tmp, f"cache{n}.json")
+            with open(seed, "w") as f:
+                json.dump({f"drug{i}": entry(i) for i in range(n)}, f)
+            names = [f"drug{i * n // LOOKUPS}" for i in range(LOOKUPS)]
+
+            json_runs = names[:10] if n > 10_000 else names  # json is slow
+            start = time.perf_counter()
+            for name in json_runs:
+                json_lookup(seed, name)
+            json_ms = (time.perf_counter() - start) / len(json_runs) * 1000
+
+            cache = RxNormCache(os.path.join(tmp, f"cache{n}.sqlite3"), seed=seed, lru_size=0)
+            cache.get("warm up")  # create and import the database
+            start = time.perf_counter()
+            for name in names:
+                cache.get(name)
+            sqlite_ms = (time.perf_counter() - start) / len(names) * 1000
+
+            cache = RxNormCache(cache.path)  # LRU tier in front
+            for name in names:
+                cache.get(name)
+            start = time.perf_counter()
+            for name in names:
+                cache.get(name)
+            lru_ms = (time.perf_counter() - start) / len(names) * 1000
+            print(f"{n:>8} {json_ms:>10.3f} {sqlite_ms:>12.4f} {lru_ms:>9.4f}")
+
+        # concurrent writers must not lose each other's entries
+        cache = RxNormCache(os.path.join(tmp, "concurrent.sqlite3"))
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda i: cache.set(f"drug{i}", entry(i)), range(2000)))
+        print(f"concurrent upserts: {len(cache)} of 2000 entries kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark: reporting-country choropleth, startup and per-click cost
+
+Before: the shapefile is read with geopandas at startup and every click
+merges it with the counts and sends the full polygons
+(`legacy.legacy_choropleth()`). After: the simplified GeoJSON
+(`geo.py`) is loaded once and downloaded once by the browser, a click
+sends ISO codes and counts only (`update_drilldown()`).
+
+Usage: python -m benchmarks.bench_choropleth
+"""
+import random
+import time
+from .django_env import setup
+from .legacy import legacy_choropleth, legacy_load_shapes
+
+COUNTRIES = [5, 50, 150]  # number of reporting countries of a drug
+CLICKS = 5
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    views = setup()
+    from my_app import geo
+
+    shp_file, legacy_startup = timed(legacy_load_shapes)
+    geo._loaded.clear()
+    _, startup = timed(geo.country_geojson)
+    body, _ = geo.country_geojson_bytes()
+    print(f"startup: shapefile read {legacy_startup:.3f} s, GeoJSON load {startup:.3f} s")
+    print(f"GeoJSON downloaded once per browser: {len(body) / 1024:.0f} KB\n")
+
+    codes = sorted(geo.country_codes())
+    rng = random.Random(507)
+    print(f"{'countries':>9} {'before (ms)':>12} {'before (KB)':>12} {'after (ms)':>11} {'after (KB)':>11}")
+    for n in COUNTRIES:
+        reporting = [{"term": iso, "count": rng.randint(1, 1000)} for iso in rng.sample(codes, n)]
+        views.openfda_cache.set("bench", {"reporting_country": reporting})
+        click = {"points": [{"text": "RxCUI: bench<br>"}]}
+
+        before = after = 0
+        for _ in range(CLICKS):
+            fig, seconds = timed(legacy_choropleth, shp_file, reporting)
+            before += seconds
+            legacy_bytes = len(fig.to_json().encode())
+            fig, seconds = timed(views.update_drilldown, click, "Report nation")
+            after += seconds
+            new_bytes = len(fig.to_json().encode())
+        print(
+            f"{n:>9} {before / CLICKS * 1000:>12.1f} {legacy_bytes / 1024:>12.0f} "
+            f"{after / CLICKS * 1000:>11.1f} {new_bytes / 1024:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
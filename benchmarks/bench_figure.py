@@ -0,0 +1,57 @@
+"""Benchmark: network figure construction time at 1k - 50k interactions
+
+Compares the original per-edge loop building the edge lines and hover
+markers (`legacy.legacy_edge_traces()`) with the vectorized
+`edgeCoordinates()`, checks that both give the same arrays, and reports
+the construction time of the whole figure (`buildGraphVisualization()`).
+Layouts are computed before timing.
+
+Usage: python -m benchmarks.bench_figure
+"""
+import time
+import networkx as nx
+import numpy as np
+from .django_env import setup
+from .legacy import legacy_edge_traces
+from .synthetic import random_graph
+
+EDGES = [1_000, 10_000, 50_000]
+
+
+def same(a, b):
+    """Compare coordinate sequences with `None` breaks"""
+    a = np.array([np.nan if v is None else v for v in a], dtype=float)
+    b = np.array([np.nan if v is None else v for v in b], dtype=float)
+    return a.shape == b.shape and np.allclose(a, b, equal_nan=True)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    views = setup()
+    from my_app.layout import compute_layout
+
+    print(f"{'edges':>7} {'legacy loop (s)':>16} {'vectorized (s)':>15} {'identical':>10} {'figure (s)':>11}")
+    for e in EDGES:
+        graph = random_graph(e // 2, avg_degree=4)
+        G = nx.Graph()
+        G.add_nodes_from(graph.ids)
+        for f, t, _, severity, info in graph.edges():
+            G.add_edge(f, t, severity=severity, additional_info=info)
+        pos = compute_layout(G)
+
+        expected, legacy = timed(legacy_edge_traces, G, pos)
+        result, vectorized = timed(views.edgeCoordinates, G, pos, 15)
+        identical = all(same(a, b) for a, b in zip(expected[:4], result[:4]))
+        identical = identical and list(expected[4]) == list(result[4])
+
+        _, figure = timed(views.buildGraphVisualization, graph)
+        print(f"{graph.num_edges:>7} {legacy:>16.3f} {vectorized:>15.3f} {str(identical):>10} {figure:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
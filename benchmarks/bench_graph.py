@@ -0,0 +1,68 @@
+"""Benchmark: memory and build time of the compact graph vs. the original
+
+Usage: python -m benchmarks.bench_graph
+"""
+import random
+import time
+import tracemalloc
+from my_app.graph import Graph
+from .legacy import LegacyGraph
+from .synthetic import SEVERITIES
+
+SIZES = [1_000, 10_000, 100_000]  # number of interactions
+
+
+def interaction_records(n_edges, seed=507):
+    """Generate `add_edge()` arguments the way a parsed JSON response has them
+
+    Every record gets its own string objects (as `json.loads` would create),
+    so duplicated strings are not shared between edges by accident.
+    """
+    rng = random.Random(seed)
+    n_vertices = max(2, n_edges // 4)
+    records = []
+    for _ in range(n_edges):
+        a, b = rng.sample(range(n_vertices), 2)
+        records.append((
+            str(a), f"drug {a} 10 MG Oral Tablet",
+            str(b), f"drug {b} 10 MG Oral Tablet",
+            "".join(["Drug", "Bank"]),
+            rng.choice(SEVERITIES),
+            f"The metabolism of drug {a} can be decreased when combined with drug {b}.",
+        ))
+    return records
+
+
+def build(graph_cls, records):
+    graph = graph_cls()
+    for record in records:
+        graph.add_edge(*record)
+    return graph
+
+
+def measure(graph_cls, records):
+    """Return build time (s) and memory held by the graph (bytes)"""
+    start = time.perf_counter()
+    build(graph_cls, records)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    graph = build(graph_cls, records)
+    if isinstance(graph, Graph):
+        graph.csr()  # count the neighbor arrays too
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, size
+
+
+def main():
+    print(f"{'edges':>8} {'graph':>8} {'build (s)':>10} {'memory (MB)':>12}")
+    for n in SIZES:
+        records = interaction_records(n)
+        for label, graph_cls in (("legacy", LegacyGraph), ("compact", Graph)):
+            elapsed, size = measure(graph_cls, records)
+            print(f"{n:>8} {label:>8} {elapsed:>10.3f} {size / 2**20:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark: incremental interaction graph cache against a stub server
+
+Usage: python -m benchmarks.bench_graph_cache
+"""
+import json
+import os
+import tempfile
+import time
+from my_app.cache import GraphCache
+from my_app.interactions import FixtureInteractionSource, NIHInteractionSource
+from . import django_env
+from .stub_server import StubServer
+from .synthetic import graph_response, random_graph
+
+LATENCY = 0.1  # seconds per upstream request
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture = os.path.join(tmp, "interactions.json")
+        with open(fixture, "w") as f:
+            json.dump(graph_response(random_graph(400, avg_degree=8)), f)
+
+        with StubServer(LATENCY, interactions=FixtureInteractionSource(fixture)) as stub:
+            views = django_env.setup()
+            views.interaction_source = NIHInteractionSource(f"{stub.url}/REST")
+            cache = GraphCache()
+
+            base = [str(i) for i in range(200)]
+            steps = [
+                ("cold query, 200 CUIs", base),
+                ("same query", base),
+                ("one drug added (+3 CUIs)", base + ["200", "201", "202"]),
+                ("one drug removed", base[3:]),
+                ("no cache, 203 CUIs", None),
+            ]
+            print(f"{'step':<26} {'time (s)':>9} {'requests':>9} {'edges':>6}")
+            for label, cuis in steps:
+                del stub.requests[:]
+                start = time.perf_counter()
+                if cuis is None:
+                    graph = views.buildInteractionGraph(base + ["200", "201", "202"])
+                else:
+                    graph = cache.get(cuis, views.buildInteractionGraph)
+                elapsed = time.perf_counter() - start
+                print(f"{label:<26} {elapsed:>9.3f} {len(stub.requests):>9} {graph.num_edges:>6}")
+            print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
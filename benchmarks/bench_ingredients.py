@@ -0,0 +1,106 @@
+"""Benchmark: queries collapsed to one product per ingredient group
+
+Builds the interaction graph of queries of the drug names in
+`my_app/cache.json` (real RxNorm products) against the NIH API stub
+server with `LATENCY` seconds per request, from
+- every product of the names, as `getRxNorm()` returns them
+- one product per ingredient group (`groupProducts()`)
+The stub's interactions are decided per pair of ingredient groups, as
+interactions of real products are, so `ingredients.expand()` of the
+grouped graph must give the product graph back, which is checked.
+Reports RxCUIs, upstream requests, interactions and build time of both.
+
+Usage: python -m benchmarks.bench_ingredients
+"""
+import json
+import os
+import tempfile
+import time
+import zlib
+from my_app.cache import GraphCache, RxNormCache
+from my_app.graph import Graph
+from my_app.ingredients import concept, expand
+from my_app.interactions import InteractionSource, NIHInteractionSource
+from . import django_env
+from .stub_server import StubServer
+from .synthetic import SEVERITIES, graph_response
+
+LATENCY = 0.02  # seconds per upstream request
+DENSITY = 0.25  # probability that two ingredient groups interact
+QUERIES = [
+    "tylenol, warfarin",
+    "sildenafil, levothyroxine, omeprazole",
+    "acetaminophen, warfarin, zocor",
+    "dextromethorphan, ondansetron, dofetilide",
+    "all 13 cached names",
+]
+
+
+class IngredientInteractionSource(InteractionSource):
+    """Interactions decided by a hash of the pair of ingredient groups"""
+    def __init__(self, cui_name, density=DENSITY):
+        self.names = cui_name
+        self.ingredient = {cui: concept(cui, name).ingredient for cui, name in cui_name.items()}
+        self.density = density
+
+    def fetch(self, cui_list):
+        graph = Graph()
+        cui_list = sorted(set(cui_list))
+        for i, a in enumerate(cui_list):
+            for b in cui_list[i + 1:]:
+                x, y = sorted((self.ingredient[a], self.ingredient[b]))
+                h = zlib.crc32(f"{x}+{y}".encode())
+                if x != y and h % 1000 < self.density * 1000:
+                    graph.add_edge(
+                        a, self.names[a], b, self.names[b], "DrugBank", SEVERITIES[h % 4],
+                        f"The metabolism of {x} can be decreased when combined with {y}.",
+                    )
+        return graph_response(graph) if graph.num_edges else {}
+
+
+def edge_set(graph):
+    return {(min(f, t), max(f, t), severity) for f, t, _, severity, _ in graph.edges()}
+
+
+def main():
+    with open("./my_app/cache.json") as f:
+        seed = json.load(f)
+    cui_name = {cui: name for products in seed.values() for cui, name in products.items()}
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubServer(LATENCY, interactions=IngredientInteractionSource(cui_name)) as stub:
+        views = django_env.setup(LOG_LEVEL="WARNING")
+        views.rxnorm_cache = RxNormCache(os.path.join(tmp, "rxnorm.sqlite3"))
+        for name, products in seed.items():
+            views.rxnorm_cache.set(name, products)
+        views.interaction_source = NIHInteractionSource(f"{stub.url}/REST")
+
+        print(
+            f"{'query':<42} {'path':<9} {'rxcuis':>7} {'requests':>9} "
+            f"{'edges':>7} {'time':>8} {'same':>5}"
+        )
+        for query in QUERIES:
+            text = ", ".join(seed) if query.startswith("all") else query
+            rows = {}
+            for path in ("products", "grouped"):
+                views.graph_cache = GraphCache()
+                del stub.requests[:]
+                start = time.perf_counter()
+                if path == "products":
+                    cuis = list(views.getRxNorm(text))
+                    graph = views.graph_cache.get(cuis, views.buildInteractionGraph)
+                else:
+                    graph, groups, _ = views.queryGraph(text)
+                    cuis = list(groups)
+                elapsed = time.perf_counter() - start
+                rows[path] = (len(cuis), len(stub.requests), graph.num_edges, elapsed, graph)
+            same = edge_set(expand(rows["grouped"][4], groups)) == edge_set(rows["products"][4])
+            for path, (n_cuis, requests, edges, elapsed, _) in rows.items():
+                print(
+                    f"{query:<42} {path:<9} {n_cuis:>7} {requests:>9} {edges:>7} "
+                    f"{elapsed:>7.2f}s {str(same) if path == 'grouped' else '':>5}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Benchmark: overhead of the request instrumentation (`instrument.py`)
+
+Runs the same measurements in two subprocesses, with instrumentation
+enabled (the default) and disabled (`INSTRUMENTATION=0`):
+- the cost of an empty `with span(...)` block and of a call through a
+  `@span` decorated function, over a plain function call
+- the median time of the network figure of a 200-vertex graph (layout
+  cached), which records three spans
+- the median time of a whole drill-down callback request through the
+  middleware, Django and django_plotly_dash (OpenFDA data cached)
+
+Usage: python -m benchmarks.bench_instrument
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CALLS = 1_000_000
+REPEAT = 20
+
+
+def per_call_ns(fn, n=CALLS):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def median_ms(fn, repeat=REPEAT):
+    fn()  # warm up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def measure():
+    """Run in the subprocess, print the results as json"""
+    from .django_env import setup
+    from .synthetic import random_graph
+    views = setup()
+    from django.test import Client
+    from my_app.instrument import span
+
+    def plain():
+        pass
+
+    @span("bench")
+    def decorated():
+        pass
+
+    def with_span():
+        with span("bench"):
+            pass
+
+    plain_ns = per_call_ns(plain)
+    results = {
+        "with span() (ns)": per_call_ns(with_span) - plain_ns,
+        "@span call (ns)": per_call_ns(decorated) - plain_ns,
+    }
+
+    graph = random_graph(200, avg_degree=4)
+    results["figure, 200 vertices (ms)"] = median_ms(lambda: views.buildGraphVisualization(graph))
+
+    cui = "123"
+    views.openfda_cache.set(cui, {"sex": {"male": 3, "female": 5}})
+    body = json.dumps({
+        "output": "drill-down.figure",
+        "outputs": {"id": "drill-down", "property": "figure"},
+        "inputs": [
+            {"id": "drug-network", "property": "clickData",
+             "value": {"points": [{"text": f"RxCUI: {cui}<br>"}]}},
+            {"id": "dd", "property": "value", "value": "Patient Sex"},
+        ],
+        "changedPropIds": ["drug-network.clickData"],
+    })
+    client = Client()
+    url = "/django_plotly_dash/app/drug-interaction/_dash-update-component"
+    results["drill-down request (ms)"] = median_ms(
+        lambda: client.post(url, body, content_type="application/json")
+    )
+    print(json.dumps(results))
+
+
+def run(enabled):
+    env = dict(os.environ, INSTRUMENTATION="1" if enabled else "0", LOG_LEVEL="WARNING")
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_instrument", "--child"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    if "--child" in sys.argv:
+        measure()
+        return
+    # django_plotly_dash keeps its app registry in the database
+    env = dict(os.environ, SECRET_KEY="benchmark", FDA_KEY="benchmark")
+    subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], env=env, check=True)
+
+    enabled, disabled = run(True), run(False)
+    print(f"{'':>27} {'enabled':>9} {'disabled':>9}")
+    for name in enabled:
+        print(f"{name:>27} {enabled[name]:>9.1f} {disabled[name]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
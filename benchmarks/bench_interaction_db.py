@@ -0,0 +1,50 @@
+"""Benchmark: interaction queries on the local SQLite interaction database
+
+Usage: python -m benchmarks.bench_interaction_db [number of pairs]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from my_app.interactions import InteractionDatabase
+from .synthetic import SEVERITIES
+
+N_PAIRS = 1_000_000
+N_CONCEPTS = 20_000
+QUERY_SIZES = [10, 100, 300, 1000]
+
+
+def records(n_pairs, n_concepts, seed=507):
+    """Uniformly random interaction records"""
+    rng = random.Random(seed)
+    for _ in range(n_pairs):
+        a, b = rng.sample(range(n_concepts), 2)
+        yield (
+            str(a), f"drug {a}", str(b), f"drug {b}", "DrugBank",
+            rng.choice(SEVERITIES), f"The metabolism of drug {a} can be decreased by drug {b}.",
+        )
+
+
+def main():
+    n_pairs = int(sys.argv[1]) if len(sys.argv) > 1 else N_PAIRS
+    with tempfile.TemporaryDirectory() as tmp:
+        db = InteractionDatabase(os.path.join(tmp, "interactions.sqlite3"))
+        start = time.perf_counter()
+        db.ingest(records(n_pairs, N_CONCEPTS))
+        print(f"ingest of {n_pairs} records: {time.perf_counter() - start:.1f} s, {len(db)} pairs")
+
+        rng = random.Random(1)
+        print(f"{'cuis':>6} {'interactions':>13} {'query (ms)':>11}")
+        for n in QUERY_SIZES:
+            cuis = [str(c) for c in rng.sample(range(N_CONCEPTS), n)]
+            db.fetch(cuis)  # warm the page cache
+            start = time.perf_counter()
+            response = db.fetch(cuis)
+            elapsed = (time.perf_counter() - start) * 1000
+            found = sum(len(g["fullInteractionType"]) for g in response.get("fullInteractionTypeGroup", []))
+            print(f"{n:>6} {found:>13} {elapsed:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
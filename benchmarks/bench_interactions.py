@@ -0,0 +1,55 @@
+"""Benchmark: chunked parallel interaction fetching vs. random 50-CUI sampling
+
+Usage: python -m benchmarks.bench_interactions
+"""
+import json
+import os
+import random
+import tempfile
+import time
+import requests
+from my_app.interactions import FixtureInteractionSource, NIHInteractionSource, fetch_interactions
+from .stub_server import StubServer
+from .synthetic import graph_response, random_graph
+
+LATENCY = 0.1  # seconds per upstream request
+SIZES = [50, 100, 200]  # number of queried RxCUIs
+
+
+def count(response):
+    return sum(len(g["fullInteractionType"]) for g in response.get("fullInteractionTypeGroup", []))
+
+
+def sampled(base_url, cui_list):
+    """The original fetch: up to 50 RxCUIs drawn with replacement"""
+    random.seed(507)
+    cui_list = random.choices(cui_list, k=min(50, len(cui_list)))
+    return requests.get(f"{base_url}/REST/interaction/list.json?rxcuis={'+'.join(cui_list)}").json()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture = os.path.join(tmp, "interactions.json")
+        with open(fixture, "w") as f:
+            json.dump(graph_response(random_graph(max(SIZES), avg_degree=6)), f)
+        local = FixtureInteractionSource(fixture)
+
+        print(f"{'cuis':>5} {'expected':>9} {'sampled':>8} {'time (s)':>9} {'chunked':>8} {'time (s)':>9}")
+        with StubServer(LATENCY, interactions=local) as stub:
+            nih = NIHInteractionSource(f"{stub.url}/REST")
+            for n in SIZES:
+                cuis = [str(i) for i in range(n)]
+                expected = count(local.fetch(cuis))
+
+                start = time.perf_counter()
+                old = count(sampled(stub.url, cuis))
+                old_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                new = count(fetch_interactions(cuis, nih))
+                new_time = time.perf_counter() - start
+                print(f"{n:>5} {expected:>9} {old:>8} {old_time:>9.3f} {new:>8} {new_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark: interned interaction strings (`graph.edge_strings`)
+
+On a product-level dump of the drug names in `my_app/cache.json` (every
+product, interactions decided per pair of ingredient groups by
+`bench_ingredients.IngredientInteractionSource`, so every product pair
+of two ingredients repeats their description), reports
+- memory of the source / severity / description columns of the graph
+  parsed from an NIH response: lists of the parsed strings (one object
+  per interaction, as before) against id arrays plus the strings added
+  to the pool, for the whole dump and summed over the graphs of one
+  query per drug name (the strings are shared across graphs)
+- size and load time of the dump in the nested `graph.json` format
+  against the compact format of `to_nested_dict(compact=True)`, and the
+  size of the binary snapshot, with a round-trip check
+
+Usage: python -m benchmarks.bench_intern
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from my_app.graph import Graph, edge_strings, from_nested_dict, to_nested_dict
+from .bench_ingredients import IngredientInteractionSource
+
+
+def records(response):
+    for group in response.get("fullInteractionTypeGroup", ()):
+        for record in group["fullInteractionType"]:
+            yield group["sourceName"], record
+
+
+def parsed(source, cuis):
+    """The interaction response of `cuis` as parsed from the wire"""
+    return json.loads(json.dumps(source.fetch(cuis)))
+
+
+def list_columns(response):
+    """Bytes of the strings columns of the original graph: parsed strings in lists"""
+    columns = ([], [], [])
+    for source_name, record in records(response):
+        pair = record["interactionPair"][0]
+        for column, value in zip(columns, (source_name, pair["severity"], pair["description"])):
+            column.append(value)
+    strings = {id(x): x for column in columns for x in column}
+    return sum(map(sys.getsizeof, columns)) + sum(map(sys.getsizeof, strings.values()))
+
+
+def interned_columns(response):
+    """Bytes of the id columns of a `Graph` and of the strings it added to the pool"""
+    before = len(edge_strings)
+    graph = Graph()
+    for source_name, record in records(response):
+        a, b = record["minConcept"][:2]
+        pair = record["interactionPair"][0]
+        graph.add_edge(
+            a["rxcui"], a["name"], b["rxcui"], b["name"],
+            source_name, pair["severity"], pair["description"],
+        )
+    added = sum(map(sys.getsizeof, edge_strings.strings[before:]))
+    columns = (graph.edge_source_id, graph.edge_severity_id, graph.edge_info_id)
+    return sum(map(sys.getsizeof, columns)) + added, graph
+
+
+def edge_set(graph):
+    return {(min(f, t), max(f, t), *rest) for f, t, *rest in graph.edges()}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    with open("./my_app/cache.json") as f:
+        seed = json.load(f)
+    cui_name = {cui: name for products in seed.values() for cui, name in products.items()}
+    source = IngredientInteractionSource(cui_name)
+
+    response = parsed(source, list(cui_name))
+    old = list_columns(response)
+    new, graph = interned_columns(response)
+    print(
+        f"dump: {graph.num_vertices} products, {graph.num_edges} interactions, "
+        f"{len(edge_strings)} distinct strings\n"
+    )
+    print(f"{'string columns':<34} {'lists (MB)':>11} {'interned (MB)':>14} {'ratio':>7}")
+    print(f"{'whole dump':<34} {old / 2**20:>11.2f} {new / 2**20:>14.2f} {old / new:>6.1f}x")
+
+    old = new = 0
+    for products in seed.values():
+        # the strings of the dump are in the pool already, as in a long-lived worker
+        response = parsed(source, list(products))
+        old += list_columns(response)
+        new += interned_columns(response)[0]
+    print(f"{'one query per name, summed':<34} {old / 2**20:>11.2f} {new / 2**20:>14.2f} {old / new:>6.1f}x\n")
+
+    print(f"{'format':<34} {'size (MB)':>11} {'load (s)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {}
+        for label, compact in (("graph.json, nested", False), ("graph.json, compact", True)):
+            path = os.path.join(tmp, f"{compact}.json")
+            with open(path, "w") as f:
+                json.dump(to_nested_dict(graph, compact=compact), f)
+            def load():
+                with open(path) as f:
+                    return from_nested_dict(json.load(f))
+            loaded, elapsed = timed(load)
+            assert edge_set(loaded) == edge_set(graph)
+            sizes[compact] = os.path.getsize(path)
+            print(f"{label:<34} {sizes[compact] / 2**20:>11.2f} {elapsed:>14.2f}")
+        path = os.path.join(tmp, "graph.snap")
+        graph.save(path)
+        loaded, elapsed = timed(lambda: Graph.load(path))
+        assert list(loaded.edges()) == list(graph.edges())
+        print(f"{'snapshot':<34} {os.path.getsize(path) / 2**20:>11.2f} {elapsed:>14.4f}")
+        print(f"\ncompact json is {sizes[False] / sizes[True]:.1f}x smaller than nested")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Benchmark: layout time vs. graph size (cold, anchored and cached)
+
+The anchored layout splits one vertex into three, placed around it
+(as a click on an ingredient group does), after the cold layout.
+
+Usage: python -m benchmarks.bench_layout
+"""
+import time
+import networkx as nx
+from my_app import layout
+from .synthetic import random_graph
+
+SIZES = [50, 200, 400, 1000, 5000]
+
+
+def to_nx(graph):
+    G = nx.Graph()
+    G.add_nodes_from(graph.ids)
+    G.add_edges_from((f, t) for f, t, *_ in graph.edges())
+    return G
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'vertices':>8} {'method':>9} {'spring (s)':>11} {'cold (s)':>9} {'anchored (s)':>9} {'cached (ms)':>12}")
+    for n in SIZES:
+        layout.layout_cache.clear()
+        G = to_nx(random_graph(n, avg_degree=3))
+        # vertex "0" split into three, each with some of its interactions
+        grown = G.copy()
+        grown.remove_node("0")
+        anchors = {}
+        for k, neighbor in enumerate(sorted(G["0"]) or [None]):
+            anchors[f"0.{k % 3}"] = "0"
+            grown.add_node(f"0.{k % 3}")
+            if neighbor is not None:
+                grown.add_edge(f"0.{k % 3}", neighbor)
+
+        # the original unseeded spring layout
+        spring = timed(nx.spring_layout, G)[1] if n <= 1000 else float("nan")
+        _, cold = timed(layout.compute_layout, G)
+        _, anchored = timed(layout.compute_layout, grown, anchors)
+        _, cached = timed(layout.compute_layout, grown, anchors)
+        method = "spring" if n <= layout.SPRING_LIMIT else "spectral"
+        print(f"{n:>8} {method:>9} {spring:>11.3f} {cold:>9.3f} {anchored:>12.3f} {cached * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
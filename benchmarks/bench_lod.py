@@ -0,0 +1,38 @@
+"""Benchmark: network figure size and build time per rendering mode
+
+For each graph size, builds the figure in "svg" mode (annotations, 15
+hover markers per edge) and "webgl" mode (WebGL traces, hover labels,
+markers by edge length), with the default payload budget and a 1 MB one,
+and reports the server-side build time, the size of the figure json sent
+to the browser and the number of interactions shown. Layouts are
+computed before timing.
+
+Usage: python -m benchmarks.bench_lod
+"""
+import time
+from .django_env import setup
+from .synthetic import random_graph
+
+SIZES = [100, 300, 1000, 5000]
+RUNS = [("svg", None), ("webgl", None), ("webgl", 2**20)]
+
+
+def main():
+    views = setup()
+
+    print(f"{'vertices':>8} {'edges':>7} {'mode':>6} {'budget':>8} {'build (s)':>10} {'json (KB)':>10} {'shown':>7}")
+    for n in SIZES:
+        graph = random_graph(n, avg_degree=4)
+        views.buildGraphVisualization(graph)  # warm the layout cache
+        for mode, budget in RUNS:
+            start = time.perf_counter()
+            fig = views.buildGraphVisualization(graph, mode=mode, budget=budget)
+            build = time.perf_counter() - start
+            payload = len(fig.to_json().encode())
+            shown = sum(v is None for v in fig.data[0].x)
+            label = "default" if budget is None else f"{budget // 1024} KB"
+            print(f"{n:>8} {graph.num_edges:>7} {mode:>6} {label:>8} {build:>10.3f} {payload / 1024:>10.0f} {shown:>7}")
+
+
+if __name__ == "__main__":
+    main()
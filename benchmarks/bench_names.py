@@ -0,0 +1,109 @@
+"""Benchmark: drug name suggestions (`names.NameIndex`)
+
+On 10k and 100k made-up drug names, measures the build time of the
+index, the time of one name added to a built index, and the median /
+p99 latency of
+- prefix completion of the first 3 characters of a name
+- fuzzy matching of a name with one random typo, with its recall (the
+  misspelled name is in the result), against `difflib.get_close_matches()`
+  over all names on a few queries
+- `suggest()` (completion, then fuzzy matching) of typos
+
+Usage: python -m benchmarks.bench_names
+"""
+import difflib
+import random
+import statistics
+import time
+from my_app.names import NameIndex
+
+SIZES = [10_000, 100_000]
+QUERIES = 500
+DIFFLIB_QUERIES = 5
+SYLLABLES = [
+    "a", "ab", "ac", "al", "am", "an", "ar", "az", "ba", "be", "bi", "ca", "ce", "ci",
+    "co", "da", "de", "di", "do", "e", "fa", "fe", "fi", "ga", "ge", "gli", "ha", "i",
+    "la", "le", "li", "lo", "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "o", "pa",
+    "pe", "pi", "pra", "pro", "ra", "re", "ri", "ro", "sa", "se", "si", "so", "ta",
+    "te", "ti", "to", "tra", "u", "va", "ve", "vi", "xa", "za", "zo",
+]
+SUFFIXES = [
+    "mab", "nib", "pril", "sartan", "olol", "statin", "azole", "cillin", "mycin",
+    "dipine", "oxacin", "tidine", "prazole", "vir", "mide", "pam", "zepam", "done",
+]
+SALTS = ["hydrochloride", "sodium", "citrate", "sulfate", "acetate"]
+
+
+def drug_names(n, seed=507):
+    """`n` distinct made-up drug names: syllables, a stem, sometimes a salt"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) + rng.choice(SUFFIXES)
+        if rng.random() < 0.3:
+            name = f"{name} {rng.choice(SALTS)}"
+        names.add(name)
+    return sorted(names)
+
+
+def typo(rng, name):
+    """`name` with one character deleted, replaced or inserted"""
+    i = rng.randrange(len(name))
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:i] + name[i + 1:]
+    if kind == 1:
+        return name[:i] + rng.choice("abcdefghilmnoprstuvz".replace(name[i], "")) + name[i + 1:]
+    return name[:i] + rng.choice("aeiou") + name[i:]
+
+
+def latency(fn, queries):
+    """Median and p99 of `fn(query)` in microseconds"""
+    times = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return statistics.median(times) * 1e6, times[int(len(times) * 0.99)] * 1e6
+
+
+def main():
+    print(f"{'names':>7} {'measurement':<28} {'median':>10} {'p99':>10}")
+    for n in SIZES:
+        names = drug_names(n)
+        rng = random.Random(n)
+        sample = rng.sample(names, QUERIES)
+        typos = [typo(rng, name) for name in sample]
+
+        index = NameIndex()
+        start = time.perf_counter()
+        index.add(names)
+        build = time.perf_counter() - start
+        print(f"{n:>7} {'build (ms)':<28} {build * 1000:>10.0f}")
+
+        rows = [
+            ("complete 3 characters", lambda q: index.complete(q), [s[:3] for s in sample]),
+            ("fuzzy, one typo", lambda q: index.fuzzy(q), typos),
+            ("suggest, one typo", lambda q: index.suggest(q), typos),
+            ("difflib, one typo", lambda q: difflib.get_close_matches(q, names), typos[:DIFFLIB_QUERIES]),
+        ]
+        for label, fn, queries in rows:
+            median, p99 = latency(fn, queries)
+            print(f"{n:>7} {label + ' (us)':<28} {median:>10.1f} {p99:>10.1f}")
+
+        found = sum(
+            any(name == original for name, _ in index.fuzzy(q, limit=100))
+            for q, original in zip(typos, sample)
+        )
+        print(f"{n:>7} {'fuzzy recall, one typo':<28} {found / QUERIES:>10.1%}")
+
+        new = [f"{name}x" for name in rng.sample(names, 100)]
+        start = time.perf_counter()
+        for name in new:
+            index.add([name])
+        print(f"{n:>7} {'add one name (us)':<28} {(time.perf_counter() - start) / len(new) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: concurrent and cached OpenFDA drill-down fetching
+
+Usage: python -m benchmarks.bench_openfda
+"""
+import time
+import requests
+from . import django_env
+from .stub_server import StubServer
+
+LATENCY = 0.1  # seconds per upstream request
+FIELDS = [
+    "patient.patientsex",
+    "patient.patientonsetage",
+    "primarysourcecountry.exact",
+    "patient.reaction.reactionmeddrapt.exact",
+]
+
+
+def sequential(base_url, cui):
+    """The original drill-down fetch: four blocking requests in a row"""
+    return [
+        requests.get(f"{base_url}/drug/event.json?search=patient.drug.openfda.rxcui:%22{cui}%22&count={f}").json()
+        for f in FIELDS
+    ]
+
+
+def main():
+    with StubServer(LATENCY) as stub:
+        views = django_env.setup(OPENFDA_URL=stub.url)
+
+        start = time.perf_counter()
+        sequential(stub.url, "1")
+        print(f"sequential click: {time.perf_counter() - start:.3f} s")
+
+        start = time.perf_counter()
+        views.getOpenFda("1")
+        print(f"concurrent click: {time.perf_counter() - start:.3f} s")
+
+        del stub.requests[:]
+        start = time.perf_counter()
+        for _ in range(4):  # dropdown switches and re-clicks
+            views.getOpenFda("1")
+        print(f"4 re-clicks: {(time.perf_counter() - start) * 1000:.3f} ms, "
+              f"{len(stub.requests)} upstream requests")
+
+        cuis = [str(i) for i in range(2, 22)]
+        start = time.perf_counter()
+        views.prefetchOpenFda(cuis)
+        for cui in cuis:
+            prefetch = views.openfda_prefetch_flight.get(cui)
+            if prefetch is not None:
+                prefetch.result()
+        print(f"prefetch of {len(cuis)} vertices: {time.perf_counter() - start:.3f} s")
+        start = time.perf_counter()
+        for cui in cuis:
+            views.getOpenFda(cui)
+        print(f"clicks on the prefetched vertices: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+        # a click while the prefetches of a large graph are queued
+        queued = [str(i) for i in range(100, 100 + views.OPENFDA_PREFETCH_LIMIT)]
+        views.prefetchOpenFda(queued)
+        start = time.perf_counter()
+        views.getOpenFda("99")
+        print(f"click during {len(queued)} queued prefetches: {time.perf_counter() - start:.3f} s")
+        for cui in queued:
+            prefetch = views.openfda_prefetch_flight.get(cui)
+            if prefetch is not None:
+                prefetch.cancel()
+
+
+if __name__ == "__main__":
+    main()
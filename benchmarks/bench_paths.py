@@ -0,0 +1,38 @@
+"""Benchmark: exact average shortest paths vs. the original `random_walk()` sampler
+
+Usage: python -m benchmarks.bench_paths
+"""
+import random
+import time
+from my_app.graph import average_shortest_paths
+from .legacy import random_walk
+from .synthetic import random_graph
+
+SIZES = [50, 500, 1000, 5000]
+SAMPLED_SOURCES = 20  # sources timed for the sampler (it is extrapolated to V)
+
+
+def main():
+    print(f"{'vertices':>8} {'edges':>8} {'exact (s)':>10} {'sampler (s)':>12} {'speedup':>8}")
+    for n in SIZES:
+        graph = random_graph(n)
+        n_edges = sum(len(v.connectedTo) for v in graph.vert_list.values()) // 2
+
+        start = time.perf_counter()
+        average_shortest_paths(graph)
+        exact = time.perf_counter() - start
+
+        # the sampler is far too slow to run for every vertex of the larger
+        # graphs, time a few sources and extrapolate
+        random.seed(507)
+        sources = list(graph.vert_list)[:SAMPLED_SOURCES]
+        start = time.perf_counter()
+        for cui in sources:
+            random_walk(graph.vert_list.keys(), graph, cui)
+        sampler = (time.perf_counter() - start) / len(sources) * n
+
+        print(f"{n:>8} {n_edges:>8} {exact:>10.3f} {sampler:>12.3f} {sampler / exact:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark: collapsed graph view and expansion of one ingredient group
+
+On the products of the drug names in `my_app/cache.json`, with
+interactions decided per pair of ingredient groups
+(`bench_ingredients.IngredientInteractionSource`), measures
+- `quotient()` (`ingredients.collapse_graph()`) of the graph of every
+  product into one vertex per group, with a check that it gives the
+  graph of the kept products and the product pairs as multiplicities
+- the network figure of the collapsed graph
+- a click that expands one group: `ingredients.view()` (merged from
+  the product graph, as for product-level sources) and the figure
+  with the anchored layout (only the new vertices are placed), against
+  expanding every group and laying out the graph from scratch
+
+Usage: python -m benchmarks.bench_quotient
+"""
+import json
+import time
+from my_app.graph import Graph
+from my_app.ingredients import collapse, collapse_graph, expand, view
+from my_app.layout import layout_cache
+from . import django_env
+from .bench_ingredients import IngredientInteractionSource
+
+NAMES = ["acetaminophen", "warfarin", "zocor", "omeprazole", "ondansetron", "dofetilide"]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    views = django_env.setup(LOG_LEVEL="WARNING")
+    with open("./my_app/cache.json") as f:
+        seed = json.load(f)
+    cui_name = {cui: name for n in NAMES for cui, name in seed[n].items()}
+    source = IngredientInteractionSource(cui_name)
+    kept, groups = collapse(cui_name)
+
+    products = views.getInteractionGraph(source.fetch(list(cui_name)), Graph())
+    graph = views.getInteractionGraph(source.fetch(list(kept)), Graph())
+    print(
+        f"{len(cui_name)} products in {len(groups)} ingredient groups; product graph "
+        f"{products.num_vertices} vertices / {products.num_edges} interactions, collapsed "
+        f"{graph.num_vertices} / {graph.num_edges}\n"
+    )
+
+    (quotient, multiplicity, variants), elapsed = timed(lambda: collapse_graph(products, groups))
+    size = {k: len(g.products) for k, g in groups.items()}
+    same = (
+        {(min(f, t), max(f, t), s) for f, t, _, s, _ in quotient.edges()}
+        == {(min(f, t), max(f, t), s) for f, t, _, s, _ in graph.edges()}
+        and all(
+            m == size[f] * size[t] for (f, t, *_), m in zip(quotient.edges(), multiplicity)
+        )
+        and not variants  # one interaction per pair of groups
+    )
+    print(f"{'quotient of the product graph':<44} {elapsed * 1000:>9.1f} ms  same: {same}")
+
+    layout_cache.clear()
+    (shown, anchors, mult, variants), elapsed = timed(lambda: view(graph, groups, (), products))
+    _, figure = timed(lambda: views.buildGraphVisualization(
+        shown, groups=groups, anchors=anchors, multiplicity=mult, variants=variants
+    ))
+    print(f"{'collapsed view + figure':<44} {(elapsed + figure) * 1000:>9.1f} ms")
+
+    # the group with the most products that has interactions
+    largest = max((k for k in groups if k in graph.vert_list), key=lambda k: size[k])
+    (shown, anchors, mult, variants), elapsed = timed(
+        lambda: view(graph, groups, [largest], products)
+    )
+    _, figure = timed(lambda: views.buildGraphVisualization(
+        shown, groups=groups, anchors=anchors, multiplicity=mult, variants=variants
+    ))
+    print(
+        f"{f'click: expand {groups[largest].ingredient} ({size[largest]})':<44} "
+        f"{(elapsed + figure) * 1000:>9.1f} ms  (view {elapsed * 1000:.1f} ms, "
+        f"{shown.num_vertices} vertices, {len(anchors)} placed)"
+    )
+
+    layout_cache.clear()
+    full, elapsed = timed(lambda: expand(graph, groups))
+    _, figure = timed(lambda: views.buildGraphVisualization(full))
+    print(
+        f"{'every group expanded, cold layout':<44} {(elapsed + figure) * 1000:>9.1f} ms  "
+        f"({full.num_vertices} vertices)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark: single-pass `risk_report()` against a straightforward version
+
+On sparse graphs of 10k - 100k interactions, times `risk_report()`
+against `naive_report()`, which computes the same aggregates one at a
+time with networkx: weighted degrees of a networkx multigraph, a sort of
+all interactions for the top k, and `nx.connected_components()`.
+Checks that both give the same scores, top interactions and components.
+
+Usage: python -m benchmarks.bench_risk
+"""
+import time
+import networkx as nx
+from my_app.graph import SEVERITY_WEIGHT, UNKNOWN_SEVERITY_WEIGHT, risk_report
+from .synthetic import sparse_graph
+
+SIZES = [10_000, 50_000, 100_000]  # number of interactions
+TOP_K = 10
+
+
+def naive_report(graph, top_k):
+    """Drug scores, top interactions and component scores of `graph`"""
+    def weight(severity):
+        return SEVERITY_WEIGHT.get(severity, UNKNOWN_SEVERITY_WEIGHT)
+
+    edges = list(graph.edges())  # (RxCUI, RxCUI, source, severity, description)
+    G = nx.MultiGraph()
+    G.add_nodes_from(graph.ids)
+    G.add_edges_from((e[0], e[1], {"weight": weight(e[3])}) for e in edges)
+    scores = dict(G.degree(weight="weight"))
+
+    ranked = sorted(enumerate(edges), key=lambda pair: (-weight(pair[1][3]), pair[0]))
+    top = [(e[0], e[1]) for _, e in ranked[:top_k]]
+
+    components = sorted(sum(scores[cui] for cui in c) / 2 for c in nx.connected_components(G))
+    return scores, top, components
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'edges':>8} {'vertices':>9} {'risk_report':>12} {'networkx':>9} {'speedup':>8} {'same':>5}")
+    for n in SIZES:
+        graph = sparse_graph(n)
+        report, fast = timed(lambda: risk_report(graph, TOP_K))
+        (scores, top, components), naive = timed(lambda: naive_report(graph, TOP_K))
+        same = (
+            {d["rxcui"]: d["score"] for d in report["drugs"]} == scores
+            and [tuple(d["rxcui"] for d in i["drugs"]) for i in report["top_interactions"]] == top
+            and sorted(c["score"] for c in report["components"]) == components
+        )
+        print(
+            f"{graph.num_edges:>8} {graph.num_vertices:>9} {fast:>11.3f}s {naive:>8.3f}s "
+            f"{naive / fast:>7.1f}x {str(same):>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark: concurrent RxNorm name resolution against a stub server
+
+Usage: python -m benchmarks.bench_rxnorm
+"""
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from my_app.cache import RxNormCache
+from . import django_env
+from .stub_server import StubServer
+
+LATENCY = 0.1  # seconds per upstream request
+NAMES = [f"drug{i}" for i in range(10)]
+
+
+def sequential(base_url, names):
+    """The original resolution: one blocking request per name"""
+    cui_name = {}
+    for q in names:
+        response = requests.get(f"{base_url}/REST/drugs.json?name={q}").json()
+        for i in response["drugGroup"]["conceptGroup"]:
+            for j in i.get("conceptProperties", []):
+                cui_name[j["rxcui"]] = j["name"]
+    return cui_name
+
+
+def main():
+    with StubServer(LATENCY) as stub, tempfile.TemporaryDirectory() as tmp:
+        views = django_env.setup(RXNAV_URL=f"{stub.url}/REST")
+        views.rxnorm_cache = RxNormCache(f"{tmp}/cache.sqlite3")
+        query = ", ".join(NAMES)
+
+        start = time.perf_counter()
+        expected = sequential(stub.url, NAMES)
+        print(f"sequential, {len(NAMES)} names: {time.perf_counter() - start:.3f} s")
+
+        start = time.perf_counter()
+        assert views.getRxNorm(query) == expected
+        print(f"concurrent, {len(NAMES)} names: {time.perf_counter() - start:.3f} s")
+
+        start = time.perf_counter()
+        views.getRxNorm(query)
+        print(f"cached, {len(NAMES)} names: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+        # overlapping concurrent queries share in-flight requests
+        views.rxnorm_cache = RxNormCache(f"{tmp}/dedup.sqlite3")
+        del stub.requests[:]
+        queries = [", ".join(NAMES[i:i + 5]) for i in range(0, 6)]
+        with ThreadPoolExecutor(len(queries)) as pool:
+            list(pool.map(views.getRxNorm, queries))
+        print(f"{len(queries)} overlapping queries: {len(stub.requests)} upstream requests "
+              f"for {len(NAMES)} distinct names")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: batch regimen screening against one query per regimen
+
+Screens random regimens of 2 - 10 drugs, drawn from 5,000 drugs that
+interact with about 100 others each, with
+- one query per regimen: `getRxNorm()`, the interaction graph through
+  `graph_cache` and `risk_report()`, as the query box does
+- `screenRegimens()`: names resolved once per batch, interactions of
+  the distinct regimens fetched in parallel into one graph
+against two interaction sources: the SQLite interaction database (RxNorm
+names cached), and the RxNorm and NIH API stub server with `LATENCY`
+seconds per request (RxNorm names not cached). Reports regimens per
+second, the upstream requests and whether the batch path meets `TARGET`
+regimens per second on the database.
+
+Usage: python -m benchmarks.bench_screen
+"""
+import os
+import random
+import tempfile
+import time
+from my_app.cache import GraphCache, RxNormCache
+from my_app.interactions import InteractionDatabase, NIHInteractionSource
+from . import django_env
+from .stub_server import StubServer
+from .synthetic import HashInteractionSource, random_graph
+
+DRUGS = 5_000
+REGIMENS = 5_000
+SAMPLE = 300  # regimens screened one query at a time
+LATENCY = 0.05  # seconds per upstream request
+TARGET = 1_000  # regimens per second on the interaction database
+
+
+def regimens(names, n, seed=507):
+    rng = random.Random(seed)
+    return [(i, rng.sample(names, rng.randint(2, 10)), None) for i in range(n)]
+
+
+def one_by_one(views, batch):
+    for _, drugs, _ in batch:
+        graph, _, _ = views.queryGraph(", ".join(drugs))
+        views.risk_report(graph, 3)
+
+
+def run(views, label, batch, stub=None, tmp=None):
+    """Time both paths on fresh caches, print one row each
+
+    With a stub server, the RxNorm cache starts empty for both paths.
+    """
+    rows = []
+    for k, path in enumerate(("one query per regimen", "screenRegimens()")):
+        views.graph_cache = GraphCache()
+        if stub is not None:
+            views.rxnorm_cache = RxNormCache(os.path.join(tmp, f"rxnorm-{k}.sqlite3"))
+            del stub.requests[:]
+        n = SAMPLE if path.startswith("one") else len(batch)
+        start = time.perf_counter()
+        if path.startswith("one"):
+            one_by_one(views, batch[:n])
+        else:
+            for _ in views.screenRegimens(batch):
+                pass
+        elapsed = time.perf_counter() - start
+        requests = len(stub.requests) if stub is not None else "-"
+        rows.append(n / elapsed)
+        print(f"{label:<16} {path:<22} {n:>9} {elapsed:>8.2f}s {n / elapsed:>10.0f} {requests:>9}")
+    return rows
+
+
+def main():
+    views = django_env.setup(LOG_LEVEL="WARNING")
+    graph = random_graph(DRUGS, avg_degree=100)
+    names = [f"drug {cui}" for cui in graph.ids]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        views.rxnorm_cache = RxNormCache(os.path.join(tmp, "rxnorm.sqlite3"))
+        db = InteractionDatabase(os.path.join(tmp, "interactions.sqlite3"))
+        db.ingest(
+            (f, graph.vert_list[f].name, t, graph.vert_list[t].name, source, severity, info)
+            for f, t, source, severity, info in graph.edges()
+        )
+        for name, cui in zip(names, graph.ids):
+            views.rxnorm_cache.set(name, {cui: name})
+        batch = regimens(names, REGIMENS)
+
+        print(f"{'source':<16} {'path':<22} {'regimens':>9} {'time':>9} {'per second':>10} {'requests':>9}")
+        views.interaction_source = db
+        _, batch_rate = run(views, "database", batch)
+
+        # the stub resolves names to its own RxCUIs, interactions among any
+        # RxCUIs are made up with the density of the database
+        density = graph.num_edges / (DRUGS * (DRUGS - 1) / 2)
+        with StubServer(LATENCY, interactions=HashInteractionSource(density)) as stub:
+            views.RXNAV_URL = f"{stub.url}/REST"
+            views.interaction_source = NIHInteractionSource(f"{stub.url}/REST")
+            run(views, f"NIH stub {LATENCY * 1000:.0f} ms", batch[:2_000], stub, tmp)
+
+    met = "met" if batch_rate >= TARGET else "NOT met"
+    print(f"\ntarget: {TARGET} regimens/s on the database, {met} ({batch_rate:.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
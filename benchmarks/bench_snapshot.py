@@ -0,0 +1,47 @@
+"""Benchmark: binary graph snapshot vs. the `graph.json` nested dictionary
+
+The round trip of both formats is checked by `my_app/tests.py`.
+
+Usage: python -m benchmarks.bench_snapshot
+"""
+import json
+import os
+import tempfile
+import time
+from my_app.graph import Graph, from_nested_dict, to_nested_dict
+from .synthetic import random_graph
+
+SIZES = [2_000, 20_000, 100_000]  # vertices, with an average degree of 10
+
+
+def main():
+    print(f"{'edges':>8} {'json (MB)':>10} {'load (s)':>9} {'snapshot (MB)':>14} "
+          f"{'load (ms)':>10} {'1st query (ms)':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in SIZES:
+            graph = random_graph(n, avg_degree=10)
+            json_path = os.path.join(tmp, f"graph{n}.json")
+            snapshot_path = os.path.join(tmp, f"graph{n}.snapshot")
+            with open(json_path, "w") as f:
+                json.dump(to_nested_dict(graph), f)
+            graph.save(snapshot_path)
+
+            start = time.perf_counter()
+            with open(json_path, "r") as f:
+                from_nested_dict(json.load(f))
+            json_load = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = Graph.load(snapshot_path)
+            snapshot_load = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            vertex = loaded.vert_list[str(n // 2)]
+            [edge.additional_info for edge in vertex.connectedTo.values()]
+            first_query = (time.perf_counter() - start) * 1000
+
+            print(f"{graph.num_edges:>8} {os.path.getsize(json_path) / 2**20:>10.1f} {json_load:>9.2f} "
+                  f"{os.path.getsize(snapshot_path) / 2**20:>14.1f} {snapshot_load:>10.2f} {first_query:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark: cold-start time and memory of a worker and of manage.py
+
+Each scenario runs in a fresh interpreter, the best of `RUNS` wall times
+and the peak RSS of the process are reported:
+- worker boot: WSGI application and URL configuration (imports views.py)
+- first figure: worker boot plus one network figure, i.e. the cost a
+  lazily loaded dependency moves to the first request
+- manage.py migrate: the release step of the Procfile
+Then the slowest packages imported by a worker boot (`-X importtime`,
+cumulative, so a package includes the packages it imports).
+
+Usage: python -m benchmarks.bench_startup
+"""
+import os
+import subprocess
+import sys
+import time
+
+RUNS = 3
+BOOT = "from mjpan507.wsgi import application; import mjpan507.urls"
+SCENARIOS = {
+    "worker boot": [sys.executable, "-c", BOOT],
+    "first figure": [
+        sys.executable,
+        "-c",
+        BOOT + "; from my_app import views; from benchmarks.synthetic import random_graph; "
+        "views.buildGraphVisualization(random_graph(50))",
+    ],
+    "manage.py migrate": [sys.executable, "manage.py", "migrate", "-v", "0"],
+}
+
+
+def run(cmd, env):
+    """Run a command, return its wall time and peak RSS in MB"""
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"{cmd} failed with status {status}")
+    return elapsed, usage.ru_maxrss / 1024
+
+
+def import_times(env, top=12):
+    """Slowest packages imported by a worker boot as (package, cumulative ms)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if "." not in name and not name.startswith("_"):  # top-level packages
+            rows.append((name, int(cumulative) / 1000))
+    return sorted(rows, key=lambda row: -row[1])[:top]
+
+
+def main():
+    env = dict(os.environ, SECRET_KEY="benchmark", FDA_KEY="benchmark", PYTHONPATH=os.getcwd())
+    created_db = not os.path.exists("db.sqlite3")
+    try:
+        print(f"{'scenario':>18} {'wall (s)':>9} {'peak RSS (MB)':>14}")
+        for name, cmd in SCENARIOS.items():
+            results = [run(cmd, env) for _ in range(RUNS)]
+            wall = min(r[0] for r in results)
+            rss = max(r[1] for r in results)
+            print(f"{name:>18} {wall:>9.2f} {rss:>14.0f}")
+    finally:
+        if created_db and os.path.exists("db.sqlite3"):
+            os.remove("db.sqlite3")
+
+    print("\nslowest packages imported by a worker boot:")
+    for module, ms in import_times(env):
+        print(f"{module:>40} {ms:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark: streaming parse of large interaction responses
+
+Writes NIH-shape interaction dumps (`fullInteractionTypeGroup` json) of
+`SIZES_MB` megabytes and builds the interaction graph of each in a fresh
+process, reporting the wall time and the peak memory above the process
+baseline of
+- `json.load()` of the whole file, then `getInteractionGraph()` of the
+  response (as before)
+- `jsonstream.interaction_records()` over the file in chunks, straight
+  into `addInteractions()`
+- the streaming parse alone (records counted, not kept)
+with a check that both graphs have the same interactions.
+
+Usage: python -m benchmarks.bench_stream [size in MB ...]
+"""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from .synthetic import SEVERITIES
+
+SIZES_MB = [100, 300]
+N_CONCEPTS = 50_000
+SOURCES = ["DrugBank", "ONCHigh"]
+METHODS = ["load", "stream", "parse"]
+
+
+def write_dump(path, size_mb, seed=507):
+    """Write random interactions in the NIH json shape, about `size_mb` MB"""
+    rng = random.Random(seed)
+    limit = size_mb * 2**20
+    pairs = set()
+    with open(path, "w") as f:
+        f.write('{"nlmDisclaimer": "synthetic", "fullInteractionTypeGroup": [')
+        per_source = limit // len(SOURCES)
+        for k, source in enumerate(SOURCES):
+            f.write(", " if k else "")
+            f.write(f'{{"sourceDisclaimer": "", "sourceName": "{source}", "fullInteractionType": [')
+            written = 0
+            while written < per_source:
+                a, b = rng.sample(range(N_CONCEPTS), 2)
+                if (min(a, b), max(a, b)) in pairs:
+                    continue  # one record per pair, as the graph keeps
+                pairs.add((min(a, b), max(a, b)))
+                record = json.dumps({
+                    "comment": "",
+                    "minConcept": [
+                        {"rxcui": str(a), "name": f"drug {a}", "tty": "SCD"},
+                        {"rxcui": str(b), "name": f"drug {b}", "tty": "SCD"},
+                    ],
+                    "interactionPair": [{
+                        "interactionConcept": [],
+                        "severity": rng.choice(SEVERITIES),
+                        "description": f"The metabolism of drug {a} can be decreased when combined with drug {b}.",
+                    }],
+                })
+                f.write((", " if written else "") + record)
+                written += len(record) + 2
+            f.write("]}")
+        f.write("]}")
+
+
+def run(method, path):
+    """Build the graph of a dump with one method, in this process"""
+    from my_app.jsonstream import file_chunks, interaction_records
+    from . import django_env
+    views = django_env.setup(LOG_LEVEL="WARNING")
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if method == "load":
+        with open(path) as f:
+            graph = views.getInteractionGraph(json.load(f))
+    else:
+        with open(path, "rb") as f:
+            records = interaction_records(file_chunks(f))
+            if method == "stream":
+                graph = views.addInteractions(records)
+            else:
+                n = sum(1 for _ in records)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline  # KB on Linux
+    edges = graph.num_edges if method != "parse" else n
+    checksum = hash(frozenset(graph.edges())) if method != "parse" else None
+    print(json.dumps({"time": elapsed, "peak_mb": peak / 1024, "edges": edges, "checksum": checksum}))
+
+
+def measure(method, path):
+    # a fresh process each, so every peak starts from the same baseline
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_stream", "--run", method, path],
+        capture_output=True, text=True, env={**os.environ, "PYTHONHASHSEED": "0"},
+    )
+    if out.returncode:
+        return None  # e.g. out of memory
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ["--run"]:
+        return run(*sys.argv[2:4])
+    sizes = [int(s) for s in sys.argv[1:]] or SIZES_MB
+    print(f"{'file (MB)':>9} {'method':<28} {'interactions':>12} {'time (s)':>9} {'peak (MB)':>10} {'same':>5}")
+    labels = {
+        "load": "json.load + graph",
+        "stream": "streaming into graph",
+        "parse": "streaming parse only",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"dump-{size}.json")
+            write_dump(path, size)
+            results = {method: measure(method, path) for method in METHODS}
+            for method, r in results.items():
+                if r is None:
+                    print(f"{os.path.getsize(path) / 2**20:>9.0f} {labels[method]:<28} {'failed':>12}")
+                    continue
+                same = ""
+                if method == "stream" and results["load"] is not None:
+                    same = str(r["checksum"] == results["load"]["checksum"])
+                print(
+                    f"{os.path.getsize(path) / 2**20:>9.0f} {labels[method]:<28} {r['edges']:>12} "
+                    f"{r['time']:>9.2f} {r['peak_mb']:>10.0f} {same:>5}"
+                )
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark: graph traversal API against the original `bfs()`
+
+On sparse graphs of 10k - 500k interactions, times:
+- point-to-point distance: the original `bfs()` (`legacy.legacy_bfs()`)
+  against the bidirectional `Graph.shortest_path()`, with a check that
+  both give the same distances
+- single-source distances: `Graph.distances()` against networkx
+- multi-source distances from 5 RxCUIs: one `Graph.multi_source_distances()`
+  against 5 single-source runs
+- severity-weighted path: `Graph.severity_path()`
+
+Usage: python -m benchmarks.bench_traversal
+"""
+import random
+import time
+import networkx as nx
+from .legacy import legacy_bfs
+from .synthetic import sparse_graph
+
+SIZES = [10_000, 100_000, 500_000]  # number of interactions
+QUERIES = 10
+SOURCES = 5
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'edges':>8} {'legacy bfs':>11} {'bidir. bfs':>11} {'speedup':>8} {'same':>5} "
+        f"{'distances':>10} {'networkx':>9} {'multi-src':>10} {'5 x single':>11} {'severity':>9}"
+    )
+    for n in SIZES:
+        graph = sparse_graph(n)
+        graph.csr()  # built once, not part of any timing
+        rng = random.Random(507)
+        pairs = [tuple(rng.sample(graph.ids, 2)) for _ in range(QUERIES)]
+
+        expected, legacy = timed(lambda: [legacy_bfs(graph, a, b) for a, b in pairs])
+        result, bidirectional = timed(lambda: [graph.distance(a, b) for a, b in pairs])
+
+        G = nx.Graph()
+        G.add_edges_from((f, t) for f, t, *_ in graph.edges())
+        source = pairs[0][0]
+        distances, single = timed(lambda: graph.distances(source))
+        reference, networkx = timed(lambda: nx.single_source_shortest_path_length(G, source))
+        same = expected == result and distances == dict(reference)
+
+        sources = rng.sample(graph.ids, SOURCES)
+        _, multi = timed(lambda: graph.multi_source_distances(sources))
+        _, repeated = timed(lambda: [graph.distances(s) for s in sources])
+        _, severity = timed(lambda: [graph.severity_path(a, b) for a, b in pairs])
+
+        print(
+            f"{graph.num_edges:>8} {legacy / QUERIES:>10.4f}s {bidirectional / QUERIES:>10.4f}s "
+            f"{legacy / bidirectional:>7.0f}x {str(same):>5} {single:>9.3f}s {networkx:>8.3f}s "
+            f"{multi:>9.3f}s {repeated:>10.3f}s {severity / QUERIES:>8.4f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Set up Django for benchmarks that exercise `my_app.views`"""
+import os
+
+
+def setup(**env):
+    """Configure Django and import the views
+
+    Parameters
+    ----------
+    **env :
+        Environment variables to set before the views are imported (e.g.
+        upstream URLs pointing at the stub server)
+
+    Returns
+    -------
+        The `my_app.views` module
+    """
+    os.environ.update(env)
+    # dummy keys, the benchmarks never reach the real APIs
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("FDA_KEY", "benchmark")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mjpan507.settings")
+    import django
+    django.setup()
+    from my_app import views
+    return views
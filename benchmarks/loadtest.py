@@ -0,0 +1,208 @@
+"""Load test: sync (WSGI runserver) against async (ASGI uvicorn) serving
+
+Starts the stub server (`stub_server.py`) as the upstream APIs and the
+app in a subprocess, once per serving mode, then drives the Dash
+callback endpoint with concurrent clients:
+- drill-down: a click on a new RxCUI (4 OpenFDA requests)
+- network: a query of 3 new drug names (3 RxNorm requests, the
+  interaction request and the network figure)
+Every request uses new names / RxCUIs, so no cache answers it. Reports
+requests per second, p50 / p99 latency, errors and the peak number of
+server threads.
+
+Usage: python -m benchmarks.loadtest [--requests 200] [--latency 0.1]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import httpx
+from .stub_server import StubServer
+from .synthetic import HashInteractionSource
+
+MODES = {
+    "sync": [sys.executable, "manage.py", "runserver", "--noreload", "127.0.0.1:{port}"],
+    "async": [
+        sys.executable, "-m", "uvicorn", "mjpan507.asgi:application",
+        "--port", "{port}", "--log-level", "warning",
+    ],
+}
+CONCURRENCY = [16, 64]
+ENDPOINT = "/django_plotly_dash/app/drug-interaction/_dash-update-component"
+counter = itertools.count()
+
+
+def drilldown_body():
+    """Dash callback request of a click on a new RxCUI"""
+    cui = f"9{next(counter):07d}"
+    return {
+        "output": "drill-down.figure",
+        "outputs": {"id": "drill-down", "property": "figure"},
+        "inputs": [
+            {"id": "drug-network", "property": "clickData",
+             "value": {"points": [{"text": f"RxCUI: {cui}<br>"}]}},
+            {"id": "dd", "property": "value", "value": "Patient Sex"},
+        ],
+        "changedPropIds": ["drug-network.clickData"],
+    }
+
+
+def network_body():
+    """Dash callback request of a query of 3 new drug names"""
+    names = ", ".join(f"loadtest-{next(counter)}-{time.time_ns()}" for _ in range(3))
+    return {
+        "output": "..drug-network.figure...status-div.children...risk-div.children..",
+        "outputs": [
+            {"id": "drug-network", "property": "figure"},
+            {"id": "status-div", "property": "children"},
+            {"id": "risk-div", "property": "children"},
+        ],
+        "inputs": [
+            {"id": "submit-btn", "property": "n_clicks", "value": 1},
+            {"id": "dd", "property": "value", "value": "Patient Sex"},
+            {"id": "expanded", "property": "data", "value": None},
+        ],
+        "state": [
+            {"id": "query", "property": "value", "value": names},
+            {"id": "products", "property": "value", "value": []},
+        ],
+        "changedPropIds": ["submit-btn.n_clicks"],
+    }
+
+
+WORKLOADS = {"drill-down": drilldown_body, "network": network_body}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def thread_count(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("Threads:"):
+                return int(line.split()[1])
+    return 0
+
+
+class ThreadSampler:
+    """Track the peak thread count of a process in the background"""
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.02):
+            self.peak = max(self.peak, thread_count(self.pid))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def drive(url, make_body, n_requests, concurrency):
+    """Send `n_requests` callback requests with `concurrency` clients
+
+    Returns
+    -------
+        A tuple of the latencies of the successful requests, the number of
+        errors and the wall time
+    """
+    latencies, errors = [], 0
+    remaining = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while next(remaining) < n_requests:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(ENDPOINT, json=make_body())
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+
+def wait_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            httpx.get(f"{url}/index", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per run")
+    parser.add_argument("--latency", type=float, default=0.1, help="upstream latency in seconds")
+    args = parser.parse_args()
+
+    with StubServer(args.latency, interactions=HashInteractionSource()) as stub:
+        env = dict(
+            os.environ,
+            SECRET_KEY="loadtest",
+            FDA_KEY="loadtest",
+            RXNAV_URL=f"{stub.url}/REST",
+            OPENFDA_URL=stub.url,
+            PYTHONPATH=os.getcwd(),
+        )
+        env.pop("INTERACTION_SOURCE", None)
+        # django_plotly_dash keeps its app registry in the database
+        subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], env=env, check=True)
+
+        print(f"upstream latency {args.latency * 1000:.0f} ms, {args.requests} requests per run\n")
+        print(f"{'mode':>6} {'workload':>10} {'clients':>8} {'req/s':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7} {'threads':>8}")
+        for mode, cmd in MODES.items():
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            cmd = [part.format(port=port) for part in cmd]
+            process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_ready(url, process)
+                for workload, make_body in WORKLOADS.items():
+                    asyncio.run(drive(url, make_body, 4, 4))  # warm up (lazy imports, pools)
+                    for concurrency in CONCURRENCY:
+                        with ThreadSampler(process.pid) as threads:
+                            latencies, errors, wall = asyncio.run(
+                                drive(url, make_body, args.requests, concurrency)
+                            )
+                        print(
+                            f"{mode:>6} {workload:>10} {concurrency:>8} {len(latencies) / wall:>7.1f} "
+                            f"{percentile(latencies, 0.5) * 1000:>9.0f} {percentile(latencies, 0.99) * 1000:>9.0f} "
+                            f"{errors:>7} {threads.peak:>8}"
+                        )
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
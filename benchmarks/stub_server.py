@@ -0,0 +1,131 @@
+"""Local stub of the upstream APIs for offline benchmarks
+
+The server answers with deterministic fake data after a configurable
+latency, so the concurrency of the fetch code can be measured offline.
+`StubServer.fail()` makes the next requests of a path fail, to exercise
+the retries.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def drugs(server, params):
+    """`/REST/drugs.json?name=...`: a few products per name"""
+    name = params["name"][0]
+    if name.startswith("unknown"):
+        return {"drugGroup": {"name": name}}
+    base = sum(name.encode()) * 1000
+    return {
+        "drugGroup": {
+            "name": name,
+            "conceptGroup": [
+                {"tty": "BN"},
+                {
+                    "tty": "SCD",
+                    "conceptProperties": [
+                        {"rxcui": str(base + k), "name": f"{name} {5 * (k + 1)} MG Oral Tablet", "tty": "SCD"}
+                        for k in range(3)
+                    ],
+                },
+            ],
+        }
+    }
+
+
+def drug_events(server, params):
+    """`/drug/event.json?search=...&count=...`: OpenFDA count results"""
+    field = params["count"][0]
+    if field == "patient.patientsex":
+        terms = [0, 1, 2]
+    elif field == "patient.patientonsetage":
+        terms = list(range(18, 90))
+    elif field == "primarysourcecountry.exact":
+        terms = ["US", "GB", "FR", "DE", "JP", "CA"]
+    else:
+        terms = [f"reaction {k}" for k in range(100)]
+    return {"results": [{"term": t, "count": 1000 // (k + 1)} for k, t in enumerate(terms)]}
+
+
+def interaction_list(server, params):
+    """`/REST/interaction/list.json?rxcuis=...`: answered by `server.interactions`"""
+    cuis = params["rxcuis"][0].split(" ")  # "+" is decoded to a space
+    if len(cuis) > 50:
+        return {"error": "too many rxcuis"}
+    return server.interactions.fetch(cuis)
+
+
+ROUTES = {
+    "/REST/drugs.json": drugs,
+    "/drug/event.json": drug_events,
+    "/REST/interaction/list.json": interaction_list,
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.requests.append(self.path)
+            failures = self.server.failures.get(url.path, 0)
+            if failures:
+                self.server.failures[url.path] = failures - 1
+        time.sleep(self.server.latency)
+        if failures:
+            self.send_error(503)
+            return
+        route = ROUTES.get(url.path)
+        if route is None:
+            self.send_error(404)
+            return
+        body = json.dumps(route(self.server, parse_qs(url.query))).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Run the stub in a background thread, use as a context manager
+
+    Parameters
+    ----------
+    latency : float
+        Seconds every response is delayed by
+    interactions : InteractionSource, optional
+        Answers the interaction list requests
+    """
+    def __init__(self, latency=0.1, interactions=None):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.interactions = interactions
+        self.httpd.requests = []  # paths of all requests served
+        self.httpd.failures = {}  # path: number of requests still to fail
+        self.httpd.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def fail(self, path, n=1):
+        """Answer the next `n` requests of `path` with a 503 error"""
+        with self.httpd.lock:
+            self.httpd.failures[path] = n
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,227 @@
+"""Benchmark suite: graph construction, traversal and figure building
+
+Runs every measurement on synthetic interaction graphs of each topology
+(`synthetic.TOPOLOGIES`: dense clique, hub-and-spoke, sparse) at 10 to
+100k interactions, entirely offline:
+- parse: `getInteractionGraph()` on the `fullInteractionTypeGroup` json
+- bfs: one `bfs()` query between random vertices (mean of `BFS_QUERIES`)
+- paths: `average_shortest_paths()`
+- networkx: `nxGraph()` conversion
+- layout: cold `compute_layout()` (caches cleared)
+- figure: `buildGraphVisualization()` with a cached layout, and the size
+  of its json
+Layout, paths and figure are skipped above `--max-vertices` vertices.
+Times are the best of repeated runs (see `best_time()`).
+
+Results are written to `benchmarks/results/<commit>.json` (with a
+`-dirty` suffix for uncommitted changes), so runs on different commits
+can be compared with `--compare`, which flags every measurement that got
+slower or larger by more than `--threshold`. Ratios are corrected for the
+speed of the machine during each run (see `calibrate()`).
+
+Usage: python -m benchmarks.suite [--sizes 10,100,1000] [--topologies clique,sparse]
+                                  [--max-vertices 20000] [--compare <commit or file>]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from .django_env import setup
+from .synthetic import TOPOLOGIES, graph_response
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]  # number of interactions
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+MIN_RUNS, MAX_RUNS = 3, 200
+MIN_TIME = 0.5  # repeat a measurement until it has run this many seconds
+BFS_QUERIES = 20
+# measurements, in seconds except `figure_bytes`
+METRICS = ("parse_s", "bfs_s", "paths_s", "networkx_s", "layout_s", "figure_s", "figure_bytes")
+
+
+def best_time(fn, setup=None):
+    """Best time of repeated runs of `fn()`, `setup()` runs untimed before each
+
+    Runs at least `MIN_RUNS` times, and up to `MAX_RUNS` times until
+    `MIN_TIME` seconds are spent, so fast measurements are repeated often.
+    """
+    best, spent, runs = float("inf"), 0.0, 0
+    while runs < MIN_RUNS or (spent < MIN_TIME and runs < MAX_RUNS):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best, spent, runs = min(best, elapsed), spent + elapsed, runs + 1
+    return best
+
+
+def calibrate():
+    """Time a fixed pure-Python workload (dictionary, list and string work)
+
+    Measures the speed of the machine at the time of the run: comparisons
+    divide every ratio by the ratio of the calibration times, so a busy or
+    throttled machine does not show up as a regression of everything.
+    """
+    def work():
+        table = {}
+        for i in range(20_000):
+            table[f"rxcui {i}"] = [i, i + 1]
+        return sorted(table, key=lambda k: table[k][1])
+
+    return best_time(work)
+
+
+def run_case(views, topology, n_edges, max_vertices):
+    """All measurements of one topology and size"""
+    from plotly.io.json import to_json_plotly
+    from my_app import layout
+    from my_app.graph import average_shortest_paths, bfs
+
+    response = graph_response(TOPOLOGIES[topology](n_edges))
+    graph = views.getInteractionGraph(response)
+    result = {"vertices": graph.num_vertices, "edges": graph.num_edges}
+    result["parse_s"] = best_time(lambda: views.getInteractionGraph(response))
+
+    rng = random.Random(507)
+    pairs = [tuple(rng.sample(graph.ids, 2)) for _ in range(BFS_QUERIES)]
+    result["bfs_s"] = best_time(lambda: [bfs(graph, a, b) for a, b in pairs]) / BFS_QUERIES
+
+    G = views.nxGraph(graph)
+    result["networkx_s"] = best_time(lambda: views.nxGraph(graph))
+
+    if graph.num_vertices <= max_vertices:
+        result["paths_s"] = best_time(lambda: average_shortest_paths(graph))
+
+        def clear_layouts():
+            layout.layout_cache.clear()
+
+        result["layout_s"] = best_time(lambda: layout.compute_layout(G), setup=clear_layouts)
+        # the layout stays cached from here on
+        result["figure_s"] = best_time(lambda: views.buildGraphVisualization(graph))
+        result["figure_bytes"] = len(to_json_plotly(views.buildGraphVisualization(graph)))
+    return result
+
+
+def git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def commit_name():
+    """Short commit hash, `-dirty` when the tree has uncommitted changes"""
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    changes = git("status", "--porcelain", "--untracked-files=no")
+    return f"{commit}-dirty" if changes else commit
+
+
+def load_results(ref):
+    """Results of a file path, or of the latest run of a commit (prefix)"""
+    if os.path.isfile(ref):
+        path = ref
+    else:
+        names = sorted(
+            (n for n in os.listdir(RESULTS_DIR) if n.startswith(ref) and n.endswith(".json")),
+            key=lambda n: os.path.getmtime(os.path.join(RESULTS_DIR, n)),
+        ) if os.path.isdir(RESULTS_DIR) else []
+        if not names:
+            raise SystemExit(f"no results found for {ref!r} in {RESULTS_DIR}")
+        path = os.path.join(RESULTS_DIR, names[-1])
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def compare(baseline, current, threshold):
+    """Print the ratio of every shared measurement, return the regressions"""
+    speed = current["calibration_s"] / baseline["calibration_s"]
+    print(f"\n{current['commit']} against {baseline['commit']} (ratio > {1 + threshold:.2f} is flagged)")
+    print(f"machine speed: calibration {speed:.2f}x the baseline's, times are divided by it")
+    print(f"{'case':>14} {'measurement':>13} {'before':>10} {'after':>10} {'ratio':>7}")
+    regressions = []
+    for case, after in current["results"].items():
+        before = baseline["results"].get(case)
+        if before is None:
+            continue
+        for metric in METRICS:
+            if after.get(metric) is None or not before.get(metric):
+                continue
+            ratio = after[metric] / before[metric]
+            if metric.endswith("_s"):
+                ratio /= speed
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  regression"
+                regressions.append((case, metric, ratio))
+            print(f"{case:>14} {metric:>13} {before[metric]:>10.4g} {after[metric]:>10.4g} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="default: %(default)s")
+    parser.add_argument("--topologies", default=",".join(TOPOLOGIES), help="default: %(default)s")
+    parser.add_argument(
+        "--max-vertices", type=int, default=20_000,
+        help="skip paths, layout and figure above this many vertices (default: %(default)s)",
+    )
+    parser.add_argument("--compare", help="commit (prefix) or results file to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.5,
+        help="relative slowdown reported as a regression (default: %(default)s)",
+    )
+    parser.add_argument("--no-save", action="store_true", help="don't write the results file")
+    args = parser.parse_args()
+
+    views = setup(LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    sizes = [int(s) for s in args.sizes.split(",")]
+    topologies = args.topologies.split(",")
+
+    calibration = calibrate()
+    print(f"{'case':>14} {'vertices':>8} " + " ".join(f"{m:>12}" for m in METRICS))
+    results = {}
+    for topology in topologies:
+        for n_edges in sizes:
+            case = f"{topology}/{n_edges}"
+            result = run_case(views, topology, n_edges, args.max_vertices)
+            results[case] = result
+            cells = [
+                f"{result[m]:>12.4g}" if m in result else f"{'-':>12}" for m in METRICS
+            ]
+            print(f"{case:>14} {result['vertices']:>8} " + " ".join(cells), flush=True)
+
+    # the machine is as fast as it was at its fastest
+    calibration = min(calibration, calibrate())
+    print(f"\ncalibration: {calibration:.4f} s")
+    run = {
+        "commit": commit_name(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "max_vertices": args.max_vertices,
+        "calibration_s": calibration,
+        "results": results,
+    }
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{run['commit']}.json")
+        with open(path, "w") as json_file:
+            json.dump(run, json_file, indent=1)
+        print(f"\nresults written to {path}")
+
+    if args.compare:
+        regressions = compare(load_results(args.compare), run, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
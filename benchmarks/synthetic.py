@@ -0,0 +1,141 @@
+"""Synthetic drug interaction graphs for the benchmarks"""
+import random
+import zlib
+from my_app.graph import Graph
+from my_app.interactions import InteractionSource
+
+SEVERITIES = ["high", "moderate", "low", "N/A"]
+
+
+def random_graph(n_vertices, avg_degree=4, seed=507):
+    """Build a connected random interaction graph
+
+    A random spanning tree guarantees every vertex can reach every other
+    vertex (so the `legacy.random_walk()` sampler terminates), the remaining edges
+    are drawn uniformly at random.
+
+    Parameters
+    ----------
+    n_vertices : int
+        Number of vertices (fake RxCUIs)
+    avg_degree : float
+        Target average degree
+    seed : int
+        Random seed, the same seed always gives the same graph
+
+    Returns
+    -------
+    Graph
+        The generated graph
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    # spanning tree
+    for v in range(1, n_vertices):
+        _connect(graph, rng, v, rng.randrange(v))
+    # extra random edges
+    for _ in range(int(n_vertices * avg_degree / 2) - (n_vertices - 1)):
+        a, b = rng.sample(range(n_vertices), 2)
+        _connect(graph, rng, a, b)
+    return graph
+
+
+def clique_graph(n_edges, seed=507):
+    """Dense topology: every pair of the first vertices interacts
+
+    Vertices are added until `n_edges` pairs are connected (the last
+    vertex may be connected to only some of the others).
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    b = 1
+    while graph.num_edges < n_edges:
+        for a in range(b):
+            if graph.num_edges == n_edges:
+                break
+            _connect(graph, rng, a, b)
+        b += 1
+    return graph
+
+
+def hub_graph(n_edges, spokes_per_hub=100, seed=507):
+    """Hub-and-spoke topology: a chain of hubs, each with its own leaves
+
+    Models a few drugs (e.g. anticoagulants) that interact with many
+    others which rarely interact with each other.
+    """
+    rng = random.Random(seed)
+    graph = Graph()
+    n_hubs = max(1, n_edges // (spokes_per_hub + 1))
+    for h in range(1, n_hubs):
+        _connect(graph, rng, h - 1, h)
+    for leaf in range(n_hubs, n_hubs + n_edges - graph.num_edges):
+        _connect(graph, rng, leaf % n_hubs, leaf)
+    return graph
+
+
+def sparse_graph(n_edges, seed=507):
+    """Sparse topology: a connected random graph of average degree 2.5"""
+    return random_graph(max(2, int(n_edges / 1.25)), avg_degree=2.5, seed=seed)
+
+
+def _connect(graph, rng, a, b):
+    graph.add_edge(
+        str(a), f"drug {a}",
+        str(b), f"drug {b}",
+        "DrugBank",
+        rng.choice(SEVERITIES),
+        f"The metabolism of drug {a} can be decreased when combined with drug {b}.",
+    )
+
+
+# generators of the benchmark suite, `fn(n_edges, seed)` -> Graph
+TOPOLOGIES = {"clique": clique_graph, "hub": hub_graph, "sparse": sparse_graph}
+
+
+def graph_response(graph):
+    """Serialize a graph as an NIH interaction response
+
+    Returns
+    -------
+    dict
+        The graph's interactions in the `fullInteractionTypeGroup` shape
+    """
+    groups = {}
+    for f, t, source, severity, info in graph.edges():
+        groups.setdefault(source, []).append({
+            "minConcept": [
+                {"rxcui": f, "name": graph.vert_list[f].name, "tty": "SCD"},
+                {"rxcui": t, "name": graph.vert_list[t].name, "tty": "SCD"},
+            ],
+            "interactionPair": [{"severity": severity, "description": info}],
+        })
+    return {
+        "fullInteractionTypeGroup": [
+            {"sourceName": s, "fullInteractionType": r} for s, r in groups.items()
+        ]
+    }
+
+
+class HashInteractionSource(InteractionSource):
+    """Interactions among any RxCUIs, decided by a hash of the pair
+
+    For stub servers that must answer for RxCUIs they have never seen:
+    each pair interacts with probability `density`, the same pair always
+    gets the same answer.
+    """
+    def __init__(self, density=0.25):
+        self.density = density
+
+    def fetch(self, cui_list):
+        graph = Graph()
+        cui_list = sorted(set(cui_list))
+        for i, a in enumerate(cui_list):
+            for b in cui_list[i + 1:]:
+                h = zlib.crc32(f"{a}+{b}".encode())
+                if h % 1000 < self.density * 1000:
+                    graph.add_edge(
+                        a, f"drug {a}", b, f"drug {b}", "DrugBank", SEVERITIES[h % 4],
+                        f"The metabolism of drug {a} can be decreased when combined with drug {b}.",
+                    )
+        return graph_response(graph) if graph.num_edges else {}
@@ -52,11 +52,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'mjpan507',
+    'my_app',
     "django_plotly_dash",
     # 'django_plotly_dash.apps.DjangoPlotlyDashConfig',
 ]
 
 MIDDLEWARE = [
+    # outermost, so the timings cover the whole request
+    'my_app.instrument.timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -171,4 +174,11 @@ PLOTLY_COMPONENTS = [
 
 X_FRAME_OPTIONS = 'SAMEORIGIN'
 
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals())
+
+# my_app logs (request timings, failed API requests) go to the console set
+# up by django_heroku
+LOGGING['loggers']['my_app'] = {
+    'handlers': ['console'],
+    'level': os.environ.get('LOG_LEVEL', 'INFO'),
+}
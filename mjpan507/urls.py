@@ -21,5 +21,12 @@ from my_app import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('index', views.index, name='index'),
+    path('countries.geojson', views.countries_geojson, name='countries-geojson'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('api/suggest', views.suggest_api, name='api-suggest'),
+    path('api/risk', views.risk_api, name='api-risk'),
+    path('api/screen', views.screen_api, name='api-screen'),
+    # async callback endpoint of the Dash app, in front of django_plotly_dash's
+    path('django_plotly_dash/app/<slug:ident>/_dash-update-component', views.dash_update, {'stateless': True}),
     path('django_plotly_dash/', include('django_plotly_dash.urls')),
 ]
@@ -0,0 +1,397 @@
+"""Caches for data retrieved from the RxNorm, OpenFDA and interaction APIs"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from .graph import Graph
+from .ingredients import Concept
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional time-to-live
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries, the least recently used entry is
+        evicted first
+    ttl : float, optional
+        Seconds an entry stays valid, entries never expire if `None`
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key: (expiry time, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0  # incl. expired entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RxNormCache:
+    """Persistent cache of drug name to `{RxCUI: drug name}` lookups
+
+    Entries are stored one row per drug name in a SQLite database, so a
+    lookup or an update only touches its own key and is independent of the
+    total cache size. Writes are single-statement upserts, which SQLite
+    applies atomically, so concurrent workers never lose each other's
+    entries. An in-process `LRUCache` answers repeated lookups without
+    touching the database.
+
+    The RxNorm products of the entries are also kept by RxCUI with their
+    term type and ingredient group (`ingredients.Concept`), the reverse
+    index used to collapse a query to one product per ingredient.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database file
+    ttl : float, optional
+        Seconds an entry stays valid (default 30 days), `None` to never expire
+    lru_size : int
+        Number of entries held in the in-process LRU tier
+    seed : str, optional
+        Path of a `cache.json` file (`{drug name: {RxCUI: drug name}}`)
+        whose entries are imported when the database is created
+    """
+    def __init__(self, path, ttl=30 * 24 * 3600, lru_size=4096, seed=None):
+        self.path = path
+        self.ttl = ttl
+        self.seed = seed
+        self._lru = LRUCache(lru_size, ttl)
+        self._local = threading.local()  # one connection per thread
+        self._stats_lock = threading.Lock()
+        self.hits = 0  # in the LRU tier or the database
+        self.misses = 0  # incl. expired entries
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit mode, every statement is its own transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block writers
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rxnorm ("
+                "name TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS concept ("
+                "rxcui TEXT PRIMARY KEY, name TEXT NOT NULL, tty TEXT NOT NULL, "
+                "ingredient TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self._local.conn = conn
+            self._import_seed(conn)
+        return conn
+
+    def _import_seed(self, conn):
+        """Import the seed file into an empty database"""
+        if not self.seed or not os.path.isfile(self.seed):
+            return
+        if conn.execute("SELECT 1 FROM rxnorm LIMIT 1").fetchone():
+            return
+        with open(self.seed, "r") as json_file:
+            try:
+                seed = json.load(json_file)
+            except json.JSONDecodeError:
+                return
+        now = time.time()
+        # OR IGNORE: another worker may be importing at the same time
+        conn.executemany(
+            "INSERT OR IGNORE INTO rxnorm (name, value, updated) VALUES (?, ?, ?)",
+            [(name, json.dumps(value), now) for name, value in seed.items()],
+        )
+
+    def get(self, name):
+        """Get the cached `{RxCUI: drug name}` dictionary of a drug name
+
+        Returns
+        -------
+            The cached dictionary, or `None` if the name is not cached or
+            the entry has expired
+        """
+        value = self._lru.get(name)
+        if value is None:
+            row = self._connect().execute(
+                "SELECT value, updated FROM rxnorm WHERE name = ?", (name,)
+            ).fetchone()
+            # expired entries are overwritten by the next `set()`
+            if row is not None and (self.ttl is None or row[1] + self.ttl >= time.time()):
+                value = json.loads(row[0])
+                self._lru.set(name, value)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, name, value, concepts=()):
+        """Insert or replace the `{RxCUI: drug name}` dictionary of a drug name
+
+        Parameters
+        ----------
+        name : str
+            Lowercase drug name
+        value : dict
+            RxCUI as keys and drug names as values
+        concepts : iterable, optional
+            `ingredients.Concept`s of the products, stored by RxCUI
+        """
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO rxnorm (name, value, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated = excluded.updated",
+            (name, json.dumps(value), time.time()),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO concept (rxcui, name, tty, ingredient) VALUES (?, ?, ?, ?)",
+            concepts,
+        )
+        self._lru.set(name, value)
+
+    def concepts(self, cuis):
+        """Get the stored `ingredients.Concept`s of RxCUIs
+
+        Products of entries cached without them (e.g. imported from the
+        seed file) are missing from the result.
+
+        Returns
+        -------
+            A dictionary with RxCUI as keys and concepts as values
+        """
+        cuis = list(cuis)
+        conn = self._connect()
+        found = {}
+        # below SQLite's default limit of host parameters per statement
+        for i in range(0, len(cuis), 500):
+            chunk = cuis[i:i + 500]
+            rows = conn.execute(
+                "SELECT rxcui, name, tty, ingredient FROM concept WHERE rxcui IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update((row[0], Concept(*row)) for row in rows)
+        return found
+
+    def names(self, since=None):
+        """Drug names with a valid entry that has RxCUIs
+
+        Parameters
+        ----------
+        since : float, optional
+            Only the names updated since this `time.time()` timestamp
+
+        Returns
+        -------
+            A list of drug names
+        """
+        oldest = time.time() - self.ttl if self.ttl is not None else 0.0
+        if since is not None:
+            oldest = max(oldest, since)
+        rows = self._connect().execute(
+            "SELECT name FROM rxnorm WHERE updated >= ? AND value != '{}'", (oldest,)
+        )
+        return [row[0] for row in rows]
+
+    def purge(self):
+        """Delete expired entries from the database"""
+        if self.ttl is not None:
+            self._connect().execute(
+                "DELETE FROM rxnorm WHERE updated < ?", (time.time() - self.ttl,)
+            )
+        self._lru.clear()
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM rxnorm").fetchone()[0]
+
+
+class GraphCache:
+    """Process-level cache of interaction graphs keyed by RxCUI set
+
+    A query for a set of RxCUIs is answered, in order of preference, by
+    - the graph cached for exactly that set,
+    - the subgraph of a cached graph built for a superset,
+    - a cached graph built for a subset, extended with only the
+      interactions that involve the new RxCUIs,
+    - a graph built from scratch.
+    Graphs are evicted least recently used first once their total
+    footprint (`Graph.nbytes()`) exceeds `max_bytes`. Returned graphs are
+    shared between callers and must not be modified.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget of the cached graphs
+    shared_dir : str, optional
+        Directory where built graphs are also written as snapshots
+        (`Graph.save()`), so other worker processes can load them
+    """
+    def __init__(self, max_bytes=256 * 2**20, shared_dir=None):
+        self.max_bytes = max_bytes
+        self.shared_dir = shared_dir
+        self._entries = OrderedDict()  # frozenset of RxCUIs: (graph, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # hit/miss counters
+        self.hits = 0  # exact set cached (in process or shared)
+        self.subgraphs = 0  # answered from a cached superset
+        self.extensions = 0  # extended a cached subset
+        self.misses = 0  # built from scratch
+
+    def get(self, cui_list, build):
+        """Get the interaction graph of a set of RxCUIs
+
+        Parameters
+        ----------
+        cui_list :
+            A list of RxCUI numbers
+        build : callable
+            `build(cui_list, base, new)` returns the graph of `cui_list`.
+            `base` is `None` or a copy of a cached graph of a subset to
+            extend, `new` holds the RxCUIs missing from that subset.
+
+        Returns
+        -------
+        Graph
+            The interaction graph
+        """
+        key = frozenset(cui_list)
+        graph, base, subset, path = self._lookup(key)
+        if graph is not None:
+            return graph
+        if base is not None:
+            graph = build(list(key), base.copy(), key - subset)
+            self._count("extensions")
+        else:
+            graph = build(list(key), None, None)
+            self._count("misses")
+        return self._built(key, graph, path)
+
+    async def get_async(self, cui_list, build):
+        """Coroutine version of `get()`, `build` is a coroutine function"""
+        key = frozenset(cui_list)
+        graph, base, subset, path = self._lookup(key)
+        if graph is not None:
+            return graph
+        if base is not None:
+            graph = await build(list(key), base.copy(), key - subset)
+            self._count("extensions")
+        else:
+            graph = await build(list(key), None, None)
+            self._count("misses")
+        return self._built(key, graph, path)
+
+    def _lookup(self, key):
+        """Answer a query without building a graph
+
+        Returns
+        -------
+            A tuple `(graph, base, subset, path)`: the graph if it could be
+            answered from the cache, otherwise the graph of the largest
+            cached subset to extend (or `None`), that subset, and the path
+            of the shared snapshot to write once built
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], None, None, None
+            superset = min((k for k in self._entries if k > key), key=len, default=None)
+            subset = max((k for k in self._entries if k < key), key=len, default=None)
+            base = self._entries[subset][0] if subset is not None else None
+            whole = self._entries[superset][0] if superset is not None else None
+
+        path = self._shared_path(key)
+        if whole is not None:
+            graph = whole.subgraph(key)
+            self._count("subgraphs")
+        elif path is not None and os.path.isfile(path):
+            graph = Graph.load(path)
+            self._count("hits")
+        else:
+            return None, base, subset, path
+        self._store(key, graph)
+        return graph, None, None, None
+
+    def _built(self, key, graph, path):
+        """Share and cache a graph built by `get()`"""
+        if path is not None:
+            # write to a temporary file first, readers never see partial files
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            graph.save(tmp)
+            os.replace(tmp, path)
+        self._store(key, graph)
+        return graph
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _shared_path(self, key):
+        if not self.shared_dir:
+            return None
+        digest = hashlib.sha1("+".join(sorted(key)).encode()).hexdigest()
+        return os.path.join(self.shared_dir, f"{digest}.snapshot")
+
+    def _store(self, key, graph):
+        size = graph.nbytes()
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (graph, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+
+    def stats(self):
+        """Counters and size of the cache as a dictionary"""
+        return {
+            "hits": self.hits,
+            "subgraphs": self.subgraphs,
+            "extensions": self.extensions,
+            "misses": self.misses,
+            "graphs": len(self._entries),
+            "bytes": self._bytes,
+        }
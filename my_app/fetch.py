@@ -0,0 +1,266 @@
+"""Shared HTTP session and helpers for concurrent API requests
+
+Sync code uses the keep-alive `session` and the `executor` thread pool.
+Coroutines use one `httpx.AsyncClient` that lives on the process's fetch
+loop, an event loop running in a background thread (see `fetch_loop()`).
+"""
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .instrument import upstream
+from .lazy import lazy_import
+
+httpx = lazy_import("httpx")
+
+# base URLs can be pointed at a local stub server for offline testing
+RXNAV_URL = os.environ.get("RXNAV_URL", "https://rxnav.nlm.nih.gov/REST")
+OPENFDA_URL = os.environ.get("OPENFDA_URL", "https://api.fda.gov")
+
+# upper bound on concurrent background requests (threads / async prefetches)
+MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", 8))
+# upper bound on open connections of the async client
+MAX_CONNECTIONS = int(os.environ.get("FETCH_MAX_CONNECTIONS", 100))
+TIMEOUT = (3.05, 10)  # (connect, read) timeout of every request in seconds
+RETRIES = 2  # retries of a request on connection errors and 429/5xx responses
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def make_session(pool_size=MAX_WORKERS, retries=RETRIES):
+    """Create a keep-alive session with connection pooling and retries
+
+    Parameters
+    ----------
+    pool_size : int
+        Number of connections kept open per host
+    retries : int
+        Number of retries of a failed request (with exponential backoff)
+
+    Returns
+    -------
+        A `requests.Session`
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.2,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=("GET",),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# shared by all requests of the process
+session = make_session()
+executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="fetch")
+# runs tasks that fan out to `executor` and wait for the results; kept
+# separate so waiting tasks can never occupy every `executor` thread
+coordinator = ThreadPoolExecutor(4, thread_name_prefix="fetch-coordinator")
+# low-priority work (prefetches): a few threads of its own that never wait
+# on `executor`, so a burst of prefetches can't hold up a user's request
+background = ThreadPoolExecutor(2, thread_name_prefix="fetch-background")
+
+
+def upstream_errors():
+    """Exception types of a failed upstream request or unreadable response
+
+    For `except upstream_errors():`, covers both HTTP clients (`requests`
+    and `httpx`, which is only imported when an exception is matched).
+    """
+    return (requests.RequestException, httpx.HTTPError, json.JSONDecodeError)
+
+
+def get_json(url, timeout=TIMEOUT):
+    """GET `url` on the shared session and decode the json response"""
+    with upstream(url) as call:
+        response = session.get(url, timeout=timeout)
+        call.status = response.status_code
+    response.raise_for_status()
+    return response.json()
+
+
+def get_chunks(url, chunk_size=2**16, timeout=TIMEOUT):
+    """GET `url` on the shared session and iterate over the response body
+
+    The body is read as it is consumed, for responses too large to
+    decode at once (see `jsonstream.interaction_records()`).
+
+    Yields
+    ------
+    bytes
+        Chunks of the body, of up to `chunk_size` bytes
+    """
+    with upstream(url) as call:  # until the headers arrive
+        response = session.get(url, timeout=timeout, stream=True)
+        call.status = response.status_code
+    with response:  # releases the connection if the body is not read to the end
+        response.raise_for_status()
+        yield from response.iter_content(chunk_size)
+
+
+class SingleFlight:
+    """De-duplicate identical in-flight calls
+
+    While a call for a key is running, every other `submit()` with the same
+    key gets the same future instead of starting a new call.
+    """
+    def __init__(self, executor=executor):
+        self.executor = executor
+        self._calls = {}  # key: future of the running call
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future
+            future = self.executor.submit(fn, *args)
+            self._calls[key] = future
+        # outside the lock, the callback runs immediately if already done
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def get(self, key):
+        """The future of the running call of `key`, or `None`"""
+        with self._lock:
+            return self._calls.get(key)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+
+_fetch_loop = None
+_fetch_loop_lock = threading.Lock()
+_async_client = None
+_background_slots = asyncio.Semaphore(MAX_WORKERS)  # see `in_background()`
+
+
+def fetch_loop():
+    """The event loop of the async requests, started on first use
+
+    The loop runs forever in a daemon thread. Every coroutine that uses
+    `async_client()` runs on it, so all async requests of the process
+    share one connection pool.
+    """
+    global _fetch_loop
+    with _fetch_loop_lock:
+        if _fetch_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="fetch-loop", daemon=True).start()
+            _fetch_loop = loop
+        return _fetch_loop
+
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the fetch loop and wait for its result (from sync code)"""
+    return asyncio.run_coroutine_threadsafe(coro, fetch_loop()).result(timeout)
+
+
+async def on_fetch_loop(coro):
+    """Await a coroutine that runs on the fetch loop (from any event loop)"""
+    loop = fetch_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+def async_client():
+    """The shared `httpx.AsyncClient`, only to be used on the fetch loop"""
+    global _async_client
+    if _async_client is None:
+        # like `session`, keep `MAX_WORKERS` connections alive and open more
+        # on demand, so background prefetches can't hold up a request
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_WORKERS)
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(TIMEOUT[1], connect=TIMEOUT[0]),
+            # the transport retries connection errors, `get_async()` retries statuses
+            transport=httpx.AsyncHTTPTransport(retries=RETRIES, limits=limits),
+        )
+    return _async_client
+
+
+async def get_async(url, timeout=TIMEOUT):
+    """GET `url` on the shared async client
+
+    Responses with a `RETRY_STATUS` status are retried `RETRIES` times
+    with exponential backoff, as `session` does.
+    """
+    timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+    for attempt in range(RETRIES + 1):
+        with upstream(url) as call:
+            response = await async_client().get(url, timeout=timeout)
+            call.status = response.status_code
+        if response.status_code not in RETRY_STATUS or attempt == RETRIES:
+            return response
+        await asyncio.sleep(0.2 * 2**attempt)
+
+
+async def get_json_async(url, timeout=TIMEOUT):
+    """Coroutine version of `get_json()`, raises `httpx.HTTPError`"""
+    response = await get_async(url, timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+async def in_background(fn, *args):
+    """Await `fn(*args)` once fewer than `MAX_WORKERS` background calls run
+
+    The async counterpart of submitting to `executor`, bounds e.g. the
+    prefetches of a large graph.
+    """
+    async with _background_slots:
+        return await fn(*args)
+
+
+async def gather_limited(coros, limit=MAX_CONNECTIONS, return_exceptions=False):
+    """`asyncio.gather()` that awaits at most `limit` of the coroutines at a time
+
+    For batches of requests larger than the connection pool, which would
+    otherwise wait for a connection long enough to time out.
+    """
+    slots = asyncio.Semaphore(limit)
+
+    async def limited(coro):
+        async with slots:
+            return await coro
+
+    return await asyncio.gather(*(limited(c) for c in coros), return_exceptions=return_exceptions)
+
+
+class AsyncSingleFlight:
+    """De-duplicate identical in-flight coroutine calls, see `SingleFlight`
+
+    Only to be used from a single event loop (the fetch loop).
+    """
+    def __init__(self):
+        self._calls = {}  # key: task of the running call
+
+    def submit(self, key, fn, *args):
+        """Start `fn(*args)` as a task, or get the running task of `key`"""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def get(self, key):
+        """The task of the running call of `key`, or `None`"""
+        return self._calls.get(key)
+
+    async def call(self, key, fn, *args):
+        """Await the result of `submit()`, cancelling the caller leaves the call running"""
+        return await asyncio.shield(self.submit(key, fn, *args))
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,85 @@
+"""Country shapes for the reporting-country choropleth
+
+The world shapefile is preprocessed once into a simplified GeoJSON file
+with one feature per ISO country code (the feature `id`). The file is
+loaded into memory on first use and served to the browser as a static,
+cacheable asset, so a drill-down figure only has to carry ISO codes and
+counts.
+"""
+import hashlib
+import json
+import os
+import threading
+
+SHAPEFILE_PATH = "./my_app/World_Countries_Generalized.zip"
+GEOJSON_PATH = "./my_app/countries.geojson"
+SIMPLIFY_TOLERANCE = 0.05  # degrees
+PRECISION = 3  # decimal places of the coordinates
+
+_lock = threading.Lock()
+_loaded = {}  # path: (geojson dictionary, serialized bytes, etag)
+
+
+def build_geojson(shapefile=SHAPEFILE_PATH, tolerance=SIMPLIFY_TOLERANCE, precision=PRECISION):
+    """Simplify the country shapes of a shapefile into an ISO-keyed GeoJSON
+
+    Parameters
+    ----------
+    shapefile : str
+        Path of the (zipped) shapefile, with `ISO` and `COUNTRY` columns
+    tolerance : float
+        Max. distance between the original and the simplified outlines
+    precision : int
+        Number of decimal places kept in the coordinates
+
+    Returns
+    -------
+    dict
+        A GeoJSON feature collection, feature ids are ISO codes
+    """
+    import geopandas as gpd  # only needed to rebuild the file
+
+    shapes = gpd.read_file(shapefile)
+    # one feature per ISO code (e.g. Portugal, Azores and Madeira are all
+    # PT), named after its largest part
+    shapes = (
+        shapes.sort_values("SHAPE_Area", ascending=False)[["ISO", "COUNTRY", "geometry"]]
+        .dissolve(by="ISO", aggfunc="first")
+    )
+    shapes["geometry"] = shapes.geometry.simplify(tolerance, preserve_topology=True)
+    return json.loads(shapes.to_json(), parse_float=lambda x: round(float(x), precision))
+
+
+def write_geojson(geojson, path=GEOJSON_PATH):
+    """Write a GeoJSON dictionary in compact form"""
+    with open(path, "w") as json_file:
+        json.dump(geojson, json_file, separators=(",", ":"))
+
+
+def _load(path):
+    with _lock:
+        entry = _loaded.get(path)
+        if entry is None:
+            if not os.path.isfile(path):
+                write_geojson(build_geojson(), path)
+            with open(path, "rb") as json_file:
+                body = json_file.read()
+            entry = (json.loads(body), body, hashlib.sha1(body).hexdigest())
+            _loaded[path] = entry
+        return entry
+
+
+def country_geojson(path=GEOJSON_PATH):
+    """The simplified country shapes as a GeoJSON dictionary (cached)"""
+    return _load(path)[0]
+
+
+def country_geojson_bytes(path=GEOJSON_PATH):
+    """The serialized GeoJSON and its etag, as served to the browser"""
+    _, body, etag = _load(path)
+    return body, etag
+
+
+def country_codes(path=GEOJSON_PATH):
+    """ISO codes of the countries that have a shape"""
+    return frozenset(feature["id"] for feature in country_geojson(path)["features"])
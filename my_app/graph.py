@@ -1,8 +1,23 @@
 """Definition for graph, edge, and vertex"""
-from collections import deque
+from array import array
+from collections.abc import Mapping, Sequence
 from math import inf
-import random
+import heapq
+import mmap
+import struct
+import sys
+import threading
+
+
 class Edge:
+    """An interaction between two drugs, as seen from the `src` vertex
+
+    Edges are not stored by the graph: the attributes of each undirected
+    pair are kept once in the graph's edge columns and an `Edge` record is
+    created when it is accessed through `Vertex.connectedTo`.
+    """
+    __slots__ = ("src", "dest", "source", "severity", "additional_info")
+
     def __init__(self, src, dest, source, severity, additional_info):
         self.src = src # source
         self.dest = dest # destination 
@@ -14,110 +29,1123 @@ class Edge:
         return f"{self.src.id} and {self.dest.id} has interaction \"{self.additional_info}\"\n"
 
 class Vertex:
-    def __init__(self, value, name):
-        self.id = value # RxNorm CUI
-        # TODO: Name
-        self.name = name
+    """Read-only view of a vertex stored in a graph
 
-        self.connectedTo = {}  # Key: Vertex, Value: Edge
+    Two views are equal if they point to the same vertex of the same graph,
+    so they can be used as dictionary keys like the vertex objects were.
+    """
+    __slots__ = ("_graph", "_index")
+
+    def __init__(self, graph, index):
+        self._graph = graph
+        self._index = index  # dense integer id of the vertex
+
+    @property
+    def id(self):
+        return self._graph.ids[self._index]  # RxNorm CUI
+
+    @property
+    def name(self):
+        return self._graph.names[self._index]
+
+    @property
+    def connectedTo(self):
+        return _Adjacency(self)  # Key: Vertex, Value: Edge
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Vertex)
+            and self._graph is other._graph
+            and self._index == other._index
+        )
+
+    def __hash__(self):
+        return hash((id(self._graph), self._index))
 
     def __str__(self):
         return f"{''.join([str(edge) for edge in self.connectedTo.values()])}"
 
-    def add_neighbor(self, nbr, edge):
-        self.connectedTo[nbr] = edge
+class _Adjacency(Mapping):
+    """Read-only `{Vertex: Edge}` mapping over the CSR neighbor arrays"""
+    __slots__ = ("_vertex",)
+
+    def __init__(self, vertex):
+        self._vertex = vertex
+
+    def _slice(self):
+        offsets, targets, edge_ids = self._vertex._graph.csr()
+        i = self._vertex._index
+        return range(offsets[i], offsets[i + 1]), targets, edge_ids
+
+    def __getitem__(self, nbr):
+        graph = self._vertex._graph
+        if not isinstance(nbr, Vertex) or nbr._graph is not graph:
+            raise KeyError(nbr)
+        if graph._pairs is not None:
+            eid = graph._pairs.get(_pair_key(self._vertex._index, nbr._index))
+        else:
+            # loaded snapshot without the pair dictionary, scan the CSR row
+            span, targets, edge_ids = self._slice()
+            eid = next((edge_ids[k] for k in span if targets[k] == nbr._index), None)
+        if eid is None:
+            raise KeyError(nbr)
+        return graph._edge(eid, self._vertex, nbr)
+
+    def __iter__(self):
+        graph = self._vertex._graph
+        span, targets, _ = self._slice()
+        return (Vertex(graph, targets[k]) for k in span)
+
+    def __len__(self):
+        return len(self._slice()[0])
+
+    def items(self):
+        graph = self._vertex._graph
+        span, targets, edge_ids = self._slice()
+        for k in span:
+            nbr = Vertex(graph, targets[k])
+            yield nbr, graph._edge(edge_ids[k], self._vertex, nbr)
+
+    def values(self):
+        return (edge for _, edge in self.items())
+
+class _VertexList(Mapping):
+    """Read-only `{RxCUI: Vertex}` mapping, the `Graph.vert_list` view"""
+    __slots__ = ("_graph",)
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, key):
+        return Vertex(self._graph, self._graph._index[key])
+
+    def __contains__(self, key):
+        return key in self._graph._index
+
+    def __iter__(self):
+        return iter(self._graph.ids)
+
+    def __len__(self):
+        return len(self._graph.ids)
+
+class _StringTable(Sequence):
+    """Strings of a snapshot, decoded on access from the mapped file"""
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets  # string i is blob[offsets[i]:offsets[i + 1]]
+        self._blob = blob
+
+    def __getitem__(self, i):
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+class _StringColumn(Sequence):
+    """Read-only column of strings stored as indices into a string table
+
+    The table is a `_StringTable` of a snapshot or the strings of
+    `edge_strings`.
+    """
+    __slots__ = ("_table", "_ids")
+
+    def __init__(self, table, ids):
+        self._table = table
+        self._ids = ids
+
+    def __getitem__(self, i):
+        return self._table[self._ids[i]]
+
+    def __iter__(self):
+        return map(self._table.__getitem__, self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+class StringPool:
+    """Process-wide table of the distinct strings of interactions
+
+    The source, severity and description of an interaction repeat across
+    the pairs of a graph (e.g. the products of one ingredient) and across
+    the graphs of a process, so graphs store the integer id of each
+    string in the pool instead of the string. Strings are only added,
+    the pool grows with the number of distinct strings seen.
+    """
+    def __init__(self):
+        self.strings = []  # string id -> string, only appended to
+        self._ids = {}  # string -> string id
+        self._lock = threading.Lock()
+
+    def intern(self, value):
+        """Id of a string, added to the pool if it is new"""
+        i = self._ids.get(value)
+        if i is None:
+            with self._lock:
+                i = self._ids.get(value)
+                if i is None:
+                    # the string is in place before its id is handed out
+                    i = len(self.strings)
+                    self.strings.append(value)
+                    self._ids[value] = i
+        return i
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def __len__(self):
+        return len(self.strings)
+
+    def nbytes(self):
+        """Approximate memory held by the pool in bytes"""
+        return (
+            sys.getsizeof(self.strings) + sys.getsizeof(self._ids)
+            + sum(map(sys.getsizeof, self.strings))
+        )
+
+
+edge_strings = StringPool()  # sources, severities and descriptions of every graph
+
+class _SnapshotIndex(Mapping):
+    """RxCUI -> vertex id lookups by binary search over the sorted RxCUIs"""
+    __slots__ = ("_ids", "_order")
+
+    def __init__(self, ids, order):
+        self._ids = ids
+        self._order = order  # vertex ids sorted by RxCUI
+
+    def __getitem__(self, key):
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ids[self._order[mid]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._order) and self._ids[self._order[lo]] == key:
+            return self._order[lo]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+def _pair_key(a, b):
+    """Key of the undirected pair of vertex ids `a` and `b`"""
+    return (a << 32) | b if a <= b else (b << 32) | a
 
 class Graph:
+    """Undirected drug interaction graph
+
+    RxCUIs are interned to dense integer ids and the attributes of each
+    interaction are stored once per undirected pair in columnar arrays,
+    as ids of strings in `edge_strings` (`edge_source_id`, ...; the
+    `edge_source`, `edge_severity` and `edge_info` columns read the
+    strings).
+    Neighbors are served from CSR (compressed sparse row) arrays that are
+    built lazily after the graph changes. `vert_list` and
+    `Vertex.connectedTo` remain available as read-only views.
+    """
     def __init__(self):
-        self.vert_list = {}  # vertices
+        self.ids = []  # vertex id -> RxCUI
+        self.names = []  # vertex id -> drug name
+        self._index_map = {}  # RxCUI -> vertex id
         self.num_vertices = 0
 
+        # edge columns, one row per undirected pair
+        self.edge_src = array("I")
+        self.edge_dest = array("I")
+        self.edge_source_id = array("I")  # source of info
+        self.edge_severity_id = array("I")  # severity of interaction
+        self.edge_info_id = array("I")  # description of interaction
+        self._strings = edge_strings.strings  # string id -> string
+        self._pairs = {}  # pair key -> edge id
+
+        self._csr = None  # (offsets, targets, edge ids), built on demand
+        self._snapshot = None  # mapped file of a graph from `Graph.load()`
+
+    @property
+    def _index(self):
+        # built lazily for graphs loaded from a snapshot
+        if self._index_map is None:
+            self._index_map = {cui: i for i, cui in enumerate(self.ids)}
+        return self._index_map
+
+    @property
+    def vert_list(self):
+        return _VertexList(self)  # vertices
+
+    @property
+    def num_edges(self):
+        return len(self.edge_src)
+
+    @property
+    def edge_source(self):
+        return _StringColumn(self._strings, self.edge_source_id)
+
+    @property
+    def edge_severity(self):
+        return _StringColumn(self._strings, self.edge_severity_id)
+
+    @property
+    def edge_info(self):
+        return _StringColumn(self._strings, self.edge_info_id)
+
     def add_vertex(self, key, name):
+        if self._snapshot is not None:
+            self._thaw()
+        if key in self._index:
+            return self.vert_list[key]
+        self._index[key] = len(self.ids)
+        self.ids.append(key)
+        self.names.append(name)
         self.num_vertices += 1
-        new_vertex = Vertex(key, name)
-        self.vert_list[key] = new_vertex
-        return new_vertex
+        self._csr = None
+        return Vertex(self, self._index[key])
 
     def add_edge(self, f, f_name, t, t_name, source, severity, additional_info):
+        intern = edge_strings.intern
+        self._add_edge(
+            f, f_name, t, t_name, intern(source), intern(severity), intern(additional_info)
+        )
+
+    def _add_edge(self, f, f_name, t, t_name, source_id, severity_id, info_id):
+        """`add_edge()` with the ids of the strings in `edge_strings`"""
+        if self._snapshot is not None:
+            self._thaw()
         # vertex
-        if f not in self.vert_list:
+        if f not in self._index:
             self.add_vertex(f, f_name)
-        if t not in self.vert_list:
+        if t not in self._index:
             self.add_vertex(t, t_name)
 
-        # edge
-        edge = Edge(self.vert_list[f], self.vert_list[t], source, severity, additional_info)
-        self.vert_list[f].add_neighbor(self.vert_list[t], edge)
-        # construct undirected graph
-        reverse_edge = Edge(self.vert_list[t], self.vert_list[f], source, severity, additional_info)
-        self.vert_list[t].add_neighbor(self.vert_list[f], reverse_edge)
+        # edge, stored once for both directions (undirected graph)
+        a, b = self._index[f], self._index[t]
+        key = _pair_key(a, b)
+        eid = self._pairs.get(key)
+        if eid is None:
+            self._pairs[key] = len(self.edge_src)
+            self.edge_src.append(a)
+            self.edge_dest.append(b)
+            self.edge_source_id.append(source_id)
+            self.edge_severity_id.append(severity_id)
+            self.edge_info_id.append(info_id)
+            self._csr = None
+        else:
+            # a repeated pair overwrites the previous interaction
+            self.edge_source_id[eid] = source_id
+            self.edge_severity_id[eid] = severity_id
+            self.edge_info_id[eid] = info_id
+
+    def _edge(self, eid, src, dest):
+        """Create the `Edge` record of edge `eid` from `src` to `dest`"""
+        return Edge(
+            src, dest, self.edge_source[eid], self.edge_severity[eid], self.edge_info[eid]
+        )
+
+    def edges(self):
+        """Iterate over the interactions, once per undirected pair
+
+        Yields
+        ------
+        tuple
+            (from RxCUI, to RxCUI, source, severity, additional info)
+        """
+        ids = self.ids
+        for a, b, source, severity, info in zip(
+            self.edge_src, self.edge_dest, self.edge_source, self.edge_severity, self.edge_info
+        ):
+            yield ids[a], ids[b], source, severity, info
+
+    def csr(self):
+        """Get the compressed sparse row adjacency of the graph
+
+        Returns
+        -------
+        tuple
+            offsets : neighbors of vertex i are at positions
+                      offsets[i] to offsets[i + 1]
+            targets : neighbor vertex ids
+            edge_ids : edge id (row of the edge columns) of every neighbor
+        """
+        if self._csr is None:
+            n = len(self.ids)
+            offsets = array("I", bytes(4 * (n + 1)))
+            for a, b in zip(self.edge_src, self.edge_dest):
+                offsets[a + 1] += 1
+                if a != b:
+                    offsets[b + 1] += 1
+            for i in range(n):
+                offsets[i + 1] += offsets[i]
+            targets = array("I", bytes(4 * offsets[n]))
+            edge_ids = array("I", bytes(4 * offsets[n]))
+            fill = offsets[:-1]  # next free slot of every vertex
+            for eid, (a, b) in enumerate(zip(self.edge_src, self.edge_dest)):
+                targets[fill[a]], edge_ids[fill[a]] = b, eid
+                fill[a] += 1
+                if a != b:
+                    targets[fill[b]], edge_ids[fill[b]] = a, eid
+                    fill[b] += 1
+            self._csr = (offsets, targets, edge_ids)
+        return self._csr
+
+    def save(self, path):
+        """Write the graph to a binary snapshot file
+
+        Layout (little-endian, every array is uint32):
+        header (`_SNAPSHOT_HEADER`), string offsets, vertex RxCUI and name
+        string ids, vertex ids sorted by RxCUI (for lookups by binary
+        search), CSR offsets, targets and edge ids, edge source and
+        destination vertex ids, edge source, severity and description
+        string ids, and finally the utf-8 string blob. Every distinct
+        string is written once.
+
+        Parameters
+        ----------
+        path : str
+            Path of the snapshot file
+        """
+        strings = {}  # string -> string id
+        def intern(column):
+            return array("I", [strings.setdefault(x, len(strings)) for x in column])
+
+        def intern_ids(ids):
+            # each distinct string of an edge column is looked up once
+            remap = {}
+            for i in set(ids):
+                remap[i] = strings.setdefault(self._strings[i], len(strings))
+            return array("I", map(remap.__getitem__, ids))
+
+        columns = [
+            intern(self.ids),
+            intern(self.names),
+            array("I", sorted(range(len(self.ids)), key=self.ids.__getitem__)),
+            *(array("I", a) for a in self.csr()),
+            array("I", self.edge_src),
+            array("I", self.edge_dest),
+            intern_ids(self.edge_source_id),
+            intern_ids(self.edge_severity_id),
+            intern_ids(self.edge_info_id),
+        ]
+        encoded = [x.encode("utf-8") for x in strings]
+        string_offsets = array("I", [0])
+        for x in encoded:
+            string_offsets.append(string_offsets[-1] + len(x))
+        header = _SNAPSHOT_HEADER.pack(
+            _SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, len(self.ids), self.num_edges,
+            len(encoded), len(columns[4]), string_offsets[-1],
+        )
+        columns.insert(0, string_offsets)
+        if sys.byteorder != "little":
+            for column in columns:
+                column.byteswap()
+
+        with open(path, "wb") as f:
+            f.write(header)
+            for column in columns:
+                f.write(column.tobytes())
+            for x in encoded:
+                f.write(x)
+
+    @classmethod
+    def load(cls, path):
+        """Open a snapshot written by `Graph.save()`
+
+        The file is memory-mapped and the arrays are used in place, so
+        loading takes constant time and the pages are shared by every
+        process that opens the same snapshot. Strings are decoded when
+        they are accessed and RxCUIs are looked up by binary search. The
+        graph is copied into memory the first time it is modified.
+
+        Parameters
+        ----------
+        path : str
+            Path of the snapshot file
+
+        Returns
+        -------
+        Graph
+            The loaded graph
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_vertices, n_edges, n_strings, n_csr, _ = _SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != _SNAPSHOT_MAGIC or version != _SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a graph snapshot (version {_SNAPSHOT_VERSION})")
+
+        view = memoryview(mapped)
+        position = _SNAPSHOT_HEADER.size
+        def take(n):
+            nonlocal position
+            column = view[position:position + 4 * n].cast("I")
+            position += 4 * n
+            if sys.byteorder != "little":
+                column = array("I", column)
+                column.byteswap()
+            return column
+
+        string_offsets = take(n_strings + 1)
+        ids, names, order = take(n_vertices), take(n_vertices), take(n_vertices)
+        csr = take(n_vertices + 1), take(n_csr), take(n_csr)
+        edge_src, edge_dest = take(n_edges), take(n_edges)
+        edge_source, edge_severity, edge_info = take(n_edges), take(n_edges), take(n_edges)
+        table = _StringTable(string_offsets, view[position:])
+
+        graph = cls()
+        graph.ids = _StringColumn(table, ids)
+        graph.names = _StringColumn(table, names)
+        graph._index_map = _SnapshotIndex(graph.ids, order)
+        graph.num_vertices = n_vertices
+        graph.edge_src, graph.edge_dest = edge_src, edge_dest
+        graph.edge_source_id, graph.edge_severity_id, graph.edge_info_id = (
+            edge_source, edge_severity, edge_info
+        )
+        graph._strings = table  # ids of the snapshot's strings until `_thaw()`
+        graph._pairs = None
+        graph._csr = csr
+        graph._snapshot = mapped
+        return graph
+
+    def _thaw(self):
+        """Copy a loaded snapshot into memory so the graph can be modified"""
+        # the mapped file is closed once the last view is released
+        self.__dict__.update(self.copy().__dict__)
+
+    def copy(self):
+        """Copy the graph, the copy can be extended without changing this graph"""
+        graph = Graph()
+        graph.ids, graph.names = list(self.ids), list(self.names)
+        graph._index_map = dict(self._index_map) if isinstance(self._index_map, dict) else None
+        graph.num_vertices = self.num_vertices
+        graph.edge_src, graph.edge_dest = array("I", self.edge_src), array("I", self.edge_dest)
+        graph.edge_source_id = self._pool_ids(self.edge_source_id)
+        graph.edge_severity_id = self._pool_ids(self.edge_severity_id)
+        graph.edge_info_id = self._pool_ids(self.edge_info_id)
+        if self._pairs is not None:
+            graph._pairs = dict(self._pairs)
+        else:
+            graph._pairs = {
+                _pair_key(a, b): eid for eid, (a, b) in enumerate(zip(graph.edge_src, graph.edge_dest))
+            }
+        return graph
+
+    def _pool_ids(self, ids):
+        """An edge string column as ids of `edge_strings`"""
+        if self._strings is edge_strings.strings:
+            return array("I", ids)
+        # a snapshot: each distinct string is interned once
+        remap = {i: edge_strings.intern(self._strings[i]) for i in set(ids)}
+        return array("I", map(remap.__getitem__, ids))
+
+    def subgraph(self, cui_list):
+        """Get the interactions among a set of RxCUIs as a new graph
+
+        Only the neighbors of the given vertices are visited, so the cost
+        depends on their degrees and not on the size of this graph.
+
+        Parameters
+        ----------
+        cui_list :
+            A list of RxCUI numbers, RxCUIs that are not in the graph
+            are ignored
+
+        Returns
+        -------
+        Graph
+            The induced subgraph (vertices without an interaction in the
+            set are left out, as in a graph built from an API response)
+        """
+        index = self._index
+        members = {index[cui] for cui in cui_list if cui in index}
+        offsets, targets, edge_ids = self.csr()
+        found = {
+            edge_ids[k]
+            for i in members
+            for k in range(offsets[i], offsets[i + 1])
+            if targets[k] in members
+        }
+        graph = Graph()
+        ids, names = self.ids, self.names
+        found = sorted(found)  # keep the original edge order
+        columns = [
+            self._pool_ids(array("I", (column[eid] for eid in found)))
+            for column in (self.edge_source_id, self.edge_severity_id, self.edge_info_id)
+        ]
+        for eid, source, severity, info in zip(found, *columns):
+            a, b = self.edge_src[eid], self.edge_dest[eid]
+            graph._add_edge(ids[a], names[a], ids[b], names[b], source, severity, info)
+        return graph
+
+    def distances(self, source):
+        """Number of interactions on a shortest path from `source` to every vertex
+
+        Parameters
+        ----------
+        source : str
+            RxCUI of the start vertex
+
+        Returns
+        -------
+        dict
+            RxCUI as keys and the distance as values, for every vertex
+            reachable from `source` (including `source` itself, at 0)
+        """
+        ids = self.ids
+        dist = self._bfs([self._index[source]])[0]
+        return {ids[i]: d for i, d in enumerate(dist) if d >= 0}
+
+    def multi_source_distances(self, sources):
+        """Distance from every vertex to the nearest of a set of vertices
+
+        One BFS from all `sources` at once, e.g. how far every drug is
+        from any drug of a patient's regimen.
+
+        Parameters
+        ----------
+        sources :
+            RxCUIs of the start vertices
+
+        Returns
+        -------
+        dict
+            RxCUI as keys and `(distance, nearest source RxCUI)` as
+            values, for every vertex reachable from one of the sources
+        """
+        ids = self.ids
+        dist, origin = self._bfs([self._index[cui] for cui in sources])
+        return {ids[i]: (d, ids[origin[i]]) for i, d in enumerate(dist) if d >= 0}
+
+    def _bfs(self, starts):
+        """Level-order BFS from a list of vertex ids
+
+        Returns the distance of every vertex (-1 if unreachable) and the
+        start vertex it was reached from, as two arrays by vertex id.
+        """
+        offsets, targets, _ = self.csr()
+        dist = array("i", [-1]) * self.num_vertices
+        origin = array("i", [-1]) * self.num_vertices
+        frontier = []
+        for s in starts:
+            if dist[s] < 0:
+                dist[s], origin[s] = 0, s
+                frontier.append(s)
+        level = 0
+        while frontier:
+            level += 1
+            next_frontier = []
+            for u in frontier:
+                for v in targets[offsets[u]:offsets[u + 1]]:
+                    if dist[v] < 0:
+                        dist[v], origin[v] = level, origin[u]
+                        next_frontier.append(v)
+            frontier = next_frontier
+        return dist, origin
+
+    def distance(self, start, end):
+        """Number of interactions on a shortest path between two RxCUIs
+
+        Returns
+        -------
+        int or float
+            The distance, 0 if `start == end` and `math.inf` if `end` can't
+            be reached from `start`
+        """
+        path = self.shortest_path(start, end)
+        return inf if path is None else len(path) - 1
+
+    def shortest_path(self, start, end):
+        """A shortest chain of interactions between two RxCUIs
+
+        Bidirectional BFS: searches from both ends and always expands the
+        smaller frontier, so a query visits far fewer vertices than a BFS
+        from `start` alone.
+
+        Parameters
+        ----------
+        start : str
+            RxCUI of the first vertex
+        end : str
+            RxCUI of the last vertex
+
+        Returns
+        -------
+        list or None
+            RxCUIs of the path from `start` to `end` (both included), or
+            `None` if they are not connected
+
+        Raises
+        ------
+        KeyError
+            When `start` or `end` is not in the graph
+        """
+        s, t = self._index[start], self._index[end]
+        if s == t:
+            return [start]
+        offsets, targets, _ = self.csr()
+        # vertex id: (parent vertex id, distance) of each search
+        forward, backward = {s: (-1, 0)}, {t: (-1, 0)}
+        forward_frontier, backward_frontier = [s], [t]
+
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) > len(backward_frontier):
+                forward, backward = backward, forward
+                forward_frontier, backward_frontier = backward_frontier, forward_frontier
+            # expand one whole level of the smaller side, and keep the
+            # meeting vertex that gives the shortest path
+            meet, best = -1, inf
+            next_frontier = []
+            for u in forward_frontier:
+                level = forward[u][1] + 1
+                for v in targets[offsets[u]:offsets[u + 1]]:
+                    if v in forward:
+                        continue
+                    forward[v] = (u, level)
+                    next_frontier.append(v)
+                    other = backward.get(v)
+                    if other is not None and level + other[1] < best:
+                        meet, best = v, level + other[1]
+            if meet >= 0:
+                path = _trace(forward, meet)[::-1] + _trace(backward, meet)[1:]
+                if path[0] != self._index[start]:
+                    path.reverse()
+                ids = self.ids
+                return [ids[i] for i in path]
+            forward_frontier = next_frontier
+        return None
+
+    def severity_path(self, start, end, cost=None):
+        """The chain of interactions between two RxCUIs with the lowest severity cost
+
+        Dijkstra's algorithm where every interaction costs according to
+        its severity. With the default costs, the path follows the most
+        severe interactions, i.e. it is the most concerning way the two
+        drugs are connected; with e.g. `{"high": 10, "moderate": 3,
+        "low": 1}` it avoids severe interactions instead.
+
+        Parameters
+        ----------
+        start : str
+            RxCUI of the first vertex
+        end : str
+            RxCUI of the last vertex
+        cost : dict, optional
+            Severity as keys and positive costs as values (default
+            `SEVERITY_COST`), other severities cost `max(cost) + 1`
+
+        Returns
+        -------
+        tuple
+            The total cost and the RxCUIs of the path (both ends
+            included), or `(math.inf, None)` if they are not connected
+        """
+        cost = SEVERITY_COST if cost is None else cost
+        other_cost = max(cost.values(), default=0) + 1
+        s, t = self._index[start], self._index[end]
+        offsets, targets, edge_ids = self.csr()
+        severity = self.edge_severity
+        edge_cost = {}  # edge id: cost, filled as edges are relaxed
+
+        parent = {s: (-1, 0)}  # vertex id: (parent vertex id, cost)
+        best = {s: 0}
+        heap = [(0, s)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u == t:
+                ids = self.ids
+                return d, [ids[i] for i in reversed(_trace(parent, t))]
+            if d > best[u]:
+                continue  # stale heap entry
+            for k in range(offsets[u], offsets[u + 1]):
+                eid = edge_ids[k]
+                w = edge_cost.get(eid)
+                if w is None:
+                    w = edge_cost[eid] = cost.get(severity[eid], other_cost)
+                v, nd = targets[k], d + w
+                if nd < best.get(v, inf):
+                    best[v], parent[v] = nd, (u, nd)
+                    heapq.heappush(heap, (nd, v))
+        return inf, None
+
+    def nbytes(self):
+        """Approximate memory held by the graph in bytes
+
+        For a loaded snapshot this is the size of the mapped file. The
+        strings of the interactions are shared by all graphs in
+        `edge_strings` and not counted.
+        """
+        if self._snapshot is not None:
+            return len(self._snapshot)
+        containers = [
+            self.ids, self.names, self._index_map, self.edge_src, self.edge_dest,
+            self.edge_source_id, self.edge_severity_id, self.edge_info_id, self._pairs,
+            *(self._csr or ()),
+        ]
+        strings = {id(x): x for column in (self.ids, self.names) for x in column}
+        return sum(map(sys.getsizeof, containers)) + sum(map(sys.getsizeof, strings.values()))
+
+# default costs of `Graph.severity_path()`: the most severe interactions
+# are the cheapest to follow
+SEVERITY_COST = {"high": 1, "moderate": 2, "low": 3}
+
+
+def _trace(parents, v):
+    """Vertex ids from `v` back to the root of a `{vertex: (parent, ...)}` tree"""
+    path = []
+    while v >= 0:
+        path.append(v)
+        v = parents[v][0]
+    return path
+
+_SNAPSHOT_MAGIC = b"DDIG"
+_SNAPSHOT_VERSION = 1
+# magic, version, vertices, edges, strings, CSR length, string blob bytes
+_SNAPSHOT_HEADER = struct.Struct("<4sIIIIIQ")
+
+def to_nested_dict(graph, compact=False):
+    """Convert a graph to the nested dictionary of `graph.json`
+
+    Uses a 2 level nested dict
+    1: from rxcui: [from name, level 2 dict]
+    2: to rxcui: [to name, source, severity, additional info]
+
+    With `compact=True` every interaction is written once and every
+    distinct string once:
+    {"strings": [source, severity and info strings],
+     "drugs": {rxcui: name},
+     "interactions": [[from rxcui, to rxcui, source, severity, info]]}
+    with the indices of the strings in "strings".
+    """
+    if compact:
+        strings = {}  # string -> index in "strings"
+        remap = {}  # string id of the graph -> index in "strings"
+        def index(i):
+            k = remap.get(i)
+            if k is None:
+                k = remap[i] = strings.setdefault(graph._strings[i], len(strings))
+            return k
+
+        ids = graph.ids
+        interactions = [
+            [ids[a], ids[b], index(source), index(severity), index(info)]
+            for a, b, source, severity, info in zip(
+                graph.edge_src, graph.edge_dest,
+                graph.edge_source_id, graph.edge_severity_id, graph.edge_info_id,
+            )
+        ]
+        return {
+            "strings": list(strings),
+            "drugs": dict(zip(ids, graph.names)),
+            "interactions": interactions,
+        }
+    graph_json = {}
+    for i in graph.vert_list:
+        vertex = graph.vert_list[i]
+        if not vertex.connectedTo:
+            continue  # vertices without interactions are not written
+        graph_json[i] = [ # from rxcui
+            vertex.name,  # from rx name
+            {
+                j.id: [ # to rxcui
+                    j.name,  # to rx name
+                    edge.source,  # source of info
+                    edge.severity, # severity of interaction
+                    edge.additional_info, # additional info abt. interaction
+                ] for j, edge in vertex.connectedTo.items() # have to account for all connections
+            },
+        ]
+    return graph_json
+
+def from_nested_dict(graph_json):
+    """Build a graph from the nested dictionary of `graph.json`
+
+    Both the nested and the compact form of `to_nested_dict()` are read.
+    """
+    graph = Graph()
+    if "interactions" in graph_json:
+        # compact: the strings are interned once, not once per interaction
+        strings = [edge_strings.intern(x) for x in graph_json["strings"]]
+        names = graph_json["drugs"]
+        for cui, name in names.items():
+            graph.add_vertex(cui, name)
+        for f, t, source, severity, info in graph_json["interactions"]:
+            graph._add_edge(
+                f, names[f], t, names[t], strings[source], strings[severity], strings[info]
+            )
+        return graph
+    # i - key, v - list of value (0 is from rxcui name, 1 is interaction)
+    for i, v in graph_json.items():
+        # j is to rxcui, k is to interaction data
+        # k 0 : to name
+        # k 1 : source
+        # k 2 : severity
+        # k 3 : additional info
+        for j, k in v[1].items():
+            graph.add_edge(i, v[0], j, k[0], k[1], k[2], k[3])
+    return graph
 
 def bfs(graph, start, end):
-    if start == end:
-        return 0
-    
-    visited = set()
-    # use deque to hold start vertex and distance 
-    queue = deque([(start, 0)])
-
-    while queue:
-        cur_id, path = queue.popleft()
-        if cur_id == end:
-            return path
-
-        if cur_id not in visited:
-            visited.add(cur_id)
-            current = graph.vert_list[cur_id]
-            for neighbor in current.connectedTo:
-                if neighbor.id not in visited:
-                    queue.append((neighbor.id, path + 1))
-
-    return 0 # no paths found
-
-def weight_avg(n, avg_old, distance):
-    """Helper function to compute weighted average
+    """Number of interactions on a shortest path between two RxCUIs
+
+    See `Graph.distance()` (bidirectional BFS on the integer adjacency).
+
+    Returns
+    -------
+    int or float
+        The distance, 0 if `start == end` and `math.inf` if there is no
+        path between them
+    """
+    return graph.distance(start, end)
+
+def average_shortest_paths(graph):
+    """Compute the exact average shortest path length for every vertex
+
+    Replaces the original per-vertex sampler (kept as
+    `benchmarks.legacy.random_walk()`): all sources are expanded at once
+    with a bitset BFS. Each vertex keeps an int bitmask of the sources that
+    have reached it, and every level only ORs in the bits that its
+    neighbors gained on the previous level. Since the graph is
+    undirected, the sources that first reach `v` at level k are exactly the
+    vertices at distance k from `v`, so one pass yields the distance sums
+    of every vertex. Runs in O(diameter * E) bitmask operations (each
+    V / 64 words wide), bounded by O(V * E), and is fully deterministic.
 
     Parameters
     ----------
-    n : float
-        current iteration number
-    avg_old : float
-        Cumulative average
-    distance : float
-        New distance computed based on the `opt1()` function
+    graph : Graph
+        The drug interaction graph
 
     Returns
     -------
-    float
-        The weighted average of the path length
+    dict
+        RxCUI as keys and the average shortest path length to every
+        reachable vertex as values (0 if a vertex has no reachable vertex)
     """
-    return ((n * avg_old) + distance) / (n + 1)
-
-def random_walk(drug_li, drug_graph, user_choice):
-    n = 0  # actor counter
-    avg_diff = inf
-    avg_old = 0
-    avg_all = []
-    drug_li = list(drug_li)
-
-    while avg_diff > 0.01:
-        # choose actor randomly
-        chosen = []
-        random_act = random.choice(drug_li)
-        if random_act not in chosen:
-            chosen.append(random_act)
-            # calculate distance from BK to actor
-            distance = bfs(drug_graph, start=user_choice, end=random_act)
-            # get list length for actor path
-            # distance = len(distance) - 1
-            if distance > 0:
-                avg = weight_avg(n, avg_old, distance)
-                avg_all.append(avg)
-                avg_diff = abs(avg - avg_old)
-                # print(f"distance: {distance}, avg: {avg}, avg_diff: {avg_diff}")
-                avg_old = avg
-                n += 1
-    return sum(avg_all) / len(avg_all)
+    ids = graph.ids
+    offsets, targets, _ = graph.csr()
+    # integer-indexed adjacency list
+    adj = [targets[offsets[i]:offsets[i + 1]] for i in range(len(ids))]
+
+    reach = [1 << i for i in range(len(ids))]  # sources that reached vertex i
+    delta = dict(enumerate(reach))  # sources that reached vertex i last level
+    total = [0] * len(ids)  # sum of distances
+    count = [0] * len(ids)  # number of reachable vertices
+    level = 0
+    while delta:
+        level += 1
+        # only neighbors of vertices that changed on the last level can change
+        candidates = {v for u in delta for v in adj[u]}
+        new_delta = {}
+        for v in candidates:
+            gained = 0
+            for u in adj[v]:
+                if u in delta:
+                    gained |= delta[u]
+            gained &= ~reach[v]
+            if gained:
+                reach[v] |= gained
+                new_delta[v] = gained
+                n_gained = gained.bit_count()
+                total[v] += level * n_gained
+                count[v] += n_gained
+        delta = new_delta
+
+    return {
+        cui: (total[i] / count[i] if count[i] else 0.0) for i, cui in enumerate(ids)
+    }
+
+
+# risk weight of an interaction by severity, other severities (e.g. "N/A")
+# count as `UNKNOWN_SEVERITY_WEIGHT`
+SEVERITY_WEIGHT = {"high": 3.0, "moderate": 2.0, "low": 1.0}
+UNKNOWN_SEVERITY_WEIGHT = 1.0
+
+def risk_report(graph, top_k=10, weights=None):
+    """Severity-weighted risk of every drug, interaction group and the regimen
+
+    Computed in a single pass over the interactions (O(V + E log k)): the
+    weighted degree of every drug is accumulated, the `top_k` heaviest
+    interactions are kept in a bounded heap, and the connected components
+    (groups of drugs that interact directly or through other drugs) are
+    merged with a union-find.
+
+    Parameters
+    ----------
+    graph : Graph
+        The drug interaction graph
+    top_k : int
+        Number of most severe interactions to report
+    weights : dict, optional
+        Severity as keys and risk weights as values (default
+        `SEVERITY_WEIGHT`), other severities weigh `UNKNOWN_SEVERITY_WEIGHT`
+
+    Returns
+    -------
+    dict
+        `regimen`: total score, number of drugs and interactions and the
+        number of interactions per severity;
+        `drugs`: RxCUI, name, score (weighted degree), number of
+        interactions and most severe interaction of every drug, riskiest
+        first;
+        `top_interactions`: the `top_k` heaviest interactions (ties in
+        graph order), with both drugs, severity, weight, source and
+        description;
+        `components`: score, number of interactions and RxCUIs of every
+        group of connected drugs, riskiest first
+    """
+    weights = SEVERITY_WEIGHT if weights is None else weights
+    ids, names = graph.ids, graph.names
+    n = graph.num_vertices
+    score = [0.0] * n
+    degree = [0] * n
+    worst = [None] * n  # weight and severity of the heaviest interaction
+    parent = list(range(n))  # union-find forest of the components
+    by_severity = {}
+    heap = []  # (weight, -edge id) of the heaviest interactions
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]  # path halving
+            v = parent[v]
+        return v
+
+    for eid, (a, b, severity) in enumerate(zip(graph.edge_src, graph.edge_dest, graph.edge_severity)):
+        w = weights.get(severity, UNKNOWN_SEVERITY_WEIGHT)
+        by_severity[severity] = by_severity.get(severity, 0) + 1
+        for v in (a, b):
+            score[v] += w
+            degree[v] += 1
+            if worst[v] is None or w > worst[v][0]:
+                worst[v] = (w, severity)
+        if top_k > 0:
+            if len(heap) < top_k:
+                heapq.heappush(heap, (w, -eid))
+            elif (w, -eid) > heap[0]:
+                heapq.heapreplace(heap, (w, -eid))
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+
+    components = {}  # root: [score, interactions, vertex ids]
+    for v in range(n):
+        component = components.setdefault(find(v), [0.0, 0, []])
+        component[0] += score[v] / 2  # every interaction is counted at both ends
+        component[1] += degree[v]
+        component[2].append(v)
+
+    def interaction(w, eid):
+        a, b = graph.edge_src[eid], graph.edge_dest[eid]
+        return {
+            "drugs": [{"rxcui": ids[a], "name": names[a]}, {"rxcui": ids[b], "name": names[b]}],
+            "severity": graph.edge_severity[eid],
+            "weight": w,
+            "source": graph.edge_source[eid],
+            "description": graph.edge_info[eid],
+        }
+
+    return {
+        "regimen": {
+            "score": sum(score) / 2,
+            "drugs": n,
+            "interactions": graph.num_edges,
+            "by_severity": by_severity,
+        },
+        "drugs": [
+            {
+                "rxcui": ids[v],
+                "name": names[v],
+                "score": score[v],
+                "interactions": degree[v],
+                "max_severity": worst[v][1] if worst[v] is not None else None,
+            }
+            for v in sorted(range(n), key=lambda v: -score[v])
+        ],
+        "top_interactions": [interaction(w, -neid) for w, neid in sorted(heap, reverse=True)],
+        "components": [
+            {"score": c_score, "interactions": c_degree // 2, "rxcuis": [ids[v] for v in members]}
+            for c_score, c_degree, members in sorted(components.values(), key=lambda c: -c[0])
+        ],
+    }
+
+
+def quotient(graph, key, names=None, weights=None):
+    """Merge the vertices of a graph by key, and their parallel interactions
+
+    The vertices with the same key become one vertex. The interactions
+    between two merged vertices become one interaction: the most severe
+    one (by `weights`), the most frequent if several are as severe, with
+    the number of merged interactions as its multiplicity. Interactions
+    that differ in severity or description are listed as its variants.
+    Interactions within a merged vertex are dropped.
+
+    Parameters
+    ----------
+    graph : Graph
+        The drug interaction graph
+    key : callable
+        `key(RxCUI)` returns the RxCUI of the merged vertex
+    names : dict, optional
+        Drug names of the merged vertices, by default the name of the
+        vertex with that RxCUI or of the first vertex merged into it
+    weights : dict, optional
+        Severity as keys and weights as values (default `SEVERITY_WEIGHT`)
+
+    Returns
+    -------
+    tuple
+        The quotient `Graph`; an `array("I")` with the multiplicity of
+        each of its interactions, by edge id; and a dict with the edge
+        ids of the interactions merged from more than one distinct
+        (severity, description) as keys and their
+        `(severity, description, count)` variants as values, most severe
+        first
+    """
+    weights = SEVERITY_WEIGHT if weights is None else weights
+    names = {} if names is None else names
+    ids = graph.ids
+    merged = [key(cui) for cui in ids]
+    vertex_name = {}
+    for cui, m, name in zip(ids, merged, graph.names):
+        if m not in vertex_name or cui == m:
+            vertex_name[m] = names.get(m, name)
+    # interactions are compared by the ids of their strings in `edge_strings`
+    columns = [
+        graph._pool_ids(column)
+        for column in (graph.edge_source_id, graph.edge_severity_id, graph.edge_info_id)
+    ]
+    pairs = {}  # (merged RxCUI, merged RxCUI): {(source, severity, info): count}
+    for a, b, *variant in zip(graph.edge_src, graph.edge_dest, *columns):
+        f, t = merged[a], merged[b]
+        if f == t:
+            continue
+        variants = pairs.setdefault((f, t) if f < t else (t, f), {})
+        variant = tuple(variant)
+        variants[variant] = variants.get(variant, 0) + 1
+
+    result = Graph()
+    multiplicity = array("I")
+    distinct = {}
+    strings = edge_strings.strings
+    for (f, t), variants in pairs.items():
+        # dicts keep the first-seen order, `sorted()` keeps the order of ties
+        ranked = sorted(
+            variants,
+            key=lambda v: (-weights.get(strings[v[1]], UNKNOWN_SEVERITY_WEIGHT), -variants[v]),
+        )
+        source, severity, info = ranked[0]
+        edge_id = len(multiplicity)  # every pair is added once
+        result._add_edge(f, vertex_name[f], t, vertex_name[t], source, severity, info)
+        multiplicity.append(sum(variants.values()))
+        # the same interaction from several sources is not a variant
+        counts = {}
+        for v in ranked:
+            counts[v[1:]] = counts.get(v[1:], 0) + variants[v]
+        if len(counts) > 1:
+            distinct[edge_id] = [
+                (strings[severity], strings[info], n) for (severity, info), n in counts.items()
+            ]
+    return result, multiplicity, distinct
 
 
 """
@@ -1,4 +1,4 @@
-from graph import Graph
+from graph import Graph, from_nested_dict, to_nested_dict
 import requests
 import json
 import networkx as nx
@@ -27,20 +27,7 @@ for i in content['fullInteractionTypeGroup']:
 # use 2 level nested dict
 # 1: from rxcui: [from name, level 2 dict]
 # 2: to rxcui: [to name, source, severity, additional info]
-graph_json = {}
-for i in graph.vert_list:
-    for j in graph.vert_list[i].connectedTo:
-        graph_json[i] = [ # from rxcui
-            graph.vert_list[i].name,  # from rx name
-            {
-                j.id: [ # to rxcui
-                    graph.vert_list[j.id].name,  # to rx name
-                    graph.vert_list[i].connectedTo[j].source,  # source of info
-                    graph.vert_list[i].connectedTo[j].severity, # severity of interaction
-                    graph.vert_list[i].connectedTo[j].additional_info, # additional info abt. interaction
-                ] for j in graph.vert_list[i].connectedTo # have to account for all connections
-            },
-        ]
+graph_json = to_nested_dict(graph)
 
 # dump to json
 with open("graph.json", "w") as f:
@@ -51,26 +38,11 @@ del graph_json
 with open("graph.json", "r") as f:
     graph_json = json.load(f)
 
-new_graph = Graph()
+new_graph = from_nested_dict(graph_json)
 
-# i - key, v - list of value (0 is from rxcui, 1 is interaction)
-for i, v in zip(graph_json.keys(), graph_json.values()):
-    # get interaction from v
-    # j is to rxcui, k is to interaction data
-    # k 0 : to name
-    # k 1 : source
-    # k 2 : severity
-    # k 3 : additional info
-    for j, k in zip(v[1].keys(), v[1].values()):
-        new_graph.add_edge(
-            i,
-            v[0],
-            j,
-            k[0],
-            k[1],
-            k[2],
-            k[3],
-        )
+# the same graph as a binary snapshot (see `Graph.save()`, the round
+# trip is checked by `tests.py`)
+graph.save("graph.snapshot")
 
 # check to see if the graph is working
 def create_networkx_graph(g):
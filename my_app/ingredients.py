@@ -0,0 +1,224 @@
+"""Ingredient groups of the RxNorm products of a query
+
+RxNorm resolves a drug name to every product that contains it: clinical
+drugs (SCD, "acetaminophen 325 MG Oral Tablet"), branded drugs (SBD,
+"acetaminophen 325 MG Oral Capsule [Tylenol]") and packs (GPCK / BPCK,
+"{...} Pack"). The interactions of a product are those of its
+ingredients, so most products of a name are near-duplicate vertices of
+the interaction graph. Products are grouped by their ingredients, read
+from the normalized RxNorm name, and
+- `collapse()` keeps one product per group for the interaction query
+- `collapse_graph()` merges the products of a graph of every product
+  into the kept products (for sources that store interactions by
+  product)
+- `expand()` and `view()` turn a graph of the kept products back into
+  a graph of the products of some or all groups, for display (`view()`
+  merges it from the graph of every product when there is one)
+"""
+import re
+from array import array
+from collections import namedtuple
+from .graph import Graph, quotient
+
+# the product of a group queried for interactions, preferred first
+TTY_PREFERENCE = ("SCD", "SBD", "GPCK", "BPCK")
+
+Concept = namedtuple("Concept", ["rxcui", "name", "tty", "ingredient"])
+Concept.__doc__ = """A RxNorm product, with the ingredient key of its group"""
+
+IngredientGroup = namedtuple("IngredientGroup", ["ingredient", "products"])
+IngredientGroup.__doc__ = """Ingredient key and `{RxCUI: drug name}` of the products of a group"""
+
+_BRAND = re.compile(r"\s*\[[^\]]*\]\s*$")  # trailing "[Brand]"
+_QUANTITY = re.compile(r"^\.?\d[\d.,]*\s+[A-Z]+\s+")  # leading "12 HR", "5 ML"
+_NUMBER = re.compile(r"\.?\d[\d.,]*")
+_PACK_ITEM = re.compile(r"\(([^()]*)\)")  # "(product name)" of a pack
+
+
+def _component_ingredient(component):
+    """Ingredient of one "name strength [dose form]" part of a product name"""
+    words = component.split()
+    for i, word in enumerate(words[1:], 1):
+        # the strength: a number followed by a unit ("325 MG", "10 MG/ML")
+        if _NUMBER.fullmatch(word) and i + 1 < len(words) and words[i + 1][:1].isupper():
+            return " ".join(words[:i])
+    for i, word in enumerate(words[1:], 1):
+        # no strength, the dose form starts with a capital letter
+        if word[:1].isupper():
+            return " ".join(words[:i])
+    return component
+
+
+def ingredients(name):
+    """Ingredients of a product, parsed from its normalized RxNorm name
+
+    >>> ingredients("acetaminophen 325 MG / oxycodone hydrochloride 5 MG Oral Tablet [Percocet]")
+    ('acetaminophen', 'oxycodone hydrochloride')
+
+    Returns
+    -------
+    tuple
+        Sorted, lowercase ingredient names
+    """
+    name = name.strip()
+    if name.startswith("{"):
+        # a pack: the ingredients of every product in it
+        items = _PACK_ITEM.findall(name)
+        return tuple(sorted({i for item in items for i in ingredients(item)})) or (name.lower(),)
+    name = _QUANTITY.sub("", _BRAND.sub("", name))
+    return tuple(sorted({_component_ingredient(part).lower() for part in name.split(" / ")}))
+
+
+def product_tty(name):
+    """Term type of a product guessed from its name, for entries without one"""
+    name = name.strip()
+    if name.startswith("{"):
+        return "BPCK" if name.endswith("]") else "GPCK"
+    return "SBD" if name.endswith("]") else "SCD"
+
+
+def concept(rxcui, name, tty=None):
+    """The `Concept` of a product, the term type guessed if not given"""
+    return Concept(rxcui, name, tty or product_tty(name), " / ".join(ingredients(name)))
+
+
+def _preference(c):
+    rank = TTY_PREFERENCE.index(c.tty) if c.tty in TTY_PREFERENCE else len(TTY_PREFERENCE)
+    return rank, len(c.rxcui), c.rxcui
+
+
+def collapse(cui_name, concepts=None):
+    """Keep one product per ingredient group
+
+    The product of a group is the one first in `TTY_PREFERENCE` (a
+    clinical drug if there is one), then with the lowest RxCUI.
+
+    Parameters
+    ----------
+    cui_name : dict
+        RxCUI as keys and drug names as values, e.g. of `getRxNorm()`
+    concepts : dict, optional
+        RxCUI as keys and known `Concept`s as values (e.g. of
+        `RxNormCache.concepts()`), the others are made from the names
+
+    Returns
+    -------
+    tuple
+        `{RxCUI: drug name}` of the kept products, and
+        `{kept RxCUI: IngredientGroup}` of every group
+    """
+    concepts = concepts or {}
+    by_ingredient = {}
+    for cui, name in cui_name.items():
+        c = concepts.get(cui) or concept(cui, name)
+        by_ingredient.setdefault(c.ingredient, []).append(c)
+    kept, groups = {}, {}
+    for ingredient, members in by_ingredient.items():
+        first = min(members, key=_preference)
+        kept[first.rxcui] = cui_name[first.rxcui]
+        groups[first.rxcui] = IngredientGroup(
+            ingredient, {c.rxcui: cui_name[c.rxcui] for c in members}
+        )
+    return kept, groups
+
+
+def expand(graph, groups):
+    """Graph of every product from a graph of the kept products
+
+    Every interaction of a kept product is repeated for each product of
+    its group, vertices without a group in `groups` are kept as they are.
+
+    Parameters
+    ----------
+    graph : Graph
+        Interaction graph of the RxCUIs kept by `collapse()`
+    groups : dict
+        Kept RxCUI as keys and `IngredientGroup`s as values
+
+    Returns
+    -------
+    Graph
+        A new graph, `graph` itself if no group has more than one product
+    """
+    if all(len(g.products) <= 1 for g in groups.values()):
+        return graph
+    names = graph.vert_list
+    expanded = Graph()
+    for f, t, source, severity, info in graph.edges():
+        f_products = groups[f].products if f in groups else {f: names[f].name}
+        t_products = groups[t].products if t in groups else {t: names[t].name}
+        for fp, fp_name in f_products.items():
+            for tp, tp_name in t_products.items():
+                expanded.add_edge(fp, fp_name, tp, tp_name, source, severity, info)
+    return expanded
+
+
+def collapse_graph(graph, groups, expanded=()):
+    """Merge the products of every group of a graph into the kept product
+
+    Parameters
+    ----------
+    graph : Graph
+        Interaction graph of the products of the groups
+    groups : dict
+        Kept RxCUI as keys and `IngredientGroup`s as values
+    expanded : iterable
+        Kept RxCUIs of the groups whose products are not merged
+
+    Returns
+    -------
+    tuple
+        The graph of the kept products; the number of product
+        interactions merged into each of its interactions; and the
+        distinct interactions merged into an interaction, where there
+        are several (see `graph.quotient()`)
+    """
+    expanded = set(expanded)
+    kept = {cui: k for k, g in groups.items() if k not in expanded for cui in g.products}
+    names = {k: g.products[k] for k, g in groups.items()}
+    return quotient(graph, lambda cui: kept.get(cui, cui), names)
+
+
+def view(graph, groups, expanded=(), products=None):
+    """The graph shown with some groups expanded to their products
+
+    For sources that store interactions by product, the shown graph is
+    merged from the graph of every product, so each interaction counts
+    the product pairs that actually interact. Otherwise the interactions
+    of the expanded groups are repeated for each of their products, the
+    rest of the graph is copied as is, and each interaction stands for
+    every pair of products of its two groups.
+
+    Parameters
+    ----------
+    graph : Graph
+        Interaction graph of the kept products
+    groups : dict
+        Kept RxCUI as keys and `IngredientGroup`s as values
+    expanded : iterable
+        Kept RxCUIs of the groups to expand
+    products : Graph, optional
+        Interaction graph of every product of the groups, for sources
+        that store interactions by product
+
+    Returns
+    -------
+    tuple
+        The graph shown; the expanded products as keys and the kept
+        RxCUI of their group as values (for the layout); an
+        `array("I")` with the number of product pairs each interaction
+        stands for, by edge id; and the distinct interactions merged
+        into an interaction, by edge id (see `graph.quotient()`)
+    """
+    expanded = {k: groups[k] for k in expanded if k in groups}
+    anchors = {cui: k for k, g in expanded.items() for cui in g.products if cui != k}
+    if products is not None:
+        shown, multiplicity, variants = collapse_graph(products, groups, expanded)
+        return shown, anchors, multiplicity, variants
+    shown = expand(graph, expanded)
+    size = [
+        len(groups[cui].products) if cui in groups and cui not in expanded else 1
+        for cui in shown.ids
+    ]
+    multiplicity = array("I", (size[a] * size[b] for a, b in zip(shown.edge_src, shown.edge_dest)))
+    return shown, anchors, multiplicity, {}
@@ -0,0 +1,310 @@
+"""Request-scoped timing spans and process metrics
+
+The pipeline stages of a request (RxNorm lookup, interaction fetch,
+layout, figure building, ...) are timed with `span()`, used as a context
+manager or a decorator. `timing_middleware` collects the spans of each
+request in a context variable (so they follow the request into threads
+started with `asyncio.to_thread` / `sync_to_async` and onto the fetch
+loop) and reports them in a `Server-Timing` response header and one
+structured log line per request. Span durations, upstream requests and
+cache hit / miss counts are aggregated per process in `metrics`, served
+in the Prometheus text format by the `/metrics` view.
+
+Set `INSTRUMENTATION=0` to turn it off: `span()` then returns a shared
+no-op context manager, decorated functions are left unwrapped and the
+middleware removes itself.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+ENABLED = os.environ.get("INSTRUMENTATION", "1") != "0"
+# upper bounds in seconds of the histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+# (span name, seconds) of the current request, None outside of a request
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+class Histogram:
+    """Thread-safe cumulative-bucket histogram of durations in seconds"""
+    __slots__ = ("counts", "sum", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket: +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Metrics:
+    """Thread-safe registry of the counters and histograms of the process
+
+    Metrics are keyed by name and a sorted tuple of `(label, value)`
+    pairs. Collectors registered with `collector()` add values read at
+    scrape time (e.g. cache hit counters).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # name: {labels: Histogram}
+        self._counters = {}  # name: {labels: int}
+        self._collectors = []
+
+    def histogram(self, name, **labels):
+        """The histogram of a name and labels, created on first use"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._histograms.setdefault(name, {})
+            histogram = family.get(key)
+            if histogram is None:
+                histogram = family[key] = Histogram()
+            return histogram
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    def count(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._counters.setdefault(name, {})
+            family[key] = family.get(key, 0) + value
+
+    def collector(self, fn):
+        """Register `fn()`, returning `(name, labels dict, value)` counters"""
+        self._collectors.append(fn)
+        return fn
+
+    def register_caches(self, **caches):
+        """Report the `hits` / `misses` attributes of caches, by name"""
+        def collect():
+            for name, cache in caches.items():
+                yield "cache_hits_total", {"cache": name}, cache.hits
+                yield "cache_misses_total", {"cache": name}, cache.misses
+        self.collector(collect)
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {name: dict(family) for name, family in self._histograms.items()}
+            counters = {name: dict(family) for name, family in self._counters.items()}
+        for collect in self._collectors:
+            for name, labels, value in collect():
+                counters.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+        lines = []
+        for name, family in sorted(counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(family.items()):
+                lines.append(f"{name}{_labels(key)} {value}")
+        for name, family in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(family.items()):
+                counts, total = histogram.snapshot()
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(key + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+# metrics of this process
+metrics = Metrics()
+_span_histograms = {}  # span name: its `span_duration_seconds` histogram
+
+
+def record(name, seconds):
+    """Add a finished span to the current request and the process metrics"""
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+    histogram = _span_histograms.get(name)
+    if histogram is None:
+        histogram = _span_histograms[name] = metrics.histogram("span_duration_seconds", span=name)
+    histogram.observe(seconds)
+
+
+class _Span:
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self._start)
+
+    def __call__(self, fn):
+        name = self.name
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed(*args, **kwargs):
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                with _Span(name):
+                    return fn(*args, **kwargs)
+        return timed
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __call__(self, fn):
+        return fn
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Time a pipeline stage, as a context manager or a decorator
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage in the `Server-Timing` header and the metrics
+
+    Examples
+    --------
+    >>> with span("layout"):
+    ...     pos = compute_layout(G)
+
+    >>> @span("rxnorm")
+    ... def getRxNorm(query_str): ...
+    """
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+
+class _Upstream:
+    __slots__ = ("host", "status", "_start")
+
+    def __init__(self, url):
+        self.host = urlsplit(url).hostname or ""
+        self.status = "error"  # unless the response status is set
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        # concurrent requests overlap, their sum can exceed the wall time
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append(("upstream", seconds))
+        metrics.observe("upstream_request_duration_seconds", seconds, host=self.host)
+        metrics.count("upstream_requests_total", host=self.host, status=str(self.status))
+
+
+class _NullUpstream(_NullSpan):
+    __slots__ = ("status",)
+
+
+def upstream(url):
+    """Time an HTTP request to an API, set `.status` to the response status
+
+    Examples
+    --------
+    >>> with upstream(url) as call:
+    ...     response = session.get(url)
+    ...     call.status = response.status_code
+    """
+    return _Upstream(url) if ENABLED else _NullUpstream()
+
+
+def summarize(spans):
+    """Total duration of every span name, in order of first occurrence"""
+    durations = {}
+    for name, seconds in spans:
+        durations[name] = durations.get(name, 0.0) + seconds
+    return durations
+
+
+def _finish(request, response, spans, start):
+    total = time.perf_counter() - start
+    durations = summarize(spans)
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    response["Server-Timing"] = ", ".join(entries)
+    match = request.resolver_match
+    route = match.route if match is not None else "unmatched"
+    metrics.observe("request_duration_seconds", total, route=route)
+    if logger.isEnabledFor(logging.INFO):
+        # logfmt: one `key=value` pair per stage
+        stages = "".join(f" {name}_ms={seconds * 1000:.1f}" for name, seconds in durations.items())
+        logger.info(
+            "method=%s path=%s status=%d total_ms=%.1f%s",
+            request.method, request.path, response.status_code, total * 1000, stages,
+            extra={"spans": durations, "total": total},
+        )
+    return response
+
+
+@sync_and_async_middleware
+def timing_middleware(get_response):
+    """Collect the spans of every request, see the module docstring"""
+    if not ENABLED:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            spans = []
+            token = _request_spans.set(spans)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _request_spans.reset(token)
+            return _finish(request, response, spans, start)
+
+        markcoroutinefunction(middleware)
+    else:
+        def middleware(request):
+            spans = []
+            token = _request_spans.set(spans)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _request_spans.reset(token)
+            return _finish(request, response, spans, start)
+
+    return middleware
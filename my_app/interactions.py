@@ -0,0 +1,612 @@
+"""Drug interaction data sources and the chunked fetch pipeline
+
+Every source answers "all interactions among these RxCUIs" in the json
+shape of the (retired) NIH interaction API:
+`{"fullInteractionTypeGroup": [{"sourceName": ..., "fullInteractionType": [...]}]}`
+"""
+import asyncio
+import csv
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from .fetch import MAX_WORKERS, RXNAV_URL, executor, gather_limited, get_chunks, get_json
+from .fetch import get_json_async
+from .jsonstream import file_chunks, interaction_records
+
+
+class InteractionSource:
+    """Interface of a drug interaction data source
+
+    Subclasses implement `fetch()`, and `fetch_async()` if they can fetch
+    without blocking a thread. `max_cuis` is the largest number of RxCUIs
+    a single `fetch()` call accepts (`None` for no limit).
+    `product_level` sources store interactions by product RxCUI, the
+    others find the interactions of any product of an ingredient.
+    """
+    max_cuis = None
+    product_level = False
+
+    def fetch(self, cui_list):
+        """Get all interactions among the given RxCUIs
+
+        Parameters
+        ----------
+        cui_list :
+            A list of RxCUI numbers
+
+        Returns
+        -------
+            A dictionary in the NIH `fullInteractionTypeGroup` json shape
+        """
+        raise NotImplementedError
+
+    def fetch_records(self, cui_list):
+        """Iterate over the interactions among the given RxCUIs
+
+        Sources with large responses override this to parse them as they
+        are read, by default the records of `fetch()` are listed.
+
+        Yields
+        ------
+        tuple
+            (source name, `fullInteractionType` record)
+        """
+        return response_records(self.fetch(cui_list))
+
+    async def fetch_async(self, cui_list):
+        """Coroutine version of `fetch()`, runs `fetch()` in a thread by default"""
+        return await asyncio.to_thread(self.fetch, cui_list)
+
+
+class NIHInteractionSource(InteractionSource):
+    """The NIH drug interaction API (discontinued in January 2024)"""
+    max_cuis = 50
+
+    def __init__(self, base_url=RXNAV_URL):
+        self.base_url = base_url
+
+    def fetch(self, cui_list):
+        cui_str = "+".join(cui_list) # join CUI with +
+        return get_json(f"{self.base_url}/interaction/list.json?rxcuis={cui_str}")
+
+    def fetch_records(self, cui_list):
+        cui_str = "+".join(cui_list) # join CUI with +
+        return interaction_records(get_chunks(f"{self.base_url}/interaction/list.json?rxcuis={cui_str}"))
+
+    async def fetch_async(self, cui_list):
+        cui_str = "+".join(cui_list) # join CUI with +
+        return await get_json_async(f"{self.base_url}/interaction/list.json?rxcuis={cui_str}")
+
+
+class FixtureInteractionSource(InteractionSource):
+    """Interactions loaded from a local json file
+
+    Accepts either a saved NIH response (`fullInteractionTypeGroup` shape)
+    or the nested dictionary written by `graph_to_json.py` (`graph.json`).
+
+    Parameters
+    ----------
+    path : str
+        Path of the json file
+    """
+    product_level = True
+
+    def __init__(self, path):
+        records = _json_records(path)
+        self.records = []  # (source name, fullInteractionType record)
+        self.by_cui = {}  # RxCUI: indices of the records that involve it
+        seen = set()
+        for source_name, record in records:
+            a, b = (c["rxcui"] for c in record["minConcept"][:2])
+            key = (source_name, min(a, b), max(a, b))
+            if key in seen:
+                continue  # the nested dictionary holds both directions
+            seen.add(key)
+            self.by_cui.setdefault(a, []).append(len(self.records))
+            self.by_cui.setdefault(b, []).append(len(self.records))
+            self.records.append((source_name, record))
+
+    def fetch(self, cui_list):
+        cui_set = set(cui_list)
+        found = set()
+        for cui in cui_set:
+            for k in self.by_cui.get(cui, ()):
+                a, b = (c["rxcui"] for c in self.records[k][1]["minConcept"][:2])
+                if a in cui_set and b in cui_set:
+                    found.add(k)
+        groups = {}  # source name: records
+        for k in sorted(found):
+            source_name, record = self.records[k]
+            groups.setdefault(source_name, []).append(record)
+        if not groups:
+            return {}
+        return {
+            "fullInteractionTypeGroup": [
+                {"sourceName": s, "fullInteractionType": r} for s, r in groups.items()
+            ]
+        }
+
+
+class InteractionDatabase(InteractionSource):
+    """Local interaction store in an indexed SQLite database
+
+    Every interaction is one row keyed by `(rxcui_a, rxcui_b, source)` with
+    `rxcui_a < rxcui_b`; the table is clustered on that key (`WITHOUT
+    ROWID`). "All interactions among N RxCUIs" is answered with index
+    lookups only, choosing per query between one lookup per RxCUI pair
+    and one key-range scan per RxCUI, whichever touches fewer rows.
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite database file, created if missing
+    """
+    product_level = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()  # one connection per thread
+        self._degree = None  # average number of interactions per RxCUI
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS concept (
+                    rxcui TEXT PRIMARY KEY, name TEXT NOT NULL
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS interaction (
+                    rxcui_a TEXT NOT NULL, rxcui_b TEXT NOT NULL, source TEXT NOT NULL,
+                    severity TEXT, description TEXT,
+                    PRIMARY KEY (rxcui_a, rxcui_b, source)
+                ) WITHOUT ROWID;
+                CREATE TEMP TABLE IF NOT EXISTS query (rxcui TEXT PRIMARY KEY) WITHOUT ROWID;
+                """
+            )
+            self._local.conn = conn
+        return conn
+
+    def ingest(self, records, batch_size=50_000):
+        """Bulk-load interaction records, replacing existing pairs
+
+        Parameters
+        ----------
+        records :
+            Iterable of (from RxCUI, from name, to RxCUI, to name, source,
+            severity, description) tuples, see `read_records()`
+
+        Returns
+        -------
+        int
+            Number of records loaded
+        """
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=OFF")  # bulk load, rerun on a crash
+        n = 0
+        with conn:  # one transaction
+            concepts, rows = {}, []
+            for f, f_name, t, t_name, source, severity, description in records:
+                concepts[f], concepts[t] = f_name, t_name
+                if t < f:
+                    f, t = t, f
+                rows.append((f, t, source, severity, description))
+                if len(rows) >= batch_size:
+                    n += self._insert(conn, concepts, rows)
+                    concepts, rows = {}, []
+            n += self._insert(conn, concepts, rows)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("ANALYZE")
+        self._degree = None
+        return n
+
+    @staticmethod
+    def _insert(conn, concepts, rows):
+        rows.sort()  # insert in key order
+        conn.executemany("INSERT OR REPLACE INTO concept VALUES (?, ?)", concepts.items())
+        conn.executemany("INSERT OR REPLACE INTO interaction VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def fetch(self, cui_list):
+        conn = self._connect()
+        cui_list = list(dict.fromkeys(cui_list))
+        with conn:
+            conn.execute("DELETE FROM temp.query")
+            conn.executemany("INSERT INTO temp.query VALUES (?)", ((c,) for c in cui_list))
+            n_pairs = len(cui_list) * (len(cui_list) - 1) // 2
+            if n_pairs <= len(cui_list) * self._average_degree(conn):
+                # one primary key lookup per pair (CROSS JOIN fixes the order)
+                joins = "temp.query AS qa CROSS JOIN temp.query AS qb CROSS JOIN interaction AS i"
+                where = "qa.rxcui < qb.rxcui AND i.rxcui_a = qa.rxcui AND i.rxcui_b = qb.rxcui"
+            else:
+                # one primary key range per RxCUI, keep partners in the set
+                joins = "temp.query AS qa CROSS JOIN interaction AS i CROSS JOIN temp.query AS qb"
+                where = "i.rxcui_a = qa.rxcui AND qb.rxcui = i.rxcui_b"
+            rows = conn.execute(
+                "SELECT i.rxcui_a, ca.name, i.rxcui_b, cb.name, i.source, i.severity, i.description "
+                f"FROM {joins} CROSS JOIN concept AS ca CROSS JOIN concept AS cb "
+                f"WHERE {where} AND ca.rxcui = i.rxcui_a AND cb.rxcui = i.rxcui_b"
+            ).fetchall()
+        return records_to_response(rows)
+
+    def _average_degree(self, conn):
+        if self._degree is None:
+            n_interactions, n_concepts = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM interaction), (SELECT COUNT(*) FROM concept)"
+            ).fetchone()
+            self._degree = 2 * n_interactions / max(1, n_concepts)
+        return self._degree
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM interaction").fetchone()[0]
+
+
+def records_to_response(records):
+    """Group interaction records into the NIH `fullInteractionTypeGroup` shape
+
+    Parameters
+    ----------
+    records :
+        Iterable of (from RxCUI, from name, to RxCUI, to name, source,
+        severity, description) tuples
+
+    Returns
+    -------
+        A dictionary in the NIH json shape, empty if there are no records
+    """
+    groups = {}  # source name: records
+    for f, f_name, t, t_name, source, severity, description in records:
+        groups.setdefault(source, []).append({
+            "minConcept": [{"rxcui": f, "name": f_name}, {"rxcui": t, "name": t_name}],
+            "interactionPair": [{"severity": severity, "description": description}],
+        })
+    if not groups:
+        return {}
+    return {
+        "fullInteractionTypeGroup": [
+            {"sourceName": s, "fullInteractionType": r} for s, r in groups.items()
+        ]
+    }
+
+
+def read_records(path):
+    """Read interaction records from a json or csv dump
+
+    Parameters
+    ----------
+    path : str
+        A json file in the NIH `fullInteractionTypeGroup` shape or the
+        `graph.json` nested dictionary shape, or a csv file with the columns
+        `rxcui_a, name_a, rxcui_b, name_b, source, severity, description`
+
+    Yields
+    ------
+    tuple
+        (from RxCUI, from name, to RxCUI, to name, source, severity,
+        description)
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield (
+                    row["rxcui_a"], row["name_a"], row["rxcui_b"], row["name_b"],
+                    row["source"], row["severity"], row["description"],
+                )
+        return
+    for source_name, record in _json_records(path):
+        a, b = record["minConcept"][:2]
+        pair = record["interactionPair"][0]
+        yield (
+            a["rxcui"], a["name"], b["rxcui"], b["name"],
+            source_name, pair["severity"], pair["description"],
+        )
+
+
+def response_records(response):
+    """Iterate over the records of a response in the NIH json shape
+
+    Yields
+    ------
+    tuple
+        (source name, `fullInteractionType` record)
+    """
+    # missing when no interaction is found
+    for group in response.get("fullInteractionTypeGroup", []):
+        for record in group["fullInteractionType"]:
+            yield group["sourceName"], record
+
+
+# the first key of a `graph.json` file: an RxCUI, or of the compact form
+_GRAPH_JSON = re.compile(rb'\s*\{\s*"(\d+|strings|drugs|interactions)"')
+
+
+def _json_records(path):
+    """Iterate over the records of a json dump
+
+    Dumps in the NIH shape are parsed incrementally (see
+    `jsonstream.interaction_records()`), `graph.json` files are loaded.
+    """
+    with open(path, "rb") as f:
+        if _GRAPH_JSON.match(f.read(256)):
+            f.seek(0)
+            yield from _nested_dict_records(json.load(f))
+            return
+        f.seek(0)
+        yield from interaction_records(file_chunks(f))
+
+
+def _nested_dict_records(graph_json):
+    """Convert the `graph.json` nested dictionary to interaction records
+
+    The compact form of `graph.to_nested_dict()` is read as well.
+    """
+    if "interactions" in graph_json:
+        strings, names = graph_json["strings"], graph_json["drugs"]
+        for f, t, source, severity, info in graph_json["interactions"]:
+            yield strings[source], {
+                "minConcept": [{"rxcui": f, "name": names[f]}, {"rxcui": t, "name": names[t]}],
+                "interactionPair": [{"severity": strings[severity], "description": strings[info]}],
+            }
+        return
+    # i - from rxcui, v[0] - from name, v[1] - {to rxcui: [to name, source, severity, info]}
+    for i, v in graph_json.items():
+        for j, k in v[1].items():
+            yield k[1], {
+                "minConcept": [{"rxcui": i, "name": v[0]}, {"rxcui": j, "name": k[0]}],
+                "interactionPair": [{"severity": k[2], "description": k[3]}],
+            }
+
+
+def default_source():
+    """Create the interaction source configured by `INTERACTION_SOURCE`
+
+    `INTERACTION_SOURCE` may be the path of a json fixture file or of a
+    SQLite interaction database (`.sqlite3`, see `InteractionDatabase`),
+    otherwise the NIH API is used.
+    """
+    setting = os.environ.get("INTERACTION_SOURCE", "nih")
+    if setting.endswith(".json"):
+        return FixtureInteractionSource(setting)
+    if setting.endswith((".sqlite3", ".db")):
+        return InteractionDatabase(setting)
+    return NIHInteractionSource()
+
+
+def chunk_cuis(cui_list, chunk_size, new=None):
+    """Split RxCUIs into overlapping chunks that cover every pair
+
+    The RxCUIs are cut into blocks of half the chunk size and every chunk
+    is the union of two blocks, so any two RxCUIs are queried together in
+    at least one chunk. `k` blocks give `k * (k - 1) / 2` chunks.
+
+    Parameters
+    ----------
+    cui_list :
+        A list of unique RxCUI numbers
+    chunk_size : int
+        Maximum number of RxCUIs per chunk, `None` for no limit
+    new : set, optional
+        Only the pairs involving at least one of these RxCUIs need to be
+        covered (used to extend a graph that has the other pairs already)
+
+    Returns
+    -------
+        A list of RxCUI lists
+    """
+    if chunk_size is None or len(cui_list) <= chunk_size:
+        return [list(cui_list)]
+    if new is not None:
+        # new RxCUIs first, so blocks without any new RxCUI can be paired up
+        # only with blocks that have one
+        cui_list = [c for c in cui_list if c in new] + [c for c in cui_list if c not in new]
+    half = max(1, chunk_size // 2)
+    blocks = [cui_list[i:i + half] for i in range(0, len(cui_list), half)]
+    has_new = [new is None or any(c in new for c in block) for block in blocks]
+    return [
+        blocks[i] + blocks[j]
+        for i in range(len(blocks))
+        for j in range(i + 1, len(blocks))
+        if has_new[i] or has_new[j]
+    ]
+
+
+def merge_responses(responses):
+    """Merge interaction responses, dropping interactions seen before
+
+    Parameters
+    ----------
+    responses :
+        Dictionaries in the `fullInteractionTypeGroup` json shape
+
+    Returns
+    -------
+        One dictionary in the same shape, without the
+        `fullInteractionTypeGroup` key if no interaction was found (as the
+        NIH API answers)
+    """
+    groups = {}  # source name: group
+    seen = set()
+    for response in responses:
+        for group in response.get("fullInteractionTypeGroup", []):
+            merged = groups.setdefault(
+                group["sourceName"],
+                {"sourceName": group["sourceName"], "fullInteractionType": []},
+            )
+            for record in group["fullInteractionType"]:
+                a, b = (c["rxcui"] for c in record["minConcept"][:2])
+                key = (group["sourceName"], min(a, b), max(a, b))
+                if key not in seen:
+                    seen.add(key)
+                    merged["fullInteractionType"].append(record)
+    if not groups:
+        return {}
+    return {"fullInteractionTypeGroup": list(groups.values())}
+
+
+def fetch_interactions(cui_list, source, new=None):
+    """Fetch all interactions among any number of RxCUIs
+
+    De-duplicates the RxCUIs, splits them into chunks the source accepts
+    (see `chunk_cuis()`), fetches the chunks in parallel and merges them.
+
+    Parameters
+    ----------
+    cui_list :
+        A list of RxCUI numbers
+    source : InteractionSource
+        Where the interactions come from
+    new : set, optional
+        Only the interactions involving these RxCUIs are needed, the
+        response may still hold some of the other interactions
+
+    Returns
+    -------
+        A dictionary in the NIH `fullInteractionTypeGroup` json shape
+    """
+    cui_list = list(dict.fromkeys(cui_list))
+    chunks = chunk_cuis(cui_list, source.max_cuis, new)
+    if len(chunks) == 1:
+        return merge_responses([source.fetch(chunks[0])])
+    return merge_responses(executor.map(source.fetch, chunks))
+
+
+def unique_records(records):
+    """Drop the interactions seen before, as `merge_responses()` does
+
+    Parameters
+    ----------
+    records :
+        Iterable of (source name, `fullInteractionType` record)
+
+    Yields
+    ------
+    tuple
+        (source name, `fullInteractionType` record)
+    """
+    seen = set()
+    for source_name, record in records:
+        a, b = (c["rxcui"] for c in record["minConcept"][:2])
+        key = (source_name, min(a, b), max(a, b))
+        if key not in seen:
+            seen.add(key)
+            yield source_name, record
+
+
+def fetch_interaction_records(cui_list, source, new=None, window=MAX_WORKERS):
+    """Streaming version of `fetch_interactions()`
+
+    The records are handed on as they are parsed (with
+    `source.fetch_records()`) instead of being merged into one response:
+    the chunks are fetched in order, at most `window` of them ahead of
+    the one being read, so only the records of those chunks are held
+    however many RxCUIs are queried.
+
+    Yields
+    ------
+    tuple
+        (source name, `fullInteractionType` record) of every interaction
+        among the RxCUIs, once
+    """
+    cui_list = list(dict.fromkeys(cui_list))
+    chunks = chunk_cuis(cui_list, source.max_cuis, new)
+    if len(chunks) == 1:
+        yield from unique_records(source.fetch_records(chunks[0]))
+        return
+
+    def fetch(chunk):
+        return list(source.fetch_records(chunk))
+
+    pending = deque()
+    chunks = iter(chunks)
+    try:
+        for chunk in itertools.islice(chunks, window):
+            pending.append(executor.submit(fetch, chunk))
+        yield from unique_records(itertools.chain.from_iterable(_in_order(pending, chunks, fetch)))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _in_order(pending, chunks, fetch):
+    """Results of the submitted fetches in order, submitting the next chunk for each"""
+    while pending:
+        records = pending.popleft().result()
+        chunk = next(chunks, None)
+        if chunk is not None:
+            pending.append(executor.submit(fetch, chunk))
+        yield records
+
+
+async def fetch_interaction_sets_async(cui_sets, source):
+    """Fetch the interactions within each of many sets of RxCUIs
+
+    Used to screen many drug lists at once: repeated sets and sets
+    contained in a larger one are dropped, and the chunks of the remaining
+    sets are fetched concurrently with `source.fetch_async()`, up to
+    `fetch.MAX_CONNECTIONS` at a time. (Querying the union of the sets
+    instead would also fetch every interaction between drugs of different
+    sets.)
+
+    Parameters
+    ----------
+    cui_sets :
+        Iterable of RxCUI lists
+    source : InteractionSource
+        Where the interactions come from
+
+    Returns
+    -------
+        One dictionary in the NIH `fullInteractionTypeGroup` json shape
+        with (at least) every interaction within each set
+    """
+    cui_sets = {frozenset(s) for s in cui_sets if len(s) > 1}
+    kept = []
+    containing = {}  # RxCUI: kept sets that contain it
+    # largest first, in a fixed order so the graph is the same every time
+    for cui_set in sorted(cui_sets, key=lambda s: (-len(s), sorted(s))):
+        # a larger set holding this one holds its least common RxCUI too
+        candidates = min((containing.get(c, ()) for c in cui_set), key=len)
+        if any(cui_set <= other for other in candidates):
+            continue
+        kept.append(cui_set)
+        for cui in cui_set:
+            containing.setdefault(cui, []).append(cui_set)
+    chunks = [
+        chunk for cui_set in kept for chunk in chunk_cuis(sorted(cui_set), source.max_cuis)
+    ]
+    return merge_responses(await gather_limited(source.fetch_async(chunk) for chunk in chunks))
+
+
+async def fetch_interactions_async(cui_list, source, new=None):
+    """Coroutine version of `fetch_interactions()`
+
+    The chunks are fetched concurrently with `source.fetch_async()`.
+    """
+    return merge_responses(await _fetch_chunks_async(cui_list, source, new))
+
+
+async def fetch_interaction_records_async(cui_list, source, new=None):
+    """Coroutine version of `fetch_interaction_records()`
+
+    The chunks are fetched concurrently with `source.fetch_async()`, the
+    records are returned in the order of `fetch_interaction_records()`
+    without merging the responses.
+
+    Returns
+    -------
+        An iterator of (source name, `fullInteractionType` record)
+    """
+    responses = await _fetch_chunks_async(cui_list, source, new)
+    return unique_records(itertools.chain.from_iterable(map(response_records, responses)))
+
+
+async def _fetch_chunks_async(cui_list, source, new):
+    cui_list = list(dict.fromkeys(cui_list))
+    chunks = chunk_cuis(cui_list, source.max_cuis, new)
+    return await asyncio.gather(*(source.fetch_async(chunk) for chunk in chunks))
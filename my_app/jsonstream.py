@@ -0,0 +1,167 @@
+"""Incremental parsing of interaction responses
+
+A response of the NIH interaction API (or a dump in the same shape) is
+read a chunk at a time, and every record of a `fullInteractionType`
+array is handed on as soon as it is complete, so only the record being
+parsed and one chunk of the body are in memory, however large the
+response is:
+
+    {"fullInteractionTypeGroup": [
+        {"sourceName": ..., "fullInteractionType": [record, record, ...]},
+        ...
+    ], ...}
+
+The structure around the records is walked by hand and each record (or
+skipped value, e.g. a disclaimer) is decoded by `json`'s C scanner.
+"""
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 64 * 2**10  # bytes read at a time
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Buffer of the unparsed part of a stream of json text"""
+    __slots__ = ("_chunks", "_decode", "buf", "pos", "eof")
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decode = codecs.getincrementaldecoder("utf-8")().decode
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        """Read the next chunk, False at the end of the stream"""
+        for chunk in self._chunks:
+            text = self._decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                # drop the parsed text
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+        self.eof = True
+        return False
+
+    def peek(self):
+        """The next character that is not whitespace, "" at the end"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decode the next json value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue  # the value is cut off at the end of the buffer
+                raise
+            # a number at the end of the buffer may go on in the next chunk
+            if end < len(self.buf) or self.eof or not self._more():
+                self.pos = end
+                return value
+            # `_more()` moved the buffer, decode again with the new chunk
+
+    def members(self):
+        """Iterate over the keys of an object, the caller reads each value"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("Expecting property name", self.buf, self.pos)
+            self.expect(":")
+            yield key
+            if self.peek() == "}":
+                self.pos += 1
+                return
+            self.expect(",")
+
+    def elements(self):
+        """Iterate over the elements of an array, the caller reads each one"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            self.expect(",")
+
+
+def _group_records(reader):
+    source_name, pending = None, []
+    for key in reader.members():
+        if key == "sourceName":
+            source_name = reader.value()
+            # records listed before the source name (not done by the API)
+            for record in pending:
+                yield source_name, record
+            pending = []
+        elif key == "fullInteractionType":
+            for _ in reader.elements():
+                record = reader.value()
+                if source_name is None:
+                    pending.append(record)
+                else:
+                    yield source_name, record
+        else:
+            reader.value()
+    for record in pending:
+        yield source_name, record
+
+
+def interaction_records(chunks):
+    """Parse an interaction response incrementally
+
+    Parameters
+    ----------
+    chunks : iterable
+        The json text of a response in the NIH `fullInteractionTypeGroup`
+        shape, in `bytes` (utf-8) or `str` pieces of any size, e.g.
+        `response.iter_content()` or `file_chunks()`
+
+    Yields
+    ------
+    tuple
+        (source name, `fullInteractionType` record), in the order of the
+        response
+
+    Raises
+    ------
+    json.JSONDecodeError
+        If the text is not valid json
+    """
+    reader = _Reader(chunks)
+    for key in reader.members():
+        if key == "fullInteractionTypeGroup":
+            for _ in reader.elements():
+                yield from _group_records(reader)
+        else:
+            reader.value()
+    if reader.peek():
+        raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
+
+
+def file_chunks(f, chunk_size=CHUNK_SIZE):
+    """Read an open (binary) file in chunks, for `interaction_records()`"""
+    return iter(lambda: f.read(chunk_size), f.read(0))
@@ -0,0 +1,137 @@
+"""Node positions for the interaction network figure
+
+Layouts are a pure function of the graph (and of the anchors passed in):
+seeded, and memoized by a canonical hash of the graph, so the same drug
+set always gives the same picture, whatever was drawn before and in
+whichever worker. Vertices with an anchor (the products of an expanded
+group) are placed around the position of their anchor in the layout of
+the graph with every anchored vertex merged into its anchor, while the
+other vertices keep their positions in that layout. Graphs above
+`SPRING_LIMIT` vertices use a spectral layout computed with sparse
+eigensolvers instead of the O(V^2)-per-iteration force layout.
+"""
+import hashlib
+import math
+from .cache import LRUCache
+from .lazy import lazy_import
+
+# imported on first use, see `lazy.py`
+nx = lazy_import("networkx")
+np = lazy_import("numpy")
+
+SEED = 507
+SPRING_LIMIT = 500  # max. number of vertices for the force layout
+WARM_ITERATIONS = 15  # force layout iterations of the anchored vertices (cold: 50)
+
+layout_cache = LRUCache(maxsize=128)  # graph hash: {RxCUI: (x, y)}
+
+
+def graph_hash(G, anchors=None):
+    """Canonical hash of a networkx graph's vertices and edges (and anchors)"""
+    digest = hashlib.sha1()
+    for node in sorted(G):
+        digest.update(f"{node};".encode())
+    digest.update(b"|")
+    for edge in sorted(tuple(sorted(e)) for e in G.edges()):
+        digest.update(f"{edge[0]},{edge[1]};".encode())
+    if anchors:
+        digest.update(b"|")
+        for node in sorted(anchors):
+            digest.update(f"{node}>{anchors[node]};".encode())
+    return digest.hexdigest()
+
+
+def canonical(G):
+    """Copy of a graph with its vertices and edges in sorted order"""
+    H = nx.Graph()
+    H.add_nodes_from(sorted(G))
+    H.add_edges_from(sorted(tuple(sorted(e)) for e in G.edges()))
+    return H
+
+
+def compute_layout(G, anchors=None):
+    """Compute (or look up) the positions of the vertices of a graph
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph to lay out
+    anchors : dict, optional
+        Vertices as keys and the vertex they are placed around as values
+        (see `anchored_layout()`)
+
+    Returns
+    -------
+    dict
+        Vertex as keys and `(x, y)` numpy arrays in [-1, 1] as values
+    """
+    anchors = {node: anchor for node, anchor in (anchors or {}).items() if node in G}
+    key = graph_hash(G, anchors)
+    pos = layout_cache.get(key)
+    if pos is not None:
+        return pos
+    G = canonical(G)  # the seeded layouts depend on the order of the vertices
+    if anchors:
+        pos = anchored_layout(G, anchors)
+    elif len(G) > SPRING_LIMIT:
+        pos = spectral_layout(G)
+    else:
+        pos = nx.spring_layout(G, seed=SEED)
+    layout_cache.set(key, pos)
+    return pos
+
+
+def anchored_layout(G, anchors):
+    """Place the anchored vertices around their anchors
+
+    The other vertices keep their positions in the layout of `G` with
+    every anchored vertex merged into its anchor (the collapsed view of
+    the same query, so usually a cache hit). The anchored vertices start
+    on a small circle around their anchor, in sorted order; for graphs up
+    to `SPRING_LIMIT` vertices they are then moved by a few seeded force
+    layout iterations with every other vertex fixed.
+    """
+    merged = nx.Graph()
+    merged.add_nodes_from(anchors.get(node, node) for node in G)
+    merged.add_edges_from(
+        (anchors.get(f, f), anchors.get(t, t)) for f, t in G.edges()
+        if anchors.get(f, f) != anchors.get(t, t)
+    )
+    base = compute_layout(merged)
+    pos = {node: base[node] for node in G if node not in anchors}
+    fixed = list(pos)
+    by_anchor = {}
+    for node in sorted(anchors):
+        by_anchor.setdefault(anchors[node], []).append(node)
+    for anchor, nodes in by_anchor.items():
+        radius = min(0.03 * math.sqrt(len(nodes)), 0.3)
+        for i, node in enumerate(nodes):
+            angle = 2 * math.pi * i / len(nodes)
+            pos[node] = base[anchor] + radius * np.array([math.cos(angle), math.sin(angle)])
+    if len(G) <= SPRING_LIMIT and fixed:
+        pos = nx.spring_layout(G, pos=pos, fixed=fixed, iterations=WARM_ITERATIONS, seed=SEED)
+    return {node: np.asarray(xy) for node, xy in pos.items()}
+
+
+def spectral_layout(G):
+    """Spectral layout of every connected component, packed into a grid
+
+    The spectral layout of a component uses the eigenvectors of its
+    Laplacian (sparse `eigsh` for large components). Components are
+    placed largest first on a square grid, each scaled by its size.
+    """
+    components = sorted(nx.connected_components(G), key=lambda c: (-len(c), min(c)))
+    columns = math.ceil(math.sqrt(len(components)))
+    largest = len(components[0])
+    pos = {}
+    for k, component in enumerate(components):
+        nodes = sorted(component)
+        if len(nodes) < 3:
+            local = {node: np.array([i - (len(nodes) - 1) / 2, 0.0]) for i, node in enumerate(nodes)}
+        else:
+            local = nx.spectral_layout(G.subgraph(nodes))
+        scale = 0.4 * math.sqrt(len(nodes) / largest)
+        offset = np.array([k % columns, -(k // columns)], dtype=float)
+        for node, xy in local.items():
+            pos[node] = offset + scale * np.asarray(xy)
+    return nx.rescale_layout_dict(pos)
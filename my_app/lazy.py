@@ -0,0 +1,41 @@
+"""Deferred imports of heavy dependencies
+
+`views.py` is imported on every worker boot and every `manage.py`
+command (through the URL configuration). Libraries that are only needed
+to answer some requests (numpy, networkx, plotly) are bound to a
+`LazyModule` instead, and imported on first attribute access.
+"""
+import importlib
+
+
+class LazyModule:
+    """Placeholder of a module that is imported on first attribute access
+
+    Parameters
+    ----------
+    name : str
+        Absolute module name, e.g. `"plotly.express"`
+    """
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module holds the module's import lock, so concurrent
+            # first uses from several threads import it only once
+            module = importlib.import_module(self._name)
+            self._module = module
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = "imported" if self._module is not None else "not imported"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Bind a module that is imported on first use, see `LazyModule`"""
+    return LazyModule(name)
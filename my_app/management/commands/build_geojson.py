@@ -0,0 +1,26 @@
+"""Rebuild the simplified country shapes used by the choropleth"""
+import os
+from django.core.management.base import BaseCommand
+from my_app import geo
+
+
+class Command(BaseCommand):
+    help = "Simplify the world shapefile into the ISO-keyed GeoJSON served to the browser"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shapefile", default=geo.SHAPEFILE_PATH, help="default: %(default)s")
+        parser.add_argument("--out", default=geo.GEOJSON_PATH, help="default: %(default)s")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=geo.SIMPLIFY_TOLERANCE,
+            help="simplification tolerance in degrees (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        geojson = geo.build_geojson(options["shapefile"], options["tolerance"])
+        geo.write_geojson(geojson, options["out"])
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['out']}: {len(geojson['features'])} countries, "
+            f"{os.path.getsize(options['out']) / 1024:.0f} KB"
+        ))
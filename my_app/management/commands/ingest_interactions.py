@@ -0,0 +1,30 @@
+"""Bulk-load interaction dumps into the local interaction database"""
+import time
+from django.core.management.base import BaseCommand
+from my_app.interactions import InteractionDatabase, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Load interaction records (json in the NIH fullInteractionTypeGroup or "
+        "graph.json shape, or csv) into the SQLite interaction database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="json or csv interaction dumps")
+        parser.add_argument(
+            "--db",
+            default="./my_app/interactions.sqlite3",
+            help="path of the interaction database (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        db = InteractionDatabase(options["db"])
+        for path in options["files"]:
+            start = time.perf_counter()
+            n = db.ingest(read_records(path))
+            self.stdout.write(f"{path}: {n} records in {time.perf_counter() - start:.1f} s")
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['db']} holds {len(db)} interactions, use it with "
+            f"INTERACTION_SOURCE={options['db']}"
+        ))
@@ -0,0 +1,61 @@
+"""Screen a file of drug regimens for interactions"""
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from my_app import screening
+
+
+class Command(BaseCommand):
+    help = (
+        "Screen drug regimens (one per line: comma-separated drug names, a json "
+        "list of names or a json object with id and drugs) for interactions, "
+        "and write one NDJSON or csv result per regimen"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="regimen file, - for stdin")
+        parser.add_argument(
+            "-o", "--output", default="-",
+            help="result file, - for stdout (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--format", choices=("ndjson", "csv"),
+            help="output format (default: csv for .csv output files, ndjson otherwise)",
+        )
+        parser.add_argument(
+            "--top", type=int, default=screening.TOP_K,
+            help="most severe interactions reported per regimen (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=screening.BATCH_SIZE,
+            help="regimens resolved and fetched together (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        # the views set up the caches and the interaction source
+        from my_app.views import screenRegimens
+
+        if options["batch_size"] < 1 or options["top"] < 0:
+            raise CommandError("--batch-size must be positive and --top non-negative")
+        output = options["format"] or ("csv" if options["output"].endswith(".csv") else "ndjson")
+        write_lines = screening.csv_lines if output == "csv" else screening.ndjson_lines
+
+        stats = screening.ScreeningStats()
+
+        def progress(stats):
+            self.stderr.write(str(stats))
+
+        source = sys.stdin if options["input"] == "-" else open(options["input"], "r")
+        target = sys.stdout if options["output"] == "-" else open(options["output"], "w", newline="")
+        try:
+            results = screenRegimens(
+                screening.parse_regimens(source), top_k=options["top"],
+                batch_size=options["batch_size"], stats=stats, progress=progress,
+            )
+            for line in write_lines(results):
+                target.write(line)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if target is not sys.stdout:
+                target.close()
+        self.stderr.write(self.style.SUCCESS(f"done: {stats}"))
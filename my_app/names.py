@@ -0,0 +1,208 @@
+"""In-memory index of drug names for autocomplete and typo correction
+
+`NameIndex` holds the drug names that resolve without an upstream
+request (the names cached in `RxNormCache`) in
+- a sorted list, for prefix completion with a binary search
+- a trigram index, for fuzzy matching: candidates are the names that
+  share enough trigrams with the query, ranked by edit distance
+Names are added as they are cached, and names cached by other worker
+processes are picked up every `REFRESH_SECONDS`.
+"""
+import bisect
+import threading
+import time
+from array import array
+from .lazy import lazy_import
+
+np = lazy_import("numpy")
+
+REFRESH_SECONDS = 60.0
+LIMIT = 10  # suggestions returned by default
+
+
+def max_distance(query):
+    """Edit distance allowed for a fuzzy match of a query of this length"""
+    if len(query) < 3:
+        return 0
+    return 1 if len(query) < 6 else 2
+
+
+def trigrams(name):
+    """Trigrams of a name padded with two leading and one trailing space"""
+    padded = f"  {name} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a, b):
+    """Levenshtein distance of two strings
+
+    Bit-parallel (Myers / Hyyrö): one column of the dynamic programming
+    table is a bit vector of `a`, so each character of `b` costs a few
+    integer operations.
+    """
+    if not a:
+        return len(b)
+    match = {}  # character: bits of its positions in `a`
+    for i, c in enumerate(a):
+        match[c] = match.get(c, 0) | 1 << i
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    plus, minus, score = full, 0, len(a)
+    for c in b:
+        eq = match.get(c, 0)
+        xv = eq | minus
+        xh = (((eq & plus) + plus) ^ plus) | eq
+        hp = minus | (~(xh | plus) & full)
+        hm = plus & xh
+        if hp & last:
+            score += 1
+        elif hm & last:
+            score -= 1
+        hp = (hp << 1 | 1) & full
+        hm = (hm << 1) & full
+        plus = hm | (~(xv | hp) & full)
+        minus = hp & xv
+    return score
+
+
+class NameIndex:
+    """Prefix and fuzzy search over drug names
+
+    Parameters
+    ----------
+    loader : callable, optional
+        `loader(since)` returns the names added since a `time.time()`
+        timestamp (all names for `None`), e.g. `RxNormCache.names`. The
+        index loads them on first use and then every `refresh` seconds.
+    refresh : float
+        Seconds between two calls to `loader`
+    """
+    def __init__(self, loader=None, refresh=REFRESH_SECONDS):
+        self.loader = loader
+        self.refresh = refresh
+        self._sorted = []  # names in lexicographic order
+        self._names = []  # name id -> name
+        self._known = set()
+        self._postings = {}  # trigram: array of name ids
+        self._loaded = None  # time of the last `loader` call
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, names):
+        """Add drug names (normalized to lowercase), ignoring known names"""
+        with self._lock:
+            new = list(dict.fromkeys(
+                n for n in (name.strip().lower() for name in names) if n and n not in self._known
+            ))
+            if not new:
+                return
+            if len(new) > len(self._sorted) // 16:
+                self._sorted = sorted(self._sorted + new)
+            else:
+                for name in new:
+                    bisect.insort(self._sorted, name)
+            for name in new:
+                self._known.add(name)
+                name_id = len(self._names)
+                self._names.append(name)
+                for gram in set(trigrams(name)):
+                    postings = self._postings.get(gram)
+                    if postings is None:
+                        postings = self._postings[gram] = array("I")
+                    postings.append(name_id)
+
+    def _update(self):
+        """Load the names added since the last load, if it is due"""
+        if self.loader is None:
+            return
+        now = time.time()
+        with self._lock:
+            since = self._loaded
+            if since is not None and now - since < self.refresh:
+                return
+            self._loaded = now
+        # entries written during the previous load may have been missed
+        self.add(self.loader(None if since is None else since - 1.0))
+
+    def complete(self, prefix, limit=LIMIT):
+        """Names starting with `prefix`, in lexicographic order"""
+        self._update()
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        with self._lock:
+            names = self._sorted
+            i = bisect.bisect_left(names, prefix)
+            found = []
+            while i < len(names) and len(found) < limit and names[i].startswith(prefix):
+                found.append(names[i])
+                i += 1
+            return found
+
+    def fuzzy(self, query, limit=LIMIT, distance=None):
+        """Names closest to `query` by edit distance
+
+        Names at edit distance 1 are searched first, then at distance 2
+        and so on, up to `distance`.
+
+        Parameters
+        ----------
+        query : str
+            Possibly misspelled drug name
+        limit : int
+            Maximum number of names returned
+        distance : int, optional
+            Largest edit distance of a match, by default `max_distance()`
+            of the query
+
+        Returns
+        -------
+        list
+            `(name, edit distance)` tuples of the smallest distance with
+            a match, by name
+        """
+        self._update()
+        query = query.strip().lower()
+        distance = max_distance(query) if distance is None else distance
+        grams = set(trigrams(query))
+        if not query or distance < 1:
+            return []
+        with self._lock:
+            lists = [self._postings[g] for g in grams if g in self._postings]
+            if not lists:
+                return []
+            # number of trigrams every name shares with the query
+            counts = np.bincount(
+                np.concatenate([np.frombuffer(ids, dtype=np.uint32) for ids in lists])
+            )
+            names = self._names
+        for d in range(1, distance + 1):
+            # an edit changes at most 3 trigrams, a match has all others
+            shared = len(grams) - 3 * d
+            candidates = np.flatnonzero(counts >= max(shared, 1))
+            matches = sorted(
+                name for name in (names[i] for i in candidates)
+                if abs(len(name) - len(query)) <= d and edit_distance(query, name) == d
+            )
+            if matches:
+                return [(name, d) for name in matches[:limit]]
+        return []
+
+    def suggest(self, query, limit=LIMIT):
+        """Completions of `query`, then fuzzy matches, without repeats
+
+        Returns
+        -------
+        list
+            Dictionaries with the `name`, the kind of `match` ("prefix" or
+            "fuzzy") and the edit `distance` of fuzzy matches
+        """
+        found = [{"name": name, "match": "prefix"} for name in self.complete(query, limit)]
+        if len(found) < limit:
+            seen = {s["name"] for s in found}
+            for name, d in self.fuzzy(query, limit):
+                if name not in seen and len(found) < limit:
+                    found.append({"name": name, "match": "fuzzy", "distance": d})
+        return found
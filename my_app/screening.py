@@ -0,0 +1,297 @@
+"""Batch screening of many drug regimens
+
+A regimen is a list of drug names, as typed in the query box. Regimens
+are read from a file or stream (`parse_regimens()`) and screened in
+batches (`screen_regimens()`): the distinct names of a batch are
+resolved once, the interactions of all of its regimens are fetched
+together into one shared graph, and each regimen is scored on its
+subgraph with `risk_report()` (with one vertex per ingredient group, as
+`/api/risk` scores a query, when a `group` function is given). Results
+are written as NDJSON or CSV lines (`ndjson_lines()`, `csv_lines()`) as
+soon as their batch is done.
+
+Used by the `screen_regimens` management command and the `/api/screen`
+endpoint.
+"""
+import csv
+import io
+import json
+import logging
+import time
+from .fetch import upstream_errors
+from .graph import Graph, risk_report
+from .ingredients import collapse_graph
+from .instrument import metrics, span
+
+BATCH_SIZE = 1000  # regimens resolved and fetched together
+TOP_K = 3  # most severe interactions reported per regimen
+# columns of the csv output
+CSV_FIELDS = (
+    "id", "drugs", "unresolved", "rxcuis", "interactions", "score",
+    "high", "moderate", "low", "top_interactions", "error",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_regimens(lines):
+    """Read regimens, one per line
+
+    A line is either a json object `{"id": ..., "drugs": [...]}` (`drugs`
+    may also be a comma-separated string), a json list of drug names, or
+    plain comma-separated drug names. Blank lines and lines starting with
+    `#` are skipped.
+
+    Parameters
+    ----------
+    lines :
+        Iterable of lines (str or utf-8 bytes), e.g. an open file
+
+    Yields
+    ------
+    tuple
+        (id, drug names, error message or `None`); the id is the line
+        number unless given
+    """
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        regimen_id, drugs = number, line
+        if line[0] in "[{":
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError:
+                yield regimen_id, [], "Invalid json"
+                continue
+            if isinstance(value, dict):
+                regimen_id = value.get("id", number)
+                value = value.get("drugs", "")
+            drugs = value
+        if isinstance(drugs, str):
+            drugs = drugs.split(",")
+        if not isinstance(drugs, list) or not all(isinstance(d, str) for d in drugs):
+            yield regimen_id, [], "Drugs must be a list of names"
+            continue
+        yield regimen_id, drugs, None
+
+
+class ScreeningStats:
+    """Progress and per-stage time of a screening run"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.regimens = 0
+        self.errors = 0  # regimens that could not be screened
+        self.flagged = 0  # regimens with at least one interaction
+        self.names = 0  # drug names resolved (once per batch)
+        self.unresolved = 0  # ... that RxNorm does not know
+        self.interactions = 0  # interactions fetched
+        self.seconds = {"resolve": 0.0, "fetch": 0.0, "score": 0.0}
+
+    def rate(self):
+        """Regimens screened per second"""
+        elapsed = time.perf_counter() - self.start
+        return self.regimens / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """The counters and stage times as a dictionary"""
+        return {
+            "regimens": self.regimens,
+            "errors": self.errors,
+            "flagged": self.flagged,
+            "names": self.names,
+            "unresolved": self.unresolved,
+            "interactions": self.interactions,
+            "seconds": round(time.perf_counter() - self.start, 3),
+            "regimens_per_second": round(self.rate(), 1),
+            "stage_seconds": {k: round(v, 3) for k, v in self.seconds.items()},
+        }
+
+    def __str__(self):
+        stages = ", ".join(f"{k} {v:.1f} s" for k, v in self.seconds.items())
+        return (
+            f"{self.regimens} regimens ({self.rate():.0f}/s, {self.flagged} with interactions, "
+            f"{self.errors} errors), {self.names} drug names ({self.unresolved} unknown), "
+            f"{self.interactions} interactions; {stages}"
+        )
+
+
+def screen_regimens(regimens, resolve, build, top_k=TOP_K, batch_size=BATCH_SIZE,
+                    stats=None, progress=None, group=None, product_level=False):
+    """Screen regimens for interactions, batch by batch
+
+    Parameters
+    ----------
+    regimens :
+        Iterable of `(id, drug names, error)` tuples (see `parse_regimens()`)
+    resolve : callable
+        `resolve(names)` returns `{name: {RxCUI: drug name} or None}` for
+        a list of lowercase drug names
+    build : callable
+        `build(cui_sets)` returns a graph holding every interaction within
+        each of the RxCUI lists
+    top_k : int
+        Number of most severe interactions reported per regimen
+    batch_size : int
+        Number of regimens resolved and fetched together
+    stats : ScreeningStats, optional
+        Updated as the regimens are screened
+    progress : callable, optional
+        Called with `stats` after every batch
+    group : callable, optional
+        `group(cui_names)` returns the kept products and the ingredient
+        groups (see `ingredients.collapse()`) of each of a list of
+        `{RxCUI: drug name}`; each regimen is then scored on the graph of
+        one product per ingredient group
+    product_level : bool
+        With `group`, fetch the interactions of every product and merge
+        the products of each group (see `ingredients.collapse_graph()`),
+        for sources that store interactions by product
+
+    Yields
+    ------
+    dict
+        One result per regimen, in input order: `id`, `drugs`,
+        `unresolved` drug names, number of `rxcuis` and `interactions`,
+        risk `score`, interactions `by_severity`, `top_interactions` (see
+        `risk_report()`) and `error` (`None` if screened; the regimens of
+        a batch whose interactions could not be fetched get an error,
+        the other batches are still screened)
+    """
+    stats = ScreeningStats() if stats is None else stats
+    batch = []
+    for regimen in regimens:
+        batch.append(regimen)
+        if len(batch) == batch_size:
+            yield from _screen_batch(batch, resolve, build, top_k, stats, group, product_level)
+            batch = []
+            if progress is not None:
+                progress(stats)
+    if batch:
+        yield from _screen_batch(batch, resolve, build, top_k, stats, group, product_level)
+        if progress is not None:
+            progress(stats)
+    logger.info("screened %s", stats)
+
+
+def _screen_batch(batch, resolve, build, top_k, stats, group, product_level):
+    start = time.perf_counter()
+    # same normalization as the query box: lowercase, no repeated names
+    regimens = []
+    for regimen_id, drugs, error in batch:
+        drugs = list(dict.fromkeys(d.strip().lower() for d in drugs if d.strip()))
+        if error is None and len(drugs) < 2:
+            error = "Please enter at least two drug names"
+        regimens.append((regimen_id, drugs, error))
+    batch = regimens
+    names = list(dict.fromkeys(d for _, drugs, error in batch if error is None for d in drugs))
+    resolved = resolve(names) if names else {}
+    stats.names += len(names)
+    stats.unresolved += sum(1 for name in names if not resolved.get(name))
+
+    cui_names = []
+    for _, drugs, error in batch:
+        cui_name = {}
+        for d in drugs if error is None else ():
+            cui_name.update(resolved.get(d) or {})
+        cui_names.append(cui_name)
+    # the RxCUIs queried for each regimen, and its ingredient groups
+    groupings = [None] * len(batch) if group is None else [groups for _, groups in group(cui_names)]
+    cui_sets = [
+        list(cui_name) if groups is None or product_level else list(groups)
+        for cui_name, groups in zip(cui_names, groupings)
+    ]
+    resolved_at = time.perf_counter()
+    stats.seconds["resolve"] += resolved_at - start
+
+    try:
+        graph = build(cui_sets)
+    except upstream_errors() as e:
+        # the batch is reported as failed, the next batches are screened
+        logger.warning("interaction source failed for a batch: %r", e)
+        graph = Graph()
+        batch = [
+            (regimen_id, drugs, error or "Interaction data is unavailable")
+            for regimen_id, drugs, error in batch
+        ]
+    built_at = time.perf_counter()
+    stats.seconds["fetch"] += built_at - resolved_at
+    stats.interactions += graph.num_edges
+
+    def regimen_graph(cuis, groups):
+        subgraph = graph.subgraph(cuis)
+        if groups is not None and product_level:
+            subgraph, _, _ = collapse_graph(subgraph, groups)
+        return subgraph
+
+    with span("screen"):
+        results = [
+            _screen_one(
+                regimen_id, drugs, error, len(cui_name), resolved,
+                regimen_graph(cuis, groups) if error is None else None, top_k, stats,
+            )
+            for (regimen_id, drugs, error), cui_name, cuis, groups
+            in zip(batch, cui_names, cui_sets, groupings)
+        ]
+    stats.seconds["score"] += time.perf_counter() - built_at
+    stats.regimens += len(batch)
+    metrics.count("screened_regimens_total", len(batch))
+    return results
+
+
+def _screen_one(regimen_id, drugs, error, n_cuis, resolved, graph, top_k, stats):
+    result = {
+        "id": regimen_id,
+        "drugs": drugs,
+        "unresolved": [d for d in drugs if not resolved.get(d)] if error is None else [],
+        "rxcuis": n_cuis,
+        "interactions": 0,
+        "score": 0.0,
+        "by_severity": {},
+        "top_interactions": [],
+        "error": error,
+    }
+    if error is not None:
+        stats.errors += 1
+        return result
+    report = risk_report(graph, top_k)
+    result["interactions"] = report["regimen"]["interactions"]
+    result["score"] = report["regimen"]["score"]
+    result["by_severity"] = report["regimen"]["by_severity"]
+    result["top_interactions"] = report["top_interactions"]
+    if result["interactions"]:
+        stats.flagged += 1
+    return result
+
+
+def ndjson_lines(results):
+    """Serialize results as newline-delimited json, one line per result"""
+    for result in results:
+        yield json.dumps(result) + "\n"
+
+
+def csv_lines(results):
+    """Serialize results as csv lines (columns `CSV_FIELDS`), header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        return buffer.getvalue()
+
+    yield line(CSV_FIELDS)
+    for r in results:
+        top = " | ".join(
+            f"{i['drugs'][0]['name']} + {i['drugs'][1]['name']} ({i['severity']})"
+            for i in r["top_interactions"]
+        )
+        yield line([
+            r["id"], "; ".join(r["drugs"]), "; ".join(r["unresolved"]), r["rxcuis"],
+            r["interactions"], r["score"], r["by_severity"].get("high", 0),
+            r["by_severity"].get("moderate", 0), r["by_severity"].get("low", 0),
+            top, r["error"] or "",
+        ])
@@ -0,0 +1,303 @@
+"""Tests of the fetch layer, the graph storage and traversal, and the layout
+
+The fetch tests run against the local stub server of the benchmarks
+(`benchmarks/stub_server.py`), no request leaves the machine.
+
+Usage: python manage.py test
+"""
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import networkx as nx
+from django.test import SimpleTestCase
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import HashInteractionSource, random_graph
+from .fetch import SingleFlight, get_json, get_json_async, run_async
+from .graph import (
+    SEVERITY_COST, Graph, average_shortest_paths, bfs, from_nested_dict, quotient, to_nested_dict
+)
+from .cache import GraphCache
+from .ingredients import view
+from .interactions import FixtureInteractionSource, NIHInteractionSource, fetch_interactions
+from . import layout, views
+
+
+def pairs(response):
+    """Undirected pairs of the interactions of a response"""
+    return {
+        frozenset(c["rxcui"] for c in record["minConcept"][:2])
+        for group in response.get("fullInteractionTypeGroup", [])
+        for record in group["fullInteractionType"]
+    }
+
+
+def drug_graph():
+    """A random interaction graph with a drug without interactions"""
+    graph = random_graph(300, avg_degree=6)
+    graph.add_vertex("isolated", "drug without interactions")
+    return graph
+
+
+class GraphStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = drug_graph()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "graph.snapshot")
+
+    def assertSameGraph(self, graph, expected):
+        self.assertEqual(list(graph.ids), list(expected.ids))
+        self.assertEqual(list(graph.names), list(expected.names))
+        self.assertEqual(list(graph.edges()), list(expected.edges()))
+        self.assertEqual(to_nested_dict(graph), to_nested_dict(expected))
+
+    def test_save_load(self):
+        self.graph.save(self.path)
+        self.assertSameGraph(Graph.load(self.path), self.graph)
+
+    def test_edges_added_after_load(self):
+        self.graph.save(self.path)
+        loaded = Graph.load(self.path)
+        expected = self.graph.copy()
+        for graph in (loaded, expected):
+            graph.add_edge("0", "drug 0", "new", "new drug", "ONCHigh", "high", "a new interaction")
+            f, t, *_ = next(graph.edges())  # a repeated pair replaces the interaction
+            graph.add_edge(f, graph.vert_list[f].name, t, graph.vert_list[t].name, "ONCHigh", "low", "replaced")
+        self.assertSameGraph(loaded, expected)
+        # the snapshot file is not changed
+        self.assertSameGraph(Graph.load(self.path), self.graph)
+
+    def test_compact_json(self):
+        graph_json = json.loads(json.dumps(to_nested_dict(self.graph, compact=True)))
+        self.assertSameGraph(from_nested_dict(graph_json), self.graph)
+
+    def test_nested_json(self):
+        graph_json = json.loads(json.dumps(to_nested_dict(self.graph)))
+        self.assertEqual(to_nested_dict(from_nested_dict(graph_json)), to_nested_dict(self.graph))
+
+    def test_average_shortest_paths_of_loaded_graph(self):
+        self.graph.save(self.path)
+        loaded = Graph.load(self.path)
+        self.assertEqual(average_shortest_paths(loaded), average_shortest_paths(self.graph))
+
+
+class TraversalTests(SimpleTestCase):
+    """Distances and paths, checked against networkx"""
+    def setUp(self):
+        self.graph = random_graph(200, avg_degree=3)
+        # a second component and a drug without interactions
+        self.graph.add_edge("x1", "x1", "x2", "x2", "DrugBank", "high", "x1 and x2")
+        self.graph.add_edge("x2", "x2", "x3", "x3", "DrugBank", "N/A", "x2 and x3")
+        self.graph.add_vertex("isolated", "isolated")
+        self.G = views.nxGraph(self.graph)
+        self.G.add_nodes_from(self.graph.ids)
+        rng = random.Random(507)
+        self.pairs = [tuple(rng.sample(list(self.graph.ids), 2)) for _ in range(100)]
+        self.pairs += [("0", "x1"), ("x1", "x3"), ("0", "isolated"), ("5", "5")]
+
+    def test_distances(self):
+        for source in ("0", "x1", "isolated"):
+            self.assertEqual(
+                self.graph.distances(source), nx.single_source_shortest_path_length(self.G, source)
+            )
+
+    def test_shortest_path(self):
+        for a, b in self.pairs:
+            path = self.graph.shortest_path(a, b)
+            if not nx.has_path(self.G, a, b):
+                self.assertIsNone(path)
+                continue
+            expected = nx.shortest_path_length(self.G, a, b)
+            self.assertEqual((path[0], path[-1], len(path) - 1), (a, b, expected))
+            self.assertTrue(all(self.G.has_edge(u, v) for u, v in zip(path, path[1:])))
+
+    def test_unreachable_is_inf(self):
+        self.assertEqual(bfs(self.graph, "0", "x1"), math.inf)
+        self.assertEqual(bfs(self.graph, "isolated", "0"), math.inf)
+        self.assertEqual(bfs(self.graph, "x1", "x1"), 0)
+        self.assertEqual(bfs(self.graph, "x1", "x3"), 2)
+
+    def test_severity_path(self):
+        other = max(SEVERITY_COST.values()) + 1
+        for u, v, data in self.G.edges(data=True):
+            data["cost"] = SEVERITY_COST.get(data["severity"], other)
+        for a, b in self.pairs:
+            cost, path = self.graph.severity_path(a, b)
+            if not nx.has_path(self.G, a, b):
+                self.assertEqual((cost, path), (math.inf, None))
+                continue
+            self.assertEqual(cost, nx.dijkstra_path_length(self.G, a, b, weight="cost"))
+            self.assertEqual(
+                sum(self.G.edges[u, v]["cost"] for u, v in zip(path, path[1:])), cost
+            )
+
+
+class QuotientTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = Graph()
+        for f, t, severity, info in [
+            ("a1", "b1", "high", "a increases b"),
+            ("a2", "b1", "N/A", "a decreases b"),
+            ("a2", "b2", "high", "a increases b"),
+            ("a1", "a2", "high", "within a group"),
+        ]:
+            self.graph.add_edge(f, f, t, t, "DrugBank", severity, info)
+        self.key = lambda cui: cui[0]
+
+    def test_variants(self):
+        merged, multiplicity, variants = quotient(self.graph, self.key)
+        self.assertEqual(
+            [(f, t, s, i) for f, t, _, s, i in merged.edges()], [("a", "b", "high", "a increases b")]
+        )
+        self.assertEqual(list(multiplicity), [3])
+        self.assertEqual(variants, {0: [("high", "a increases b", 2), ("N/A", "a decreases b", 1)]})
+
+    def test_same_interaction_is_not_a_variant(self):
+        self.graph.add_edge("a2", "a2", "b1", "b1", "DrugBank", "high", "a increases b")
+        _, multiplicity, variants = quotient(self.graph, self.key)
+        self.assertEqual(list(multiplicity), [3])
+        self.assertEqual(variants, {})
+
+
+class ProductLevelTests(SimpleTestCase):
+    """Queries of a source that stores interactions by product"""
+    def setUp(self):
+        saved = views.interaction_source, views.graph_cache
+        views.interaction_source = FixtureInteractionSource(
+            os.path.join(os.path.dirname(__file__), "graph.json")
+        )
+        views.graph_cache = GraphCache()
+        self.addCleanup(lambda: setattr(views, "interaction_source", saved[0]))
+        self.addCleanup(lambda: setattr(views, "graph_cache", saved[1]))
+
+    def test_product_pairs(self):
+        graph, groups, products = views.queryGraph("diflucan, tylenol")
+        shown, _, multiplicity, _ = view(graph, groups, (), products)
+        self.assertEqual(shown.num_edges, 1)
+        self.assertEqual(list(multiplicity), [4])
+        # every group expanded: the interacting product pairs themselves
+        shown, _, multiplicity, _ = view(graph, groups, list(groups), products)
+        self.assertEqual(shown.num_edges, 4)
+        self.assertEqual(list(multiplicity), [1, 1, 1, 1])
+
+    def test_risk_and_screen_agree(self):
+        risk = self.client.get("/api/risk", {"drugs": "diflucan, tylenol"}).json()["regimen"]
+        response = self.client.post("/api/screen", "diflucan, tylenol\n", content_type="text/plain")
+        screened = json.loads(b"".join(response.streaming_content))
+        self.assertEqual((screened["score"], screened["interactions"]), (1.0, 1))
+        self.assertEqual((screened["score"], screened["interactions"]), (risk["score"], risk["interactions"]))
+
+
+class LayoutTests(SimpleTestCase):
+    """The layout of a graph does not depend on what was drawn before"""
+    def setUp(self):
+        self.G = views.nxGraph(drug_graph())
+        self.addCleanup(layout.layout_cache.clear)
+
+    def positions(self, G, anchors=None):
+        layout.layout_cache.clear()
+        return {node: tuple(xy) for node, xy in layout.compute_layout(G, anchors).items()}
+
+    def test_same_layout_after_other_layouts(self):
+        expected = self.positions(self.G)
+        layout.compute_layout(self.G.subgraph(list(self.G)[:100]))
+        layout.compute_layout(views.nxGraph(random_graph(50, avg_degree=3)))
+        layout.layout_cache.clear()  # evicted, or another worker
+        self.assertEqual(self.positions(self.G), expected)
+
+    def test_anchored_layout(self):
+        base = self.positions(self.G)
+        grown = self.G.copy()
+        neighbors = sorted(grown["0"])
+        grown.remove_node("0")
+        anchors = {"0.a": "0", "0.b": "0"}
+        grown.add_edges_from(("0.a" if i % 2 else "0.b", n) for i, n in enumerate(neighbors))
+        pos = self.positions(grown, anchors)
+        self.assertEqual(self.positions(grown, anchors), pos)
+        # the other vertices keep their positions in the collapsed layout
+        for node in grown:
+            if node not in anchors:
+                self.assertEqual(pos[node], base[node])
+
+
+class FetchTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = StubServer(latency=0.05, interactions=HashInteractionSource())
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+
+    def test_get_json_retries(self):
+        self.stub.fail("/REST/drugs.json", 2)
+        response = get_json(f"{self.stub.url}/REST/drugs.json?name=aspirin")
+        self.assertEqual(response["drugGroup"]["name"], "aspirin")
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_get_async_retries(self):
+        self.stub.fail("/REST/drugs.json", 2)
+        response = run_async(get_json_async(f"{self.stub.url}/REST/drugs.json?name=aspirin"))
+        self.assertEqual(response["drugGroup"]["name"], "aspirin")
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_chunks_cover_every_pair(self):
+        cuis = [str(1000 + i) for i in range(120)]
+        source = NIHInteractionSource(f"{self.stub.url}/REST")
+        response = fetch_interactions(cuis + cuis[:10], source)  # repeats are dropped
+        self.assertGreater(len(self.stub.requests), 1)
+        for path in self.stub.requests:
+            self.assertLessEqual(len(path.split("rxcuis=")[1].split("+")), source.max_cuis)
+        # the stub answers any number of RxCUIs when asked directly
+        self.assertEqual(pairs(response), pairs(HashInteractionSource().fetch(cuis)))
+
+    def test_single_flight(self):
+        self.stub.httpd.latency = 0.5  # every submit arrives while the request runs
+        flight = SingleFlight()
+        url = f"{self.stub.url}/REST/drugs.json?name=aspirin"
+        futures = []
+        threads = [
+            threading.Thread(target=lambda: futures.append(flight.submit(url, get_json, url)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results = [f.result() for f in futures]
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertTrue(all(r == results[0] for r in results))
+
+
+class UpstreamErrorTests(SimpleTestCase):
+    """An unreachable interaction source is reported, not raised"""
+    def setUp(self):
+        # names in the seed of `rxnorm_cache`, resolved without a request
+        self.drugs = "tylenol, warfarin"
+        saved = views.interaction_source, views.graph_cache
+        views.interaction_source = NIHInteractionSource("http://127.0.0.1:9/REST")
+        views.graph_cache = GraphCache()
+        self.addCleanup(lambda: setattr(views, "interaction_source", saved[0]))
+        self.addCleanup(lambda: setattr(views, "graph_cache", saved[1]))
+
+    def test_risk_api(self):
+        response = self.client.get("/api/risk", {"drugs": self.drugs})
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("error", response.json())
+
+    def test_update_graph(self):
+        _, status, _ = views.update_graph(1, None, None, self.drugs)
+        self.assertIn("unavailable", status)
+
+    def test_update_graph_async(self):
+        _, status, _ = run_async(views.update_graph_async(1, None, None, self.drugs))
+        self.assertIn("unavailable", status)
+
+    def test_screen_api(self):
+        response = self.client.post(
+            "/api/screen", f"{self.drugs}\naspirin\n", content_type="text/plain"
+        )
+        results = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(results), 2)
+        self.assertIn("unavailable", results[0]["error"])
+        self.assertEqual(results[1]["error"], "Please enter at least two drug names")
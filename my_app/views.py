@@ -1,33 +1,105 @@
 import os
 import json
+import asyncio
+import logging
+import itertools
 import dash
 import flask
-import random
-import numpy as np
 import requests
-import networkx as nx
-from .graph import Graph, random_walk
+from urllib.parse import quote
+from .lazy import lazy_import
+from .graph import Graph, average_shortest_paths, edge_strings, risk_report
+from .cache import GraphCache, LRUCache, RxNormCache
+from .layout import compute_layout, layout_cache
+from .names import NameIndex
+from .ingredients import collapse, collapse_graph, concept, view
+from .instrument import metrics, span, upstream
+from .interactions import default_source, fetch_interaction_records, fetch_interaction_records_async
+from .interactions import fetch_interaction_sets_async, response_records
+from . import screening
+from . import geo
+from .fetch import OPENFDA_URL, RXNAV_URL, TIMEOUT, SingleFlight, background, coordinator, executor
+from .fetch import get_json, session, upstream_errors
+from .fetch import AsyncSingleFlight, gather_limited, get_async, get_json_async, in_background
+from .fetch import on_fetch_loop, run_async
 from collections import deque
-import geopandas as gpd
-import plotly.graph_objects as go
-import plotly.express as px
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.shortcuts import render
 from django.template import loader
 from dash import Dash, dcc, html, State, dash_table
+from dash._utils import create_callback_id
 from django_plotly_dash import DjangoDash
+from django_plotly_dash.views import update as dpd_update
+from plotly.io.json import to_json_plotly
 from dash.dependencies import Input, Output
-from django.views.decorators.csrf import ensure_csrf_cookie
-
-# initialize dash app and geodataframe
-app = DjangoDash("drug-interaction")
-shp_file = gpd.read_file("./my_app/World_Countries_Generalized.zip").drop(
-    ["SHAPE_Leng", "SHAPE_Area", "FID", "COUNTRYAFF"], axis=1
+from django.views.decorators.cache import cache_control
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import etag, require_POST
+
+# imported on first use, see `lazy.py`
+np = lazy_import("numpy")
+nx = lazy_import("networkx")
+go = lazy_import("plotly.graph_objects")
+px = lazy_import("plotly.express")
+httpx = lazy_import("httpx")
+
+logger = logging.getLogger(__name__)
+
+# initialize dash app
+APP_NAME = "drug-interaction"
+app = DjangoDash(APP_NAME)
+
+# drug name -> RxCUI cache, seeded with the development-time `cache.json`
+rxnorm_cache = RxNormCache("./my_app/cache.sqlite3", seed="./my_app/cache.json")
+# de-duplicates RxNorm requests for the same name across concurrent queries
+rxnorm_flight = SingleFlight()
+rxnorm_async_flight = AsyncSingleFlight()
+# the drug names cached in `rxnorm_cache`, for the query suggestions
+name_index = NameIndex(rxnorm_cache.names)
+# adverse event drill-down data per RxCUI, so re-clicking a node or switching
+# the dropdown does not repeat the OpenFDA requests
+openfda_cache = LRUCache(maxsize=512, ttl=24 * 3600)
+openfda_flight = SingleFlight(coordinator)
+openfda_async_flight = AsyncSingleFlight()
+# prefetches run apart from the clicks, see `prefetchOpenFda()`
+openfda_prefetch_flight = SingleFlight(background)
+openfda_prefetch_async_flight = AsyncSingleFlight()
+OPENFDA_PREFETCH_LIMIT = 100  # max. number of vertices prefetched per graph
+# the four adverse event counts of the drill-down, in `parseOpenFda()` order
+OPENFDA_FIELDS = (
+    "patient.patientsex",
+    "patient.patientonsetage",
+    "primarysourcecountry.exact",
+    "patient.reaction.reactionmeddrapt.exact",
+)
+# where interaction data comes from (NIH API or a local fixture)
+interaction_source = default_source()
+# interaction graphs of recent queries, extended when drugs are added
+# (GRAPH_CACHE_DIR shares them between worker processes as snapshots)
+graph_cache = GraphCache(shared_dir=os.environ.get("GRAPH_CACHE_DIR"))
+# level of detail of the network figure: graphs with more vertices are drawn
+# with WebGL traces, hover labels instead of annotations and fewer markers
+LARGE_GRAPH_VERTICES = 300
+# approx. max. size in bytes of the figure sent to the browser, the least
+# severe interactions are dropped first when it is exceeded
+FIGURE_PAYLOAD_BUDGET = int(os.environ.get("FIGURE_PAYLOAD_BUDGET", 8 * 2**20))
+SEVERITY_RANK = {"high": 0, "moderate": 1, "low": 2}  # other values rank last
+RISK_TOP_K = 10  # most severe interactions listed in the risk panel / API
+RISK_TABLE_DRUGS = 50  # riskiest drugs listed in the risk panel
+SUGGESTIONS = 10  # drug names suggested for the query box / API
+# hit / miss counters served by `metrics_view()`
+metrics.register_caches(
+    rxnorm=rxnorm_cache, openfda=openfda_cache, graph=graph_cache, layout=layout_cache
 )
+# distinct interaction strings shared by every graph of the process
+metrics.collector(lambda: [("interned_strings_total", {}, len(edge_strings))])
 
 # check if FDA API key is found
 FDA_KEY = os.environ["FDA_KEY"]
-print("FDA key found") if FDA_KEY else print("fda key not found")
+logger.info("FDA key found") if FDA_KEY else logger.warning("fda key not found")
 
 # layout for the dash app
 app.layout = html.Div(
@@ -35,6 +107,12 @@ app.layout = html.Div(
         # input box and drop down menu
         html.Div("Please enter a series of drug names, separated by comma:"),
         html.Div([dcc.Input(id="query", type="text", style={"height": "20px", "width": "270px"}),
+                  # drug name suggestions, a selected name is added to the query
+                  dcc.Dropdown(id="suggest", placeholder="Search a drug name to add",
+                               style={"width": "270px"}),
+                  # products are grouped by ingredient unless expanded
+                  dcc.Checklist([{"label": " Show every product", "value": "expand"}], [],
+                                id="products"),
                   html.Div("", style={'height': "10px"}),
                   html.Div("Please select a specific type of information to display"),
                   dcc.Dropdown(["Patient Sex", "Age of onset", "Report nation", "Reaction type"],
@@ -63,6 +141,10 @@ app.layout = html.Div(
                 "justify-content": "space-between",
             },
         ),
+        # severity-weighted risk of the regimen, see `buildRiskPanel()`
+        html.Div(id="risk-div"),
+        # ingredient groups expanded by a click, see `expand_group()`
+        dcc.Store(id="expanded"),
     ],
     id="graph-container",
 )
@@ -84,20 +166,244 @@ def index(request):
     context = {}
     return render(request, "index.html", context)
 
+
+# country shapes of the choropleth, fetched once by the browser
+@cache_control(public=True, max_age=24 * 3600)
+@etag(lambda request: geo.country_geojson_bytes()[1])
+def countries_geojson(request):
+    """Serve the simplified, ISO-keyed country shapes (see `geo.py`)
+
+    Parameters
+    ----------
+    request : 
+        request object
+
+    Returns
+    -------
+        GeoJSON response
+    """
+    body, _ = geo.country_geojson_bytes()
+    return HttpResponse(body, content_type="application/geo+json")
+
+
+def metrics_view(request):
+    """Serve the metrics of this worker process (see `instrument.py`)
+
+    Parameters
+    ----------
+    request : 
+        request object
+
+    Returns
+    -------
+        Metrics in the Prometheus text format
+    """
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
+
+
+def suggest_api(request):
+    """Serve drug name suggestions for a partial or misspelled name as json
+
+    `GET /api/suggest?q=asp&limit=10` returns the cached drug names that
+    start with `q`, followed by the closest names by edit distance (see
+    `names.NameIndex.suggest()`).
+
+    Parameters
+    ----------
+    request : 
+        request object
+
+    Returns
+    -------
+        Json response, status 400 for a bad limit
+    """
+    try:
+        limit = int(request.GET.get("limit", SUGGESTIONS))
+    except ValueError:
+        limit = 0
+    if not 0 < limit <= 100:
+        return JsonResponse({"error": "limit must be an integer from 1 to 100"}, status=400)
+    query = request.GET.get("q", "")
+    return JsonResponse({"query": query, "suggestions": name_index.suggest(query, limit)})
+
+
+async def risk_api(request):
+    """Serve the severity-weighted risk report of a group of drugs as json
+
+    `GET /api/risk?drugs=aspirin,warfarin&top=10` returns `risk_report()`
+    of the interaction graph of the drugs, with the `top` most severe
+    interactions (default `RISK_TOP_K`), and the products of the
+    ingredient group of each drug in `groups`.
+
+    Parameters
+    ----------
+    request : 
+        request object
+
+    Returns
+    -------
+        Json response, status 400 for a bad query and 502 when the
+        interaction source fails
+    """
+    text = request.GET.get("drugs", "")
+    try:
+        top_k = int(request.GET.get("top", RISK_TOP_K))
+    except ValueError:
+        top_k = -1
+    if top_k < 0:
+        return JsonResponse({"error": "top must be a non-negative integer"}, status=400)
+    try:
+        graph, groups, _ = await on_fetch_loop(queryGraphAsync(text))
+    except upstream_errors() as e:
+        logger.warning("interaction source failed: %r", e)
+        return JsonResponse({"error": "interaction data is unavailable"}, status=502)
+    except ValueError:
+        return JsonResponse({"error": "Please enter at least two drug names"}, status=400)
+    except KeyError as e:
+        logger.warning("no interaction data: %s", e)
+        # no interaction found for the drugs
+        graph, groups = Graph(), {}
+    report = await asyncio.to_thread(risk_report, graph, top_k)
+    report["groups"] = [
+        {"rxcui": cui, "ingredient": g.ingredient, "rxcuis": list(g.products)}
+        for cui, g in groups.items()
+        if cui in graph.vert_list
+    ]
+    return JsonResponse(report)
+
+
+@csrf_exempt
+@require_POST
+def screen_api(request):
+    """Screen a batch of regimens for interactions, streaming the results
+
+    `POST /api/screen?format=ndjson&top=3` with one regimen per line in
+    the body (see `screening.parse_regimens()`), or a json body
+    `{"regimens": [...]}` with one regimen per item. Each regimen's result
+    (see `screening.screen_regimens()`) is sent as soon as its batch is
+    done, as an NDJSON line or, with `format=csv`, a csv row.
+
+    Parameters
+    ----------
+    request : 
+        request object
+
+    Returns
+    -------
+        Streaming NDJSON or csv response, status 400 for a bad query
+    """
+    output = request.GET.get("format", "ndjson")
+    if output not in ("ndjson", "csv"):
+        return JsonResponse({"error": "format must be ndjson or csv"}, status=400)
+    try:
+        top_k = int(request.GET.get("top", screening.TOP_K))
+    except ValueError:
+        top_k = -1
+    if top_k < 0:
+        return JsonResponse({"error": "top must be a non-negative integer"}, status=400)
+
+    if request.content_type == "application/json":
+        try:
+            items = json.loads(request.body)["regimens"]
+        except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+            return JsonResponse({"error": "expected {\"regimens\": [...]}"}, status=400)
+        lines = (i if isinstance(i, str) else json.dumps(i) for i in items)
+    else:
+        lines = request  # read line by line while screening
+    results = screenRegimens(screening.parse_regimens(lines), top_k=top_k)
+    if output == "csv":
+        content, content_type = screening.csv_lines(results), "text/csv"
+    else:
+        content, content_type = screening.ndjson_lines(results), "application/x-ndjson"
+    if isinstance(request, ASGIRequest):
+        # Django would read a blocking iterator to the end before sending it
+        content = iterateInThread(content)
+    return StreamingHttpResponse(content, content_type=content_type)
+
+
+async def iterateInThread(iterator, chunk_size=100):
+    """Iterate a blocking iterator in a worker thread, `chunk_size` items at a time
+
+    Yields
+    ------
+        The items of each chunk joined into one string
+    """
+    iterator = iter(iterator)
+    while True:
+        chunk = await asyncio.to_thread(lambda: list(itertools.islice(iterator, chunk_size)))
+        if not chunk:
+            return
+        yield "".join(chunk)
+
+
+# callbacks for the drug name suggestions
+@app.callback(
+    Output("suggest", "options"),
+    Input("suggest", "search_value"),
+    prevent_initial_call=True,
+)
+def update_suggestions(search):
+    """Suggest drug names for the text typed in the suggestion dropdown
+
+    Parameters
+    ----------
+    search : 
+        The text typed in the dropdown
+
+    Returns
+    -------
+        The dropdown options, cached drug names completing or close to
+        the text
+    """
+    if not search:
+        return dash.no_update
+    # the dropdown only shows options matching `search`, misspelled text
+    # does not match the corrected names, so every option gets it
+    return [
+        {"label": s["name"], "value": s["name"], "search": search}
+        for s in name_index.suggest(search, SUGGESTIONS)
+    ]
+
+
+@app.callback(
+    Output("query", "value"),
+    Output("suggest", "value"),
+    Input("suggest", "value"),
+    State("query", "value"),
+    prevent_initial_call=True,
+)
+def add_suggestion(name, text):
+    """Add the drug name selected in the suggestion dropdown to the query
+
+    Returns
+    -------
+        The new query string, and an empty dropdown
+    """
+    if not name:
+        return dash.no_update, dash.no_update
+    names = [n.strip() for n in (text or "").split(",") if n.strip()]
+    if name not in (n.lower() for n in names):
+        names.append(name)
+    return ", ".join(names), None
+
+
 # callback for network graph
 @app.callback(
     dash.dependencies.Output("drug-network", "figure"), # network graph
     dash.dependencies.Output("status-div", "children"), # status string
+    dash.dependencies.Output("risk-div", "children"), # risk panel
     dash.dependencies.Input("submit-btn", "n_clicks"),  # click counter - n_clicks
     dash.dependencies.Input("dd", "value"),  # dropdown value - query
+    dash.dependencies.Input("expanded", "data"),  # groups expanded by a click - expanded
     State("query", "value"),  # query string - text
+    State("products", "value"),  # "expand" to show every product - products
     prevent_initial_call=True,
 )
-def update_graph(n_clicks, query, text):
+def update_graph(n_clicks, query, expanded, text, products=None):
     """Update the drug network graph based on user input
 
     Takes the `Input` callbacks supplied in the annotation as arguments
-    and return the network graph and a status string
+    and return the network graph, a status string and the risk panel
 
     Parameters
     ----------
@@ -105,33 +411,287 @@ def update_graph(n_clicks, query, text):
         Number of times the "submit" button is clicked 
     query : 
         Value that the users select from the dropdown menu
+    expanded : 
+        Ingredient groups expanded by a click (see `expand_group()`)
     text : 
         User query string
+    products : 
+        Checked options, with "expand" the graph shows every product
+        instead of one product per ingredient group
 
     Returns
     -------
-        The network graph, 
+        The network graph, the status string and the risk panel
+    """
+    if n_clicks >= 1:
+        logger.info("query string is: %s", text)
+    return graphOutputs(
+        lambda: queryGraph(text), n_clicks, expanded, products, prefetchOpenFda
+    )
+
+
+def graphOutputs(query, n_clicks, expanded, products, prefetch):
+    """Outputs of `update_graph()` and `update_graph_async()`
+
+    Parameters
+    ----------
+    query : 
+        Function returning the interaction graphs of the query and its
+        ingredient groups (see `queryGraph()`), or raising its error
+    n_clicks, expanded, products : 
+        As for `update_graph()`
+    prefetch : 
+        Function called with the RxCUIs of the drawn vertices, to load
+        their drill-down data (see `prefetchOpenFda()`)
+
+    Returns
+    -------
+        The network graph, the status string and the risk panel
     """
     if n_clicks >= 1:
         try:
-            print(f"query string is: {text}")
-            # get RxCUI and interaction data
-            cui_name_pair = getRxNorm(text)
-            interaction = getInteractionData(list(cui_name_pair.keys()))
-            # build interaction graph
-            graph = getInteractionGraph(interaction)
+            graph, groups, product_graph = query()
+            if graph.num_edges == 0:
+                # if there is no interaction found for users' input drug
+                return dcc.Graph(), "No interaction is found for this group of drugs!", []
+            shown, anchors, multiplicity, variants = view(
+                graph, groups, shownGroups(groups, expanded, n_clicks, products), product_graph
+            )
+            # load the drill-down data while the user looks at the graph
+            prefetch(shown.ids)
             return (
-                buildGraphVisualization(graph),
-                "Graph built successfully",
+                buildGraphVisualization(
+                    shown, groups=groups, anchors=anchors, multiplicity=multiplicity,
+                    variants=variants,
+                ),
+                graphStatus(groups),
+                buildRiskPanel(risk_report(graph, RISK_TOP_K)),
             )
+        except upstream_errors() as e:
+            logger.warning("interaction source failed: %r", e)
+            return dcc.Graph(), "Interaction data is unavailable right now, please try again later", []
         except ValueError:
             # if the user only enter one drug
-            return dcc.Graph(), "Please enter at least two drug names"
+            return dcc.Graph(), "Please enter at least two drug names", []
         except KeyError as e:
-            print(e)
+            logger.warning("no interaction data: %s", e)
             # if there is no interaction found for users' input drug
-            return dcc.Graph(), "No interaction is found for this group of drugs!"
-    return dash.no_update, ""
+            return dcc.Graph(), "No interaction is found for this group of drugs!", []
+    return dash.no_update, "", dash.no_update
+
+
+def queryGraph(text):
+    """Get the interaction graph of a query string
+
+    The products of the drugs are collapsed to one per ingredient group
+    (see `groupProducts()`) before the interactions are queried. Sources
+    that store interactions by product are queried for every product,
+    and the products of each group are merged in the graph instead.
+
+    Parameters
+    ----------
+    text : 
+        User query string, drug names separated by commas
+
+    Returns
+    -------
+        The interaction graph of the drugs, built or taken from
+        `graph_cache`; the ingredient groups of its RxCUIs; and the
+        interaction graph of every product for sources that store
+        interactions by product, `None` for the others
+
+    Raises
+    ------
+    ValueError
+        When users enter less than two drug names
+    """
+    # get RxCUI and interaction data
+    cui_name_pair, groups = groupProducts(getRxNorm(text))
+    # build interaction graph, or reuse / extend a cached one
+    if not interaction_source.product_level:
+        return graph_cache.get(list(cui_name_pair.keys()), buildInteractionGraph), groups, None
+    cuis = [cui for g in groups.values() for cui in g.products]
+    products = graph_cache.get(cuis, buildInteractionGraph)
+    graph, _, _ = collapse_graph(products, groups)
+    return graph, groups, products
+
+
+@app.callback(
+    dash.dependencies.Output("expanded", "data"),
+    dash.dependencies.Input("drug-network", "clickData"),
+    State("submit-btn", "n_clicks"),
+    State("expanded", "data"),
+    prevent_initial_call=True,
+)
+def expand_group(click_data, n_clicks, expanded):
+    """Expand the ingredient group of a clicked vertex
+
+    Group vertices carry the RxCUI of the group as `customdata`. The
+    expanded groups are stored with the submit count of their query, so
+    a new query starts with every group collapsed.
+
+    Parameters
+    ----------
+    click_data : 
+        Data of the clicked point
+    n_clicks : 
+        Number of times the "submit" button is clicked
+    expanded : 
+        Stored `{"n_clicks": ..., "groups": [RxCUI, ...]}`
+
+    Returns
+    -------
+        The updated store
+    """
+    try:
+        cui = click_data["points"][0]["customdata"]
+    except (TypeError, KeyError, IndexError):
+        cui = None
+    groups = expandedGroups(expanded, n_clicks)
+    if not cui or cui in groups:
+        return dash.no_update
+    return {"n_clicks": n_clicks, "groups": groups + [cui]}
+
+
+def expandedGroups(expanded, n_clicks):
+    """RxCUIs of the groups expanded since the query was last submitted"""
+    if expanded and expanded.get("n_clicks") == n_clicks:
+        return list(expanded.get("groups", []))
+    return []
+
+
+def shownGroups(groups, expanded, n_clicks, products):
+    """RxCUIs of the groups drawn with all of their products"""
+    if "expand" in (products or ()):
+        return list(groups)
+    return expandedGroups(expanded, n_clicks)
+
+
+def graphStatus(groups):
+    """Status string of a built graph, with the number of grouped products"""
+    n_products = sum(len(g.products) for g in groups.values())
+    if n_products == len(groups):
+        return "Graph built successfully"
+    return (
+        f"Graph built successfully ({n_products} products grouped into "
+        f"{len(groups)} ingredient groups)"
+    )
+
+
+def groupProducts(cui_name):
+    """Collapse RxNorm products to one product per ingredient group
+
+    The term types and ingredients are taken from `rxnorm_cache`, or
+    parsed from the product names (see `ingredients.collapse()`).
+
+    Parameters
+    ----------
+    cui_name : 
+        A dictionary with RxCUI as keys and drug names as values
+
+    Returns
+    -------
+        The `{RxCUI: drug name}` dictionary of the kept products, and a
+        dictionary with the kept RxCUIs as keys and their
+        `ingredients.IngredientGroup` as values
+    """
+    return collapse(cui_name, rxnorm_cache.concepts(cui_name))
+
+
+def screenRegimens(regimens, **kwargs):
+    """Screen regimens through `rxnorm_cache` and `interaction_source`
+
+    The drug names and interactions of each batch are fetched on the fetch
+    loop, so a batch is not limited to the `MAX_WORKERS` threads of the
+    interactive queries. The products of each regimen are grouped by
+    ingredient as in `queryGraph()`, so a regimen gets the same score as
+    from `/api/risk`. See `screening.screen_regimens()` for the arguments
+    and results.
+    """
+    return screening.screen_regimens(
+        regimens,
+        lambda names: run_async(resolveRxNormAsync(names)),
+        lambda cui_sets: run_async(buildRegimenGraphAsync(cui_sets)),
+        group=groupRegimens,
+        product_level=interaction_source.product_level,
+        **kwargs,
+    )
+
+
+def groupRegimens(cui_names):
+    """`groupProducts()` of many `{RxCUI: drug name}`, with one cache lookup"""
+    concepts = rxnorm_cache.concepts({cui for cui_name in cui_names for cui in cui_name})
+    return [collapse(cui_name, concepts) for cui_name in cui_names]
+
+
+async def queryGraphAsync(text):
+    """Coroutine version of `queryGraph()`, runs on the fetch loop"""
+    cui_name_pair, groups = groupProducts(await getRxNormAsync(text))
+    if not interaction_source.product_level:
+        graph = await graph_cache.get_async(list(cui_name_pair.keys()), buildInteractionGraphAsync)
+        return graph, groups, None
+    cuis = [cui for g in groups.values() for cui in g.products]
+    products = await graph_cache.get_async(cuis, buildInteractionGraphAsync)
+    graph, _, _ = collapse_graph(products, groups)
+    return graph, groups, products
+
+
+def buildRiskPanel(report):
+    """Build the risk panel shown under the network graph
+
+    Parameters
+    ----------
+    report : 
+        The risk report of the graph (see `graph.risk_report()`)
+
+    Returns
+    -------
+        Dash components: the regimen score, the most severe interactions
+        and the riskiest drugs
+    """
+    regimen = report["regimen"]
+    counts = ", ".join(f"{n} {severity}" for severity, n in regimen["by_severity"].items())
+    interactions = [
+        {
+            "drugs": " + ".join(d["name"] for d in i["drugs"]),
+            "severity": i["severity"],
+            "weight": i["weight"],
+            "source": i["source"],
+            "description": i["description"],
+        }
+        for i in report["top_interactions"]
+    ]
+    drugs = [
+        {k: d[k] for k in ("name", "rxcui", "score", "interactions", "max_severity")}
+        for d in report["drugs"][:RISK_TABLE_DRUGS]
+    ]
+    table_style = {"overflowX": "auto"}
+    cell_style = {"textAlign": "left", "whiteSpace": "normal", "height": "auto"}
+    return [
+        html.H3(f"Regimen risk score: {regimen['score']:g}"),
+        html.P(f"{regimen['interactions']} interactions among {regimen['drugs']} drugs ({counts})"),
+        html.H4(f"Top {len(interactions)} most severe interactions"),
+        dash_table.DataTable(
+            interactions,
+            [{"name": c.capitalize(), "id": c} for c in ("drugs", "severity", "weight", "source", "description")],
+            style_table=table_style,
+            style_cell=cell_style,
+        ),
+        html.H4(f"Riskiest drugs (top {len(drugs)})"),
+        dash_table.DataTable(
+            drugs,
+            [
+                {"name": "Drug", "id": "name"},
+                {"name": "RxCUI", "id": "rxcui"},
+                {"name": "Score", "id": "score"},
+                {"name": "Interactions", "id": "interactions"},
+                {"name": "Max. severity", "id": "max_severity"},
+            ],
+            sort_action="native",
+            style_table=table_style,
+            style_cell=cell_style,
+        ),
+    ]
 
 
 @app.callback(
@@ -153,13 +713,39 @@ def update_drilldown(click_data, dropdown):
     -------
         The drill down graph
     """
+    cui_clicked = clickedRxCui(click_data)
+    if cui_clicked is None:
+        # nothing clicked yet, or the user clicks on the edge scatter points
+        return dash.no_update
+    openFda = getOpenFda(cui_clicked)
+    return buildDrilldown(cui_clicked, openFda, dropdown)
+
+
+def clickedRxCui(click_data):
+    """Get the RxCUI of the vertex being clicked on, `None` if no vertex is clicked"""
     try:
-        # get the CUI number being clicked on
-        cui_clicked = click_data["points"][0]["text"].split("<br>")[0].split(": ")[1]
-        openFda = getOpenFda(cui_clicked)
-    except:
-        # when the user clicks on the edge scatter points
-        pass
+        return click_data["points"][0]["text"].split("<br>")[0].split(": ")[1]
+    except (TypeError, KeyError, IndexError):
+        return None
+
+
+@span("drilldown")
+def buildDrilldown(cui_clicked, openFda, dropdown):
+    """Build the adverse event drill down graph of an RxCUI
+
+    Parameters
+    ----------
+    cui_clicked : 
+        The RxCUI of the vertex that the user clicks on
+    openFda : 
+        The OpenFDA data of the RxCUI (see `getOpenFda()`)
+    dropdown : 
+        The dropdown value that the user selects
+
+    Returns
+    -------
+        The drill down graph
+    """
     if dropdown == "Patient Sex":
         # patient sex - bar graph
         # construct dicionary with data to plot (k: v = sex: count)
@@ -184,20 +770,19 @@ def update_drilldown(click_data, dropdown):
         return fig
     elif dropdown == "Report nation":
         # report nation - choropleth mapping
-        # use geopandas geodataframe
-        plot_data = (
-            gpd.GeoDataFrame(openFda["reporting_country"])
-            .merge(shp_file, how="inner", left_on="term", right_on="ISO")
-            .drop(["term", "AFF_ISO"], axis=1)
-        )
-        # index needs to be ISO, geometry needs to be set too
-        plot_data = plot_data.set_geometry("geometry").set_index("ISO")
-        # plot
+        # construct dicionary with data to plot (k: v = ISO code: count),
+        # only for countries that have a shape
+        countries = geo.country_codes()
+        plot_dict = {
+            i["term"]: i["count"] for i in openFda["reporting_country"] if i["term"] in countries
+        }
+        # plot, the figure only references the country shapes by URL
+        # (plotly.js downloads them once and caches them in the browser)
         fig = px.choropleth(
-            plot_data,
-            geojson=plot_data.geometry,
-            locations=plot_data.index,
-            color="count",
+            locations=list(plot_dict.keys()),
+            color=list(plot_dict.values()),
+            geojson=reverse("countries-geojson"),
+            labels={"color": "count"},
         )
         fig.update_layout(title=f"Reporting country distribution for {cui_clicked}")
         return fig
@@ -221,13 +806,122 @@ def update_drilldown(click_data, dropdown):
 
 
 
+async def update_graph_async(n_clicks, query, expanded, text, products=None):
+    """Coroutine version of `update_graph()`, used when served by ASGI
+
+    Runs on the fetch loop (see `dash_update()`): the requests to the
+    APIs don't hold a thread while waiting, the rest of `graphOutputs()`
+    (layout, figure, risk report) runs in a thread.
+    """
+    outputs_query = None
+    if n_clicks >= 1:
+        logger.info("query string is: %s", text)
+        outcome = asyncio.ensure_future(queryGraphAsync(text))
+        await asyncio.gather(outcome, return_exceptions=True)
+        # raises the error of the query, if any, in `graphOutputs()`
+        outputs_query = outcome.result
+    loop = asyncio.get_running_loop()
+    return await asyncio.to_thread(
+        graphOutputs, outputs_query, n_clicks, expanded, products,
+        lambda cuis: loop.call_soon_threadsafe(prefetchOpenFdaAsync, cuis),
+    )
+
+
+async def update_drilldown_async(click_data, dropdown):
+    """Coroutine version of `update_drilldown()`, used when served by ASGI"""
+    cui_clicked = clickedRxCui(click_data)
+    if cui_clicked is None:
+        # nothing clicked yet, or the user clicks on the edge scatter points
+        return dash.no_update
+    openFda = await getOpenFdaAsync(cui_clicked)
+    return await asyncio.to_thread(buildDrilldown, cui_clicked, openFda, dropdown)
+
+
+def asyncCallbacks(coroutines):
+    """Coroutine versions of callbacks of `app`, by the Dash output id of the callback
+
+    The ids are built from the outputs declared in `@app.callback`, as Dash
+    builds the `output` of a callback request.
+
+    Parameters
+    ----------
+    coroutines : 
+        Callbacks of `app` as keys and their coroutine versions as values
+    """
+    return {
+        create_callback_id(callback["output"], callback["inputs"]): coroutines[fn]
+        for callback, fn in app._callback_sets
+        if fn in coroutines
+    }
+
+
+# coroutine versions of the network-bound callbacks, by Dash output id
+ASYNC_CALLBACKS = asyncCallbacks({
+    update_graph: update_graph_async,
+    update_drilldown: update_drilldown_async,
+})
+
+
+async def dash_update(request, ident, stateless=True):
+    """Dash callback endpoint of the stateless apps
+
+    Routed in front of the django_plotly_dash endpoint. Under ASGI, the
+    callbacks in `ASYNC_CALLBACKS` are awaited on the fetch loop and the
+    other callbacks run in a thread pool (instead of the single thread
+    Django runs sync views in under ASGI). Under WSGI, every callback runs
+    synchronously as before.
+
+    Parameters
+    ----------
+    request : 
+        request object with the Dash callback request body
+    ident : 
+        Name of the Dash app
+
+    Returns
+    -------
+        The Dash callback response
+    """
+    if not isinstance(request, ASGIRequest):
+        return await sync_to_async(dpd_update)(request, ident, stateless)
+    try:
+        body = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        body = {}
+    callback = ASYNC_CALLBACKS.get(body.get("output")) if ident == APP_NAME else None
+    if callback is None:
+        return await sync_to_async(dpd_update, thread_sensitive=False)(request, ident, stateless)
+
+    args = [c.get("value") for c in body.get("inputs", []) + body.get("state", [])]
+    result = await on_fetch_loop(callback(*args))
+    outputs = body["outputs"]
+    if isinstance(outputs, dict):
+        # single output
+        outputs, result = [outputs], [result]
+    response = {}
+    for output, value in zip(outputs, result):
+        if value is not dash.no_update:
+            response.setdefault(output["id"], {})[output["property"]] = value
+    if not response:
+        return HttpResponse(status=204)  # nothing to update
+    with span("serialize"):
+        body = to_json_plotly({"multi": True, "response": response})
+    return HttpResponse(body, content_type="application/json")
+
+
+# what `csrf_exempt` does, the decorator hides coroutine views in Django 4.2
+dash_update.csrf_exempt = True
+
+
 def getRxNorm(query_str):
     """Get data from the RxNorm API 
 
     Takes the user input string and return a dictionary with RxCUI 
-    as keys and drug names as values. Caches data to the `cache.json` file. 
+    as keys and drug names as values. Caches data in `rxnorm_cache`, a 
+    SQLite database (`cache.sqlite3`) with an in-process LRU in front of it. 
     The cached data will be used if the user enters the same drug names. 
-    `cache.json` has structure: `{user_input: {RxCUI: drug_name, ...}}`
+    Names missing from the cache are fetched concurrently by `fetchRxNorm()`. 
+    Every drug name is cached as its own entry: `{RxCUI: drug_name, ...}`
 
     Parameters
     ----------
@@ -238,6 +932,94 @@ def getRxNorm(query_str):
     -------
         A dictionary with RxCUI as keys and drug names as values
 
+    Raises
+    ------
+    ValueError
+        When users enter less than two drug names
+    """
+    cui_name = {}  # dictionary to store cui to drug_name mapping
+    for new_data in resolveRxNorm(splitQuery(query_str)).values():
+        if new_data is not None:
+            cui_name.update(new_data)
+    return cui_name
+
+
+@span("rxnorm")
+def resolveRxNorm(names):
+    """Look up the RxCUIs of each of a list of drug names
+
+    Names missing from `rxnorm_cache` are fetched concurrently by
+    `fetchRxNorm()`.
+
+    Parameters
+    ----------
+    names : 
+        Lowercase drug names
+
+    Returns
+    -------
+        A dictionary with the names as keys and `{RxCUI: drug name}`
+        dictionaries as values, `None` for names that RxNorm does not
+        know or that failed
+    """
+    resolved = {q: rxnorm_cache.get(q) for q in names}
+    # resolve all names missing from the cache concurrently
+    pending = {
+        q: rxnorm_flight.submit(q, fetchRxNorm, q)
+        for q, cached in resolved.items()
+        if cached is None
+    }
+    if pending:
+        logger.info("Fetching new data for %d drug names", len(pending))
+
+    for q, future in pending.items():
+        try:
+            resolved[q] = future.result()
+        except requests.RequestException as e:
+            # the name failed after all retries, skip it
+            logger.warning("RxNorm request for %s failed: %s", q, e)
+    return resolved
+
+
+async def getRxNormAsync(query_str):
+    """Coroutine version of `getRxNorm()`, runs on the fetch loop"""
+    cui_name = {}  # dictionary to store cui to drug_name mapping
+    for new_data in (await resolveRxNormAsync(splitQuery(query_str))).values():
+        if new_data is not None:
+            cui_name.update(new_data)
+    return cui_name
+
+
+@span("rxnorm")
+async def resolveRxNormAsync(names):
+    """Coroutine version of `resolveRxNorm()`, runs on the fetch loop
+
+    Names missing from the cache are fetched concurrently by
+    `fetchRxNormAsync()`, at most `fetch.MAX_CONNECTIONS` at a time.
+    """
+    resolved = {q: rxnorm_cache.get(q) for q in names}
+    missing = [q for q, cached in resolved.items() if cached is None]
+    if missing:
+        logger.info("Fetching new data for %d drug names", len(missing))
+    results = await gather_limited(
+        (rxnorm_async_flight.call(q, fetchRxNormAsync, q) for q in missing),
+        return_exceptions=True,
+    )
+
+    for q, new_data in zip(missing, results):
+        if isinstance(new_data, httpx.HTTPError):
+            # the name failed after all retries, skip it
+            logger.warning("RxNorm request for %s failed: %s", q, new_data)
+            new_data = None
+        elif isinstance(new_data, BaseException):
+            raise new_data
+        resolved[q] = new_data
+    return resolved
+
+
+def splitQuery(query_str):
+    """Split the users' input string into unique lowercase drug names
+
     Raises
     ------
     ValueError
@@ -246,303 +1028,649 @@ def getRxNorm(query_str):
     query_str = [i.strip().lower() for i in query_str.split(",")]
     if len(query_str) < 2:
         raise ValueError("Please enter at least two drug names")
-    cui_name = {}  # dictionary to store cui to drug_name mapping
-    with open("./my_app/cache.json", "r") as json_file:
-        cache = json.load(json_file)
-
-    for q in query_str:
-        if q in cache.keys():
-            # if data is in cache
-            print("data found in cache")
-            cui_name.update(cache[q])  # update cui_name with cached data
-        else:
-            # if data is not in cache, fetch new data
-            print("Fetching new data")
-            response = requests.get(
-                f"https://rxnav.nlm.nih.gov/REST/drugs.json?name={q}"
-            ).json()
-            new_data = {}  # temporary dictionary to store new API data
-            try:
-                for i in response["drugGroup"]["conceptGroup"]:
-                    if "conceptProperties" in i:
-                        for j in i["conceptProperties"]:
-                            new_data[j["rxcui"]] = j["name"]
-                cache[q] = new_data  # update cache with new data for q
-                cui_name.update(new_data)  # update cui_name with new API data
-            except KeyError:
-                pass
-
-    # Update the cache file only once after processing all queries
-    with open("./my_app/cache.json", "w") as f:
-        json.dump(cache, f)
+    return list(dict.fromkeys(query_str))  # drop repeated names
 
-    return cui_name
 
+def fetchRxNorm(name):
+    """Fetch the RxCUIs of a drug name from the RxNorm API and cache them
+
+    Runs on the shared fetch executor, with the retries and timeout of
+    the shared session.
+
+    Parameters
+    ----------
+    name : 
+        Lowercase drug name
+
+    Returns
+    -------
+        A dictionary with RxCUI as keys and drug names as values, or `None`
+        when RxNorm does not know the name
+    """
+    response = get_json(f"{RXNAV_URL}/drugs.json?name={quote(name)}")
+    return parseRxNorm(name, response)
 
+
+async def fetchRxNormAsync(name):
+    """Coroutine version of `fetchRxNorm()`, on the shared async client"""
+    response = await get_json_async(f"{RXNAV_URL}/drugs.json?name={quote(name)}")
+    return parseRxNorm(name, response)
+
+
+def parseRxNorm(name, response):
+    """Cache and return the `{RxCUI: drug name}` dictionary of a RxNorm response
+
+    The term type and ingredient group of every product are cached too,
+    see `groupProducts()`. Returns `None` when RxNorm does not know the name
+    """
+    new_data = {}  # temporary dictionary to store new API data
+    concepts = []  # products with their term type and ingredient group
+    try:
+        for i in response["drugGroup"]["conceptGroup"]:
+            if "conceptProperties" in i:
+                for j in i["conceptProperties"]:
+                    new_data[j["rxcui"]] = j["name"]
+                    concepts.append(concept(j["rxcui"], j["name"], j.get("tty") or i.get("tty")))
+    except KeyError:
+        return None
+    rxnorm_cache.set(name, new_data, concepts)  # update cache with new data for name
+    if new_data:
+        name_index.add([name])
+    return new_data
+
+
+@span("openfda")
 def getOpenFda(cui):
     """Get data from the OpenFDA API
 
+    Results are cached per RxCUI in `openfda_cache`, and concurrent calls
+    for the same RxCUI share one fetch. A prefetch of the RxCUI that has
+    not started yet is cancelled rather than waited for.
+
+    Parameters
+    ----------
+    cui : 
+        RxCUI Code numbers
+
+    Returns
+    -------
+        A dictionary containing the results
+    """
+    results = openfda_cache.get(cui)
+    if results is None:
+        prefetch = openfda_prefetch_flight.get(cui)
+        if prefetch is not None and not prefetch.cancel():
+            try:
+                return prefetch.result()  # already running
+            except Exception:
+                logger.warning("OpenFDA prefetch of %s failed, fetching again", cui)
+        results = openfda_flight.submit(cui, fetchOpenFda, cui).result()
+    return results
+
+
+@span("openfda")
+async def getOpenFdaAsync(cui):
+    """Coroutine version of `getOpenFda()`, runs on the fetch loop"""
+    results = openfda_cache.get(cui)
+    if results is None:
+        prefetch = openfda_prefetch_async_flight.get(cui)
+        if prefetch is not None:
+            # it may still wait for a background slot, the click takes over
+            prefetch.cancel()
+        results = await openfda_async_flight.call(cui, fetchOpenFdaAsync, cui)
+    return results
+
+
+def fetchOpenFda(cui, pool=executor):
+    """Fetch the four adverse event counts of an RxCUI concurrently
+
     Parameters
     ----------
     cui : 
         RxCUI Code numbers
+    pool : 
+        Executor of the four requests, `None` to make them one after the
+        other in the calling thread (for prefetches)
 
     Returns
     -------
         A dictionary containing the results
     """
-    BASE_URL = f"https://api.fda.gov/drug/event.json?api_key={FDA_KEY}&search=patient.drug.openfda.rxcui"
+    def count(field):
+        url = openFdaUrl(cui, field)
+        with upstream(url) as call:
+            response = session.get(url, timeout=TIMEOUT)
+            call.status = response.status_code
+        if response.status_code == 404:
+            return []  # OpenFDA answers 404 when no event matches
+        response.raise_for_status()
+        return response.json()["results"]
+
+    if pool is None:
+        return parseOpenFda(cui, *map(count, OPENFDA_FIELDS))
+    # issue the four count queries at once
+    futures = [pool.submit(count, field) for field in OPENFDA_FIELDS]
+    return parseOpenFda(cui, *(f.result() for f in futures))
+
+
+async def fetchOpenFdaAsync(cui):
+    """Coroutine version of `fetchOpenFda()`, on the shared async client"""
+    async def count(field):
+        response = await get_async(openFdaUrl(cui, field))
+        if response.status_code == 404:
+            return []  # OpenFDA answers 404 when no event matches
+        response.raise_for_status()
+        return response.json()["results"]
+
+    # issue the four count queries at once
+    counts = await asyncio.gather(*(count(field) for field in OPENFDA_FIELDS))
+    return parseOpenFda(cui, *counts)
+
+
+def openFdaUrl(cui, field):
+    """URL of an OpenFDA adverse event count query for an RxCUI"""
+    BASE_URL = f"{OPENFDA_URL}/drug/event.json?api_key={FDA_KEY}&search=patient.drug.openfda.rxcui"
+    return f"{BASE_URL}:%22{cui}%22&count={field}"
+
+
+def parseOpenFda(cui, sex, age_onset, reporting_country, reaction_type):
+    """Cache and return the drill-down data of an RxCUI from the four counts"""
     results = {}
     # sex
     # 0 is unknown, 1 is male, 2 is female, baba is you
-    content = requests.get(f"{BASE_URL}:%22{cui}%22&count=patient.patientsex").json()
     sex_dict = {0: "unknown", 1: "male", 2: "female"}
-    results["sex"] = {sex_dict[i["term"]]: i["count"] for i in content["results"]}
-
+    results["sex"] = {sex_dict[i["term"]]: i["count"] for i in sex}
     # age of onset
-    content = requests.get(
-        f"{BASE_URL}:%22{cui}%22&count=patient.patientonsetage"
-    ).json()
-    results["age_onset"] = {i["term"]: i["count"] for i in content["results"]}
-
+    results["age_onset"] = {i["term"]: i["count"] for i in age_onset}
     # reporting country
-    results["reporting_country"] = requests.get(
-        f"{BASE_URL}:%22{cui}%22&count=primarysourcecountry.exact"
-    ).json()["results"]
-
+    results["reporting_country"] = reporting_country
     # reaction type
-    results["reaction_type"] = requests.get(
-        f"{BASE_URL}:%22{cui}%22&count=patient.reaction.reactionmeddrapt.exact"
-    ).json()["results"]
+    results["reaction_type"] = reaction_type
+
+    openfda_cache.set(cui, results)
     return results
 
 
-def getInteractionData(cui_list):
-    """Get drug interaction data from NIH Drug interaction data
+def logPrefetchFailure(cui):
+    """Done-callback of a prefetch future or task, logs its exception
+
+    Nothing waits for a prefetch, so its failure would otherwise go
+    unreported ("Task exception was never retrieved" for tasks).
+    """
+    def done(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("OpenFDA prefetch of %s failed: %r", cui, future.exception())
+    return done
+
+
+def prefetchOpenFda(cui_list):
+    """Warm `openfda_cache` for the vertices of a new graph in the background
+
+    Prefetches run on the `fetch.background` pool, one request at a time
+    per RxCUI, so they never take the threads of the users' requests; a
+    click on a drug cancels its prefetch if it has not started.
+
+    Parameters
+    ----------
+    cui_list : 
+        A list of RxCUI numbers, only the first `OPENFDA_PREFETCH_LIMIT`
+        are prefetched
+    """
+    for cui in cui_list[:OPENFDA_PREFETCH_LIMIT]:
+        if openfda_cache.get(cui) is None and openfda_flight.get(cui) is None:
+            future = openfda_prefetch_flight.submit(cui, fetchOpenFda, cui, None)
+            future.add_done_callback(logPrefetchFailure(cui))
+
+
+def prefetchOpenFdaAsync(cui_list):
+    """Coroutine-side version of `prefetchOpenFda()`, call on the fetch loop"""
+    for cui in cui_list[:OPENFDA_PREFETCH_LIMIT]:
+        if openfda_cache.get(cui) is None and openfda_async_flight.get(cui) is None:
+            task = openfda_prefetch_async_flight.submit(cui, in_background, fetchOpenFdaAsync, cui)
+            task.add_done_callback(logPrefetchFailure(cui))
+
+
+def getInteractionData(cui_list, new=None):
+    """Get drug interaction data from `interaction_source`
+
+    All RxCUIs are queried: they are de-duplicated and split into
+    overlapping chunks that cover every pair (at most 50 RxCUIs each for
+    the NIH API), the chunks are fetched in parallel and the responses
+    parsed as they are read, without holding the whole response (see
+    `interactions.fetch_interaction_records()`).
 
     Parameters
     ----------
     cui_list : 
         A list of RxCUI numbers
+    new : 
+        Optional set of RxCUIs, only the interactions involving them
+        are needed
 
     Returns
     -------
-        The json response from the NIH API
+        A generator of (source name, `fullInteractionType` record), the
+        interactions are fetched as it is consumed
     """
-    max_len = 50 if len(cui_list) >= 50 else len(cui_list) # max len is 50
-    cui_list = random.choices(cui_list, k=max_len) # choose max of 50 CUI from list
-    cui_str = "+".join(cui_list) # join CUI with +
-    content = requests.get(
-        f"https://rxnav.nlm.nih.gov/REST/interaction/list.json?rxcuis={cui_str}"
-    ).json()
-    return content
+    return fetch_interaction_records(cui_list, interaction_source, new)
+
+
+def buildInteractionGraph(cui_list, base=None, new=None):
+    """Build (or extend) the interaction graph of a list of RxCUIs
+
+    Called by `graph_cache` when a query is not cached.
+
+    Parameters
+    ----------
+    cui_list : 
+        A list of RxCUI numbers
+    base : 
+        Optional graph of a subset of the RxCUIs to extend
+    new : 
+        The RxCUIs missing from `base`
 
+    Returns
+    -------
+        The interaction graph
+    """
+    # the records are added to the graph as they are fetched and parsed,
+    # so the span holds the fetch and the graph construction
+    with span("interactions"):
+        return addInteractions(getInteractionData(cui_list, new), base)
 
-def getInteractionGraph(interaction):
+
+async def buildRegimenGraphAsync(cui_sets):
+    """Build one graph with the interactions within each of many RxCUI lists
+
+    Used by `screenRegimens()`, every regimen is screened on its
+    subgraph (see `interactions.fetch_interaction_sets_async()`).
+    """
+    with span("interactions"):
+        interaction = await fetch_interaction_sets_async(cui_sets, interaction_source)
+    return await asyncio.to_thread(getInteractionGraph, interaction)
+
+
+async def buildInteractionGraphAsync(cui_list, base=None, new=None):
+    """Coroutine version of `buildInteractionGraph()`, for `graph_cache.get_async()`"""
+    with span("interactions"):
+        records = await fetch_interaction_records_async(cui_list, interaction_source, new)
+    # parsing is CPU work, keep the fetch loop free for other requests
+    return await asyncio.to_thread(getInteractionGraph, records, base)
+
+
+@span("parse")
+def getInteractionGraph(interaction, graph=None):
     """Construct a graph from interaction data
 
     Parameters
     ----------
     interaction : 
-        The json response from the NIH API
+        The json response from the NIH API, or an iterable of its
+        (source name, `fullInteractionType` record), e.g. of
+        `getInteractionData()`
+    graph : 
+        Optional graph to add the interactions to, a new graph by default
 
     Returns
     -------
         A graph object conforming to the graph structure described
         in the document and `graph.py` 
     """
-    graph = Graph()
-    # access fullInteractionType nested in fullInteractionTypeGroup
-    for i in interaction["fullInteractionTypeGroup"]:
-        for j in i["fullInteractionType"]:
-            graph.add_edge(
-                j["minConcept"][0]["rxcui"],
-                j["minConcept"][0]["name"],
-                j["minConcept"][1]["rxcui"],
-                j["minConcept"][1]["name"],
-                i["sourceName"], # source of info is in outer group
-                j["interactionPair"][0]["severity"],
-                j["interactionPair"][0]["description"],
-            )
-    return graph
+    if isinstance(interaction, dict):
+        interaction = response_records(interaction)
+    return addInteractions(interaction, graph)
 
 
-def buildGraphVisualization(graph):
-    """Build a visualization of the graph using plotly
+def addInteractions(records, graph=None):
+    """Add interaction records to a graph as they are iterated
 
     Parameters
     ----------
+    records : 
+        Iterable of (source name, `fullInteractionType` record)
     graph : 
-        The graph constructed by the getInteractionGraph() function
+        Optional graph to add the interactions to, a new graph by default
 
     Returns
     -------
-        A plotly graph object
+        The graph
     """
-    def point_generator(x0, x1, y0, y1, qty, ht):
-        """Helper function to generate multiple midpoints for edges
+    if graph is None:
+        graph = Graph()
+    for source_name, j in records:
+        graph.add_edge(
+            j["minConcept"][0]["rxcui"],
+            j["minConcept"][0]["name"],
+            j["minConcept"][1]["rxcui"],
+            j["minConcept"][1]["name"],
+            source_name, # source of info is in outer group
+            j["interactionPair"][0]["severity"],
+            j["interactionPair"][0]["description"],
+        )
+    return graph
+
+
+def edgeCoordinates(G, pos, qty=15, edges=None):
+    """Compute the edge lines and hover markers of a networkx graph
+
+    All edges are processed at once as numpy arrays instead of in a
+    Python loop per edge
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph with `severity` and `additional_info` edge attributes
+    pos : dict
+        Vertex as keys and `(x, y)` positions as values
+    qty : int or array
+        Number of hover markers per edge, the same for all edges or one
+        count per edge
+    edges : list, optional
+        The `(from, to, attributes)` edges to draw, all edges of `G` by
+        default
+
+    Returns
+    -------
+        A tuple of arrays
+        edge_x, edge_y : edge endpoints, `None` between edges (3 * E,)
+        m2x, m2y : hover marker coordinates, grouped by edge (sum(qty),)
+        m2t : hover text of each marker (sum(qty),)
+    """
+    def point_generator(p0, p1, qty):
+        """Helper function to generate multiple midpoints for all edges at once
 
         This allows users to hover over any given points on 
         the edges and see the hovertext
 
         Adapted from: https://stackoverflow.com/questions/74607000
-        (Used np.linspace to increase performance of computing points and added comments)
+        (One interpolation over all edges instead of `np.linspace` per edge)
 
         Parameters
         ----------
-        x0 :
-            Starting point on the x coordinate
-        x1 :
-            Ending point on the x coordinate
-        y0 :
-            Starting point on the y coordinate
-        y1 :
-            Ending point on the y coordinate
+        p0 :
+            (E, 2) array of the starting points of the edges
+        p1 :
+            (E, 2) array of the ending points of the edges
         qty :
-            Number of points to generate
-        ht :
-            Hover text to display (duplicated `qty` times)
+            (E,) array, number of points to generate per edge
 
         Returns
         -------
-            A tuple of lists
+            A tuple of arrays (sum(qty),)
             ptx : points for x-axis
             pty : points for y-axis
-            pth : duplicated hover text
         """
-        # generate duplicate hovertext
-        pth = [ht] * qty
-        # calculate all middle points + start and end (x-axis)
-        ptx = np.linspace(x0, x1, qty + 2).tolist() 
-        # calculate all middle points + start and end (y-axis)
-        pty = np.linspace(y0, y1, qty + 2).tolist()
-        ptx.pop(0); ptx.pop() # pop first and last for x (to avoid the origin)
-        pty.pop(0); pty.pop() # pop first and last for y (to avoid the origin)
-        return ptx, pty, pth
-
-    def nxGraph(drug_graph):
-        """helper function to convert the given drug graph to a networkx graph
+        # edge of every point and position of the point on its edge
+        edge = np.repeat(np.arange(len(qty)), qty)
+        k = np.arange(len(edge)) - np.repeat(np.cumsum(qty) - qty, qty)
+        # interior fractions of the edge (to avoid the endpoints)
+        t = (k + 1) / (qty[edge] + 1)
+        pts = p0[edge] + (p1 - p0)[edge] * t[:, None]
+        return pts[:, 0], pts[:, 1]
+
+    def line_coords(c0, c1):
+        """Interleave edge endpoints with breaks: [c0, c1, None, ...]"""
+        coords = np.full(3 * len(c0), None, dtype=object) # None is for a break between lines
+        coords[0::3] = c0
+        coords[1::3] = c1
+        return coords
+
+    # edge endpoints as (E, 2) arrays, attributes read once per edge
+    edges = list(G.edges(data=True)) if edges is None else edges
+    qty = np.broadcast_to(np.asarray(qty, dtype=np.intp), (len(edges),))
+    p0 = np.array([pos[f] for f, _, _ in edges], dtype=float).reshape(-1, 2)
+    p1 = np.array([pos[t] for _, t, _ in edges], dtype=float).reshape(-1, 2)
+
+    edge_x = line_coords(p0[:, 0], p1[:, 0])
+    edge_y = line_coords(p0[:, 1], p1[:, 1])
+
+    # edge hovertext definition
+    info = np.array(
+        [
+            f"RxCUI: {f}, {t}<br>"
+            + f"Severity: {data['severity']}<br>"
+            + (
+                f"Product pairs: {data['multiplicity']}<br>"
+                if data.get("multiplicity", 1) > 1 else ""
+            )
+            + edgeRationale(data)
+            for f, t, data in edges
+        ],
+        dtype=object,
+    )
 
-        Parameters
-        ----------
-        drug_graph : 
-            The graph constructed by the getInteractionGraph() function
+    # generate multiple midpoints for edges, each with its edge's hovertext
+    # (allows users to hover over any given point on edge to see hovertext)
+    m2x, m2y = point_generator(p0, p1, qty)
+    m2t = np.repeat(info, qty)
+    return edge_x, edge_y, m2x, m2y, m2t
 
-        Returns
-        -------
-            A networkx graph object
-        """
-        G = nx.Graph()
-        # loop over vertices in the graph as vertex
-        for vertex in drug_graph.vert_list.values():
-            # add node to networkx graph
-            G.add_node(vertex.id)
-            for neighbor in vertex.connectedTo:
-                # add edge to networkx graph
-                # can use kwargs to add additional info to the graph
-                G.add_edge(
-                    vertex.id,
-                    neighbor.id,
-                    severity=vertex.connectedTo[neighbor].severity, # include severity info
-                    additional_info=vertex.connectedTo[neighbor].additional_info, # inclide additional info
-                )
-        return G
 
-    # convert to networkx graph
-    G = nxGraph(graph)
+def edgeRationale(data, max_variants=5):
+    """Hover text of the description of an edge, or of its merged variants"""
+    variants = data.get("variants") or ()
+    if not variants:
+        return f"Rationale: {data['additional_info']}"
+    lines = [
+        f"- {severity} ({n} product pair{'s' if n > 1 else ''}): {description}"
+        for severity, description, n in variants[:max_variants]
+    ]
+    if len(variants) > max_variants:
+        lines.append(f"- and {len(variants) - max_variants} more")
+    return f"Rationales ({len(variants)} distinct):<br>" + "<br>".join(lines)
 
-    # generate positions for each node for visualization
-    pos = nx.spring_layout(G)
-
-    # extract edge coordinates from the positions
-    edge_x, edge_y = [], []
-    m2x, m2y, m2t = [], [], []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]] # get x coord
-        x1, y1 = pos[edge[1]] # get y coord
-        edge_x.extend([x0, x1, None])  #  None is for a break between lines
-        edge_y.extend([y0, y1, None])
-        
-        # edge hovertext definition
-        info = (
-            f"RxCUI: {edge[0]}, {edge[1]}<br>"
-            + f"Severity: {G.get_edge_data(edge[0], edge[1])['severity']}<br>"
-            + f"Rationale: {G.get_edge_data(edge[0], edge[1])['additional_info']}"
-        )
 
-        # generate multiple midpoints (15) for edges
-        # (allows users to hover over any given point on edge to see hovertext)
-        ptsx, ptsy, ptsh = point_generator(x0, x1, y0, y1, 15, info)
-        m2x.extend(ptsx)
-        m2y.extend(ptsy)
-        m2t.extend(ptsh)
+def markerCounts(edges, pos, spacing=0.02, max_qty=15):
+    """Number of hover markers per edge, proportional to the edge length
 
-    # create visible line for edges
-    edge_trace = go.Scatter(
-        x=edge_x,
-        y=edge_y,
-        line=dict(width=0.5, color="#888"),
-        hoverinfo="text",
-        mode="lines",
-    )
+    Parameters
+    ----------
+    edges : list
+        The `(from, to, attributes)` edges
+    pos : dict
+        Vertex as keys and `(x, y)` positions in [-1, 1] as values
+    spacing : float
+        Distance between two markers
+    max_qty : int
+        Max. number of markers of an edge, every edge has at least one
 
-    # create invisible lines for edges for hovertext
-    mnode_trace = go.Scatter(
-        x=m2x,
-        y=m2y,
-        mode="markers",
-        showlegend=False,
-        hovertemplate="%{hovertext}<extra></extra>",
-        hovertext=m2t,
-        marker=go.scatter.Marker(opacity=0),
-    )
+    Returns
+    -------
+        An (E,) integer array
+    """
+    p0 = np.array([pos[f] for f, _, _ in edges], dtype=float).reshape(-1, 2)
+    p1 = np.array([pos[t] for _, t, _ in edges], dtype=float).reshape(-1, 2)
+    length = np.hypot(*(p1 - p0).T)
+    return np.clip(np.ceil(length / spacing), 1, max_qty).astype(np.intp)
 
-    # extract node coordinates and labels
-    node_x, node_y, node_text = [], [], [] # init lists for coords and text
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(node)
-
-    # scatter for nodes
-    node_trace = go.Scatter(
-        x=node_x,
-        y=node_y,
-        mode="markers",
-        hoverinfo="text",
-        text=node_text,
-        marker=dict(showscale=False, color="blue", size=10, line_width=2),
+
+def thinEdges(edges, qty, budget):
+    """Keep the most severe edges that fit in a payload budget
+
+    The cost of an edge is estimated from the size of its coordinates and
+    hover text in the figure json. Edges are kept in order of severity,
+    with their hover markers while the budget allows it, then as plain
+    lines, the remaining edges are dropped.
+
+    Parameters
+    ----------
+    edges : list
+        The `(from, to, attributes)` edges
+    qty : array
+        Number of hover markers per edge
+    budget : int
+        Bytes available for the edges
+
+    Returns
+    -------
+        A tuple of the kept edges (most severe first) and their number of
+        hover markers (0 for plain lines)
+    """
+    order = sorted(
+        range(len(edges)),
+        key=lambda i: SEVERITY_RANK.get(edges[i][2]["severity"], len(SEVERITY_RANK)),
     )
-    
-    # node hovertext definition
-    n_adjacencies, n_text = [], []
-    for node, adjacencies in enumerate(G.adjacency()):
-        print(adjacencies[0])
-        print(adjacencies[1])
-        n_adjacencies.append(len(adjacencies[1]))
-        n_text.append(
-            f"RxCUI: {adjacencies[0]}<br>"
-            + f"Drug name: {graph.vert_list[adjacencies[0]].name}<br>"
-            + f"# of connections: {str(len(adjacencies[1]))}<br>"
-            + f"# of average shortest path # to other vertices: {str(random_walk(graph.vert_list.keys(), graph, adjacencies[0]))}"
+    edges = [edges[i] for i in order]
+    qty = np.asarray(qty, dtype=np.intp)[order]
+    # ~20 bytes per coordinate, a line is 2 points and a break
+    line_cost = np.full(len(edges), 120)
+    text_cost = np.array(
+        [len(f) + len(t) + len(str(data["additional_info"])) + 70 for f, t, data in edges],
+        dtype=np.int64,
+    )
+    full_cost = line_cost + qty * (40 + text_cost)
+
+    # the longest prefix of edges with markers, then of plain lines
+    n_full = int(np.searchsorted(np.cumsum(full_cost), budget, side="right"))
+    remaining = budget - int(full_cost[:n_full].sum())
+    n_lines = int(np.searchsorted(np.cumsum(line_cost[n_full:]), remaining, side="right"))
+    qty = qty[: n_full + n_lines].copy()
+    qty[n_full:] = 0
+    return edges[: n_full + n_lines], qty
+
+
+def nxGraph(drug_graph, multiplicity=None, variants=None):
+    """helper function to convert the given drug graph to a networkx graph
+
+    Parameters
+    ----------
+    drug_graph : 
+        The graph constructed by the getInteractionGraph() function
+    multiplicity : array, optional
+        Number of product pairs of each interaction, by edge id, added as
+        the `multiplicity` edge attribute
+    variants : dict, optional
+        Distinct interactions merged into an interaction, by edge id
+        (see `graph.quotient()`), added as the `variants` edge attribute
+
+    Returns
+    -------
+        A networkx graph object
+    """
+    G = nx.Graph()
+    # add nodes in vertex order
+    G.add_nodes_from(drug_graph.ids)
+    # loop over the interactions once per undirected pair
+    if multiplicity is None:
+        multiplicity = itertools.repeat(1)
+    variants = variants or {}
+    for eid, ((f, t, _, severity, additional_info), count) in enumerate(
+        zip(drug_graph.edges(), multiplicity)
+    ):
+        # add edge to networkx graph
+        # can use kwargs to add additional info to the graph
+        G.add_edge(
+            f,
+            t,
+            severity=severity, # include severity info
+            additional_info=additional_info, # inclide additional info
+            multiplicity=count, # product pairs of the interaction
+            variants=variants.get(eid, ()), # distinct merged interactions
         )
+    return G
+
 
-    # pass hovertext and color into the node trace
-    node_trace.marker.color = n_adjacencies
-    node_trace.text = n_text
+@span("figure")
+def buildGraphVisualization(graph, mode="auto", budget=None, groups=None, anchors=None,
+                            multiplicity=None, variants=None):
+    """Build a visualization of the graph using plotly
+
+    Parameters
+    ----------
+    graph : 
+        The graph constructed by the getInteractionGraph() function
+    mode : str
+        "svg" draws every node label and 15 hover markers per edge, "webgl"
+        draws WebGL traces with node names in the hover labels and hover
+        markers in proportion to the edge length. "auto" uses "webgl" for
+        graphs with more than `LARGE_GRAPH_VERTICES` vertices.
+    budget : int, optional
+        Approx. max. size of the figure json in bytes (default
+        `FIGURE_PAYLOAD_BUDGET`), the least severe edges are dropped to
+        fit in it
+    groups : dict, optional
+        Ingredient groups of the query (see `groupProducts()`), shown in
+        the hover labels of their products; the vertex of a collapsed
+        group carries its RxCUI as `customdata` to be expanded by a click
+    anchors : dict, optional
+        Products of the expanded groups as keys and the RxCUI of their
+        group as values, laid out around the group (see `ingredients.view()`)
+    multiplicity : array, optional
+        Number of product pairs of each interaction, by edge id
+    variants : dict, optional
+        Distinct interactions merged into an interaction, by edge id,
+        listed in its hover label (see `graph.quotient()`)
+
+    Returns
+    -------
+        A plotly graph object
+    """
+    if mode == "auto":
+        mode = "webgl" if graph.num_vertices > LARGE_GRAPH_VERTICES else "svg"
+    webgl = mode == "webgl"
+    budget = FIGURE_PAYLOAD_BUDGET if budget is None else budget
+
+    # convert to networkx graph
+    G = nxGraph(graph, multiplicity, variants)
 
-    annots = []
-    for node, (x, y) in pos.items():
-        annots.append(
-            dict(x=x, y=y - 0.1, xref="x", yref="y", text=node, showarrow=False)
+    # generate positions for each node for visualization
+    # (seeded and cached, see `layout.compute_layout()`)
+    with span("layout"):
+        pos = compute_layout(G, anchors)
+
+    # extract node coordinates and labels
+    nodes = list(G.nodes())
+    node_pos = np.array([pos[node] for node in nodes], dtype=float).reshape(-1, 2)
+
+    # node hovertext definition
+    # exact average shortest path lengths, computed once for all vertices
+    with span("paths"):
+        avg_paths = average_shortest_paths(graph)
+    n_adjacencies = np.array([G.degree(node) for node in nodes], dtype=np.intp)
+    groups = groups or {}
+    group_of = {cui: g for g in groups.values() for cui in g.products}
+    # collapsed groups of more than one product expand when clicked
+    expanded = set((anchors or {}).values())
+    n_group = [
+        node if node in groups and len(groups[node].products) > 1 and node not in expanded else ""
+        for node in nodes
+    ]
+    n_text = np.array([
+        f"RxCUI: {node}<br>"
+        + f"Drug name: {graph.vert_list[node].name}<br>"
+        + (
+            f"Ingredient group: {group_of[node].ingredient} "
+            f"({len(group_of[node].products)} products"
+            + (", click to show them" if group else "") + ")<br>"
+            if node in group_of else ""
         )
+        + f"# of connections: {degree}<br>"
+        + f"# of average shortest path # to other vertices: {avg_paths[node]}"
+        for node, degree, group in zip(nodes, n_adjacencies, n_group)
+    ], dtype=object)
+
+    # node labels are annotations in svg mode, part of the hover label in webgl mode
+    annots = [] if webgl else [
+        dict(x=x, y=y - 0.1, xref="x", yref="y", text=node, showarrow=False)
+        for node, (x, y) in zip(nodes, node_pos.tolist())
+    ]
+
+    # edge lines and hover markers (15 per edge, or by edge length in webgl
+    # mode), the least severe edges are dropped if over the payload budget
+    edges = list(G.edges(data=True))
+    qty = markerCounts(edges, pos) if webgl else np.full(len(edges), 15)
+    node_cost = sum(len(text) + 60 for text in n_text) + 120 * len(annots)
+    shown, qty = thinEdges(edges, qty, budget - node_cost)
+    edge_x, edge_y, m2x, m2y, m2t = edgeCoordinates(G, pos, qty, shown)
+
+    title = "Drug interactions graph"
+    if len(shown) < len(edges):
+        title += f" ({len(shown)} of {len(edges)} most severe interactions shown)"
 
     # Create a Plotly figure
     fig = go.Figure(
-        data=[edge_trace, node_trace, mnode_trace],
         layout=go.Layout(
-            title="Drug interactions graph",
+            title=title,
             titlefont_size=16,
             showlegend=False,
             hovermode="closest",
@@ -553,8 +1681,41 @@ def buildGraphVisualization(graph):
         ),
     )
 
+    # traces are added in place, passing trace objects to `go.Figure`
+    # would deep copy their (large) arrays
+    add_trace = fig.add_scattergl if webgl else fig.add_scatter
+    # create visible line for edges
+    add_trace(
+        x=edge_x,
+        y=edge_y,
+        line=dict(width=0.5, color="#888"),
+        hoverinfo="text",
+        mode="lines",
+    )
+
+    # scatter for nodes, colored by number of connections
+    add_trace(
+        x=node_pos[:, 0],
+        y=node_pos[:, 1],
+        mode="markers",
+        hoverinfo="text",
+        text=n_text,
+        customdata=n_group,
+        marker=dict(showscale=False, color=n_adjacencies, size=10, line_width=2),
+    )
+
+    # create invisible lines for edges for hovertext
+    add_trace(
+        x=m2x,
+        y=m2y,
+        mode="markers",
+        showlegend=False,
+        hovertemplate="%{hovertext}<extra></extra>",
+        hovertext=m2t,
+        marker=dict(opacity=0),
+    )
+
     # update fig layout to allow click and hover callbacks + minor styling
-    fig.add_trace(edge_trace)
     fig.update_layout(clickmode="event+select")
     fig.update_layout(height=700)
     fig.update_traces(marker_size=20)